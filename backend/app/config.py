@@ -1,3 +1,4 @@
+import json
 import os
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
@@ -15,6 +16,26 @@ class Settings(BaseSettings):
     HUBSPOT_CLIENT_ID: str = os.getenv("HUBSPOT_CLIENT_ID", "your-hubspot-client-id")
     HUBSPOT_CLIENT_SECRET: str = os.getenv("HUBSPOT_CLIENT_SECRET", "your-hubspot-client-secret")
     HUBSPOT_WEBHOOK_SECRET: str = os.getenv("HUBSPOT_WEBHOOK_SECRET", "your-webhook-secret")
+    # Private app token for the CRM API; HubSpot responses are simulated when unset
+    HUBSPOT_ACCESS_TOKEN: str = os.getenv("HUBSPOT_ACCESS_TOKEN", "")
+    HUBSPOT_BASE_URL: str = os.getenv("HUBSPOT_BASE_URL", "https://api.hubapi.com")
+    # How long concurrent get_* calls are collected into one batch read
+    HUBSPOT_BATCH_WAIT_MS: float = float(os.getenv("HUBSPOT_BATCH_WAIT_MS", "5"))
+    # Cluster-wide HubSpot API rate limits (private app defaults)
+    HUBSPOT_BURST_LIMIT: int = int(os.getenv("HUBSPOT_BURST_LIMIT", "100"))
+    HUBSPOT_BURST_INTERVAL_MS: int = int(os.getenv("HUBSPOT_BURST_INTERVAL_MS", "10000"))
+    HUBSPOT_DAILY_LIMIT: int = int(os.getenv("HUBSPOT_DAILY_LIMIT", "250000"))
+    # Share of the burst bucket that backfill and reconciliation calls leave for interactive calls
+    HUBSPOT_BACKFILL_RESERVE: float = float(os.getenv("HUBSPOT_BACKFILL_RESERVE", "0.3"))
+    HUBSPOT_MAX_RETRIES: int = int(os.getenv("HUBSPOT_MAX_RETRIES", "5"))
+    # Longest a backfill call waits for the daily quota to reset; interactive calls fail at once
+    HUBSPOT_MAX_QUOTA_WAIT_SECONDS: float = float(os.getenv("HUBSPOT_MAX_QUOTA_WAIT_SECONDS", "3600"))
+    # Local mirror of HubSpot companies, contacts and deals (accounts/contacts/deals tables)
+    HUBSPOT_MIRROR_ENABLED: bool = os.getenv("HUBSPOT_MIRROR_ENABLED", "false").lower() == "true"
+    HUBSPOT_MIRROR_SYNC_INTERVAL_SECONDS: int = int(os.getenv("HUBSPOT_MIRROR_SYNC_INTERVAL_SECONDS", "300"))
+    HUBSPOT_MIRROR_UPSERT_BATCH: int = int(os.getenv("HUBSPOT_MIRROR_UPSERT_BATCH", "1000"))
+    # Versioned cache of enriched HubSpot objects
+    ENRICHMENT_CACHE_TTL_SECONDS: int = int(os.getenv("ENRICHMENT_CACHE_TTL_SECONDS", str(86400)))
     
     # OpenRouter/OpenAI Configuration
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "your-openai-api-key")
@@ -26,11 +47,96 @@ class Settings(BaseSettings):
     INNGEST_EVENT_KEY: str = os.getenv("INNGEST_EVENT_KEY", "your-inngest-event-key")
     INNGEST_SIGNING_KEY: str = os.getenv("INNGEST_SIGNING_KEY", "your-inngest-signing-key")
     
-    AIRTABLE_API_KEY: str = os.getenv("AIRTABLE_API_KEY", "your-airtable-api-key")
-    NOTION_API_KEY: str = os.getenv("NOTION_API_KEY", "your-notion-api-key")
+    # Connector clients are simulated while their key/token is empty. The API URLs
+    # can point at a local stand-in server (benchmarks/stand_in_server.py).
+    AIRTABLE_API_KEY: str = os.getenv("AIRTABLE_API_KEY", "")
+    AIRTABLE_API_URL: str = os.getenv("AIRTABLE_API_URL", "https://api.airtable.com")
+    AIRTABLE_BASE_ID: str = os.getenv("AIRTABLE_BASE_ID", "app_your_base_id")
+    AIRTABLE_CONTACTS_TABLE: str = os.getenv("AIRTABLE_CONTACTS_TABLE", "Contacts")
+    AIRTABLE_DEFAULT_TABLE: str = os.getenv("AIRTABLE_DEFAULT_TABLE", "Records")
+    # Airtable asks clients to wait 30 seconds after a 429
+    AIRTABLE_RATE_LIMIT_WAIT_SECONDS: float = float(os.getenv("AIRTABLE_RATE_LIMIT_WAIT_SECONDS", "30"))
+    # Batched Airtable writes: requests per second per base (Airtable allows 5), and how
+    # long an idle writer waits for more records to join a request
+    AIRTABLE_REQUESTS_PER_SECOND: float = float(os.getenv("AIRTABLE_REQUESTS_PER_SECOND", "5"))
+    AIRTABLE_BATCH_WAIT_MS: int = int(os.getenv("AIRTABLE_BATCH_WAIT_MS", "20"))
+    NOTION_API_KEY: str = os.getenv("NOTION_API_KEY", "")
+    NOTION_API_URL: str = os.getenv("NOTION_API_URL", "https://api.notion.com")
     
     GOOGLE_CLIENT_ID: str = os.getenv("GOOGLE_CLIENT_ID", "your-google-client-id")
     GOOGLE_CLIENT_SECRET: str = os.getenv("GOOGLE_CLIENT_SECRET", "your-google-client-secret")
+    GOOGLE_ACCESS_TOKEN: str = os.getenv("GOOGLE_ACCESS_TOKEN", "")
+    GOOGLE_CALENDAR_API_URL: str = os.getenv("GOOGLE_CALENDAR_API_URL", "https://www.googleapis.com")
+    # Retries for connector 429s, 5xx responses and transport errors
+    CONNECTOR_MAX_RETRIES: int = int(os.getenv("CONNECTOR_MAX_RETRIES", "4"))
+
+    # Content-addressed blob store for large workflow state payloads ("redis" or "file")
+    BLOB_STORE_BACKEND: str = os.getenv("BLOB_STORE_BACKEND", "redis")
+    BLOB_STORE_PATH: str = os.getenv("BLOB_STORE_PATH", "/tmp/orchestrator-blobs")
+    BLOB_INLINE_MAX_BYTES: int = int(os.getenv("BLOB_INLINE_MAX_BYTES", "1024"))
+    # 0 keeps blobs as long as the checkpoints that reference them
+    BLOB_TTL_SECONDS: int = int(os.getenv("BLOB_TTL_SECONDS", "0"))
+
+    # Exact-match LLM response cache for temperature 0 calls
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_TTL_SECONDS: int = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 86400)))
+    LLM_CACHE_MAX_ENTRY_BYTES: int = int(os.getenv("LLM_CACHE_MAX_ENTRY_BYTES", str(64 * 1024)))
+
+    # Local job-title classifier; titles below this confidence go to the LLM
+    ROLE_CLASSIFIER_MIN_CONFIDENCE: float = float(os.getenv("ROLE_CLASSIFIER_MIN_CONFIDENCE", "0.8"))
+
+    # Cluster-wide LLM governor (shared through Redis by all workers)
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+    LLM_TOKENS_PER_MINUTE: int = int(os.getenv("LLM_TOKENS_PER_MINUTE", "200000"))
+    LLM_LATENCY_TARGET_SECONDS: float = float(os.getenv("LLM_LATENCY_TARGET_SECONDS", "20"))
+    # Retries of a rate-limited call after the shared cooldown
+    LLM_MAX_RATE_LIMIT_RETRIES: int = int(os.getenv("LLM_MAX_RATE_LIMIT_RETRIES", "1"))
+
+    # Shared LLM HTTP connection pool
+    LLM_HTTP_MAX_CONNECTIONS: int = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "32"))
+    LLM_HTTP_MAX_KEEPALIVE: int = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "16"))
+    LLM_HTTP_KEEPALIVE_SECONDS: float = float(os.getenv("LLM_HTTP_KEEPALIVE_SECONDS", "90"))
+    LLM_HTTP_TIMEOUT_SECONDS: float = float(os.getenv("LLM_HTTP_TIMEOUT_SECONDS", "60"))
+    LLM_HTTP2: bool = os.getenv("LLM_HTTP2", "false").lower() == "true"
+    # Per-node model parameter overrides, e.g. {"assess_risk": {"max_tokens": 800}}
+    LLM_NODE_OVERRIDES: dict = json.loads(os.getenv("LLM_NODE_OVERRIDES", "{}"))
+
+    # Per-node LLM latency budgets (seconds). Past LLM_HEDGE_AFTER_FRACTION of the
+    # budget a hedged request goes to LLM_FALLBACK_MODEL (if set); at the budget
+    # the node's deterministic fallback answers instead.
+    LLM_NODE_BUDGETS: dict = json.loads(os.getenv("LLM_NODE_BUDGETS", json.dumps({
+        "assess_risk": 20,
+        "normalize_company_data": 30,
+        "infer_role_from_title": 15,
+        "analyze_kickoff_requirements": 30,
+        "propose_internal_slots": 10,
+    })))
+    LLM_HEDGE_AFTER_FRACTION: float = float(os.getenv("LLM_HEDGE_AFTER_FRACTION", "0.5"))
+    LLM_FALLBACK_MODEL: str = os.getenv("LLM_FALLBACK_MODEL", "")
+
+    # Deterministic risk pre-scoring: scores outside [LOW_BAND, HIGH_BAND] skip the LLM
+    RISK_SCORE_LOW_BAND: float = float(os.getenv("RISK_SCORE_LOW_BAND", "0.25"))
+    RISK_SCORE_HIGH_BAND: float = float(os.getenv("RISK_SCORE_HIGH_BAND", "0.75"))
+    # LLM verdicts a risk model is fitted to before it answers anything locally
+    RISK_SCORE_MIN_VERDICTS: int = int(os.getenv("RISK_SCORE_MIN_VERDICTS", "200"))
+    # How often the risk models are refitted to the recorded LLM verdicts (also done at startup)
+    RISK_SCORE_CALIBRATE_INTERVAL_SECONDS: int = int(os.getenv("RISK_SCORE_CALIBRATE_INTERVAL_SECONDS", "3600"))
+
+    # Reuse of near-duplicate LLM assessments (bounded in-memory index)
+    SIMILARITY_INDEX_MAX_ENTRIES: int = int(os.getenv("SIMILARITY_INDEX_MAX_ENTRIES", "5000"))
+    SIMILARITY_TOLERANCE: float = float(os.getenv("SIMILARITY_TOLERANCE", "0.05"))
+
+    # Record/replay of LLM calls for offline benchmarks: off, record or replay
+    LLM_CASSETTE_MODE: str = os.getenv("LLM_CASSETTE_MODE", "off")
+    LLM_CASSETTE_PATH: str = os.getenv("LLM_CASSETTE_PATH", "benchmarks/cassettes/llm.jsonl.gz")
+    # "recorded" replays at the recorded latency, "instant" without delay
+    LLM_CASSETTE_LATENCY: str = os.getenv("LLM_CASSETTE_LATENCY", "recorded")
+
+    # LLM prices in USD per million tokens, by model, for per-workflow cost reporting
+    LLM_PRICING: dict = json.loads(os.getenv("LLM_PRICING", json.dumps({
+        "openai/gpt-4o": {"input": 2.5, "cached_input": 1.25, "output": 10.0},
+        "openai/gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.6},
+    })))
 
     class Config:
         case_sensitive = True
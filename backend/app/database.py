@@ -1,7 +1,6 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 from .config import settings
-import app.models  # Import models to register them with SQLAlchemy
 
 # Create an async engine to connect to the database
 engine = create_async_engine(
@@ -22,6 +21,8 @@ AsyncSessionLocal = sessionmaker(
 # A base class for our models to inherit from
 Base = declarative_base()
 
+import app.models  # noqa: E402  Import models (after Base exists) to register them with SQLAlchemy
+
 async def init_db():
     """Initialize the database by creating all tables."""
     async with engine.begin() as conn:
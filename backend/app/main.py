@@ -1,3 +1,4 @@
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -5,6 +6,13 @@ from app.routers import webhooks, worker
 from app.routers.auth_simple import router as auth_router
 from app.routers.api_simple import router as api_router
 from app.services.workflow_engine import workflow_engine
+from app.services.role_classifier import role_classifier
+from app.services.risk_scorer import risk_scorer
+from app.services.llm_client import close_http_client
+from app.services.llm_cassette import llm_cassette
+from app.services.airtable_client import airtable_client
+from app.services.webhook_processor import webhook_processor
+from app.services.similarity_index import company_similarity, risk_similarity
 from app.config import settings
 from app.middleware.error_handler import error_handling_middleware
 import logging
@@ -13,6 +21,24 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+async def _sync_hubspot_mirror_periodically():
+    """Keep the local HubSpot mirror current between webhook deltas."""
+    while True:
+        try:
+            await webhook_processor.hubspot_mirror.sync()
+        except Exception as e:
+            logger.error(f"❌ HubSpot mirror sync failed: {e}")
+        await asyncio.sleep(settings.HUBSPOT_MIRROR_SYNC_INTERVAL_SECONDS)
+
+async def _calibrate_risk_scorer_periodically():
+    """Refit the risk models as LLM verdicts accumulate."""
+    while True:
+        await asyncio.sleep(settings.RISK_SCORE_CALIBRATE_INTERVAL_SECONDS)
+        try:
+            await risk_scorer.calibrate()
+        except Exception as e:
+            logger.error(f"❌ Risk model calibration failed: {e}")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
@@ -24,14 +50,33 @@ async def lifespan(app: FastAPI):
     try:
         await workflow_engine.initialize()
         logger.info("✅ Workflow engine initialized successfully")
+        await role_classifier.load()
+        await risk_similarity.load()
+        await company_similarity.load()
+        await risk_scorer.calibrate()
     except Exception as e:
         logger.error(f"❌ Failed to initialize workflow engine: {e}")
         raise
+
+    risk_calibration = asyncio.create_task(_calibrate_risk_scorer_periodically())
+
+    mirror_sync = None
+    if settings.HUBSPOT_MIRROR_ENABLED:
+        await webhook_processor.hubspot_mirror.create_tables()
+        mirror_sync = asyncio.create_task(_sync_hubspot_mirror_periodically())
+        logger.info("✅ HubSpot mirror sync started")
     
     yield  # Application runs here
     
     # Cleanup
     logger.info("🛑 Shutting down HubSpot Operations Orchestrator AI Service...")
+    risk_calibration.cancel()
+    if mirror_sync is not None:
+        mirror_sync.cancel()
+    await close_http_client()
+    await llm_cassette.close()
+    await airtable_client.close()
+    await webhook_processor.hubspot_client.close()
 
 app = FastAPI(
     title="HubSpot Operations Orchestrator - AI Service",
@@ -54,7 +54,8 @@ class Approval(Base):
     justification: Mapped[Optional[str]] = mapped_column(Text)
 
     # Metadata
-    metadata: Mapped[Optional[dict]] = mapped_column(String)  # JSON data
+    # "metadata" is reserved on declarative models; the column keeps its name
+    metadata_: Mapped[Optional[dict]] = mapped_column("metadata", String)  # JSON data
 
     created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=func.now(), onupdate=func.now())
\ No newline at end of file
@@ -51,6 +51,7 @@ class Exception(Base):
     resolved_by_id: Mapped[Optional[str]] = mapped_column(String)
 
     # Metadata
-    metadata: Mapped[Optional[dict]] = mapped_column(String)  # JSON data
+    # "metadata" is reserved on declarative models; the column keeps its name
+    metadata_: Mapped[Optional[dict]] = mapped_column("metadata", String)  # JSON data
 
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=func.now(), onupdate=func.now())
\ No newline at end of file
@@ -2,6 +2,16 @@ import json
 from fastapi import APIRouter, BackgroundTasks
 from app.services.workflow_engine import workflow_engine
 from app.services.webhook_processor import webhook_processor
+from app.services.llm_cache import llm_cache
+from app.services.role_classifier import role_classifier
+from app.services.llm_governor import llm_governor
+from app.services.hubspot_rate_limiter import hubspot_rate_limiter
+from app.services.airtable_client import airtable_client
+from app.services.llm_client import llm_path_stats
+from app.services.write_buffer import write_buffer_stats
+from app.services.llm_usage import llm_usage
+from app.services.risk_scorer import risk_scorer
+from app.services.similarity_index import company_similarity, risk_similarity
 
 router = APIRouter()
 
@@ -45,3 +55,102 @@ async def process_queue(background_tasks: BackgroundTasks):
         return {"status": "ok", "message": "Queue is empty."}
     
     return {"status": "ok", "message": f"Started processing {count} events from the queue in the background."}
+
+async def _process_batch_task(events: list):
+    """Helper function to wrap the processing of one lockstep batch."""
+    try:
+        print(f"Worker processing batch of {len(events)} events")
+        results = await webhook_processor.process_batch(events)
+        failed = [r for r in results if r and r.get("status") == "failed"]
+        print(f"Worker finished batch: {len(results) - len(failed)} ok, {len(failed)} failed")
+    except Exception as e:
+        print(f"Worker failed to process batch of {len(events)} events. Error: {e}")
+
+@router.post(
+    "/process-queue/batch",
+    tags=["Worker"],
+    summary="Drain the queue and run events for the same workflow in lockstep batches",
+)
+async def process_queue_batch(background_tasks: BackgroundTasks, batch_size: int = 25):
+    """
+    Backfill variant of /process-queue. Events are grouped by the workflow they
+    resolve to and each group is run in batches of up to batch_size, so LLM
+    calls and Airtable writes are batched across runs.
+    """
+    redis_service = workflow_engine.redis_service
+
+    groups = {}
+    count = 0
+    while await redis_service.queue_size("hubspot_event_queue") > 0:
+        raw_event = await redis_service.queue_pop("hubspot_event_queue")
+        if not raw_event:
+            continue
+        try:
+            event = json.loads(raw_event) if isinstance(raw_event, str) else raw_event
+        except json.JSONDecodeError:
+            print(f"Error decoding event from queue: {raw_event}")
+            continue
+        workflow = webhook_processor.resolve_workflow(event.get("payload", event))
+        groups.setdefault(getattr(workflow, "__name__", None), []).append(event)
+        count += 1
+
+    if count == 0:
+        return {"status": "ok", "message": "Queue is empty."}
+
+    batches = 0
+    for events in groups.values():
+        for start in range(0, len(events), batch_size):
+            background_tasks.add_task(_process_batch_task, events[start:start + batch_size])
+            batches += 1
+
+    return {"status": "ok", "message": f"Started processing {count} events in {batches} batches in the background."}
+
+async def _sync_mirror_task(object_type: str = None):
+    """Helper function to wrap one HubSpot mirror sync."""
+    try:
+        synced = await webhook_processor.hubspot_mirror.sync(object_type)
+        print(f"Worker finished HubSpot mirror sync: {synced}")
+    except Exception as e:
+        print(f"Worker failed to sync HubSpot mirror. Error: {e}")
+
+@router.post(
+    "/hubspot-mirror/sync",
+    tags=["Worker"],
+    summary="Pull HubSpot objects modified since the last sync into the local mirror",
+)
+async def sync_hubspot_mirror(background_tasks: BackgroundTasks, object_type: str = None):
+    """
+    Runs an incremental mirror sync in the background, for one CRM object
+    type (companies, contacts or deals) or all of them.
+    """
+    if not webhook_processor.hubspot_mirror.enabled:
+        return {"status": "ok", "message": "HubSpot mirror is disabled."}
+    background_tasks.add_task(_sync_mirror_task, object_type)
+    return {"status": "ok", "message": f"Started HubSpot mirror sync for {object_type or 'all object types'}."}
+
+@router.get(
+    "/stats",
+    tags=["Worker"],
+    summary="Per-worker processing and cache statistics",
+)
+async def worker_stats():
+    """
+    Reports counters kept by this worker process, such as discarded stale
+    events and the LLM response cache hit rate per workflow node.
+    """
+    return {
+        "stale_events_skipped": webhook_processor.stale_events_skipped,
+        "hubspot": webhook_processor.hubspot_client.stats,
+        "enrichment_cache": webhook_processor.enrichment_cache.stats,
+        "hubspot_mirror": webhook_processor.hubspot_mirror.stats,
+        "hubspot_rate_limiter": hubspot_rate_limiter.stats,
+        "airtable_writer": airtable_client.writer.summary,
+        "write_buffer": write_buffer_stats,
+        "llm_cache": llm_cache.stats(),
+        "role_classifier": role_classifier.stats,
+        "llm_governor": llm_governor.stats,
+        "llm_paths": llm_path_stats,
+        "llm_usage": llm_usage.stats(),
+        "risk_scorer": risk_scorer.stats,
+        "similarity_reuse": {"assess_risk": risk_similarity.stats, "normalize_company_data": company_similarity.stats},
+    }
@@ -1,17 +1,155 @@
 import asyncio
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+from urllib.parse import quote
+import httpx
+from app.config import settings
+from app.services.airtable_writer import AIRTABLE_BATCH_LIMIT, AirtableBatchWriter
+from app.services.connector_http import send
+from app.services.write_buffer import current_write_buffer
+
+# Field company records are upserted on
+UPSERT_MERGE_FIELD = "HubSpot ID"
 
 class AirtableClient:
     """
-    A mock client to simulate interactions with the Airtable API.
+    Client for the Airtable records API.
+
+    upsert_record, create_contact and update_record don't call Airtable one
+    record at a time: they go through an AirtableBatchWriter that coalesces
+    writes from concurrent runs into 10-record requests per base and table,
+    paced to AIRTABLE_REQUESTS_PER_SECOND per base. create_contacts and
+    update_records send one batch request directly. Inside a workflow run,
+    create_contact and update_record go to the run's write buffer instead
+    (see app.services.write_buffer), which merges them until a flush point.
+
+    Without AIRTABLE_API_KEY the client simulates Airtable, one simulated
+    round trip per request. AIRTABLE_API_URL can point at a local stand-in
+    server. Rate-limited requests are retried after Retry-After (Airtable
+    asks for 30 seconds when it doesn't send one).
     """
 
+    def __init__(self, api_url: Optional[str] = None, api_key: Optional[str] = None):
+        self.api_url = api_url or settings.AIRTABLE_API_URL
+        self.api_key = api_key if api_key is not None else settings.AIRTABLE_API_KEY
+        self._http: Optional[httpx.AsyncClient] = None
+        self.stats: Dict[str, int] = {"api_calls": 0}
+        self.writer = AirtableBatchWriter(
+            self._write_batch,
+            requests_per_second=settings.AIRTABLE_REQUESTS_PER_SECOND,
+            max_wait=settings.AIRTABLE_BATCH_WAIT_MS / 1000,
+            dedupe_field=UPSERT_MERGE_FIELD,
+        )
+
+    @property
+    def simulated(self) -> bool:
+        return not self.api_key
+
     async def upsert_record(self, base_id: str, table_name: str, record: Dict[str, Any]) -> Dict[str, Any]:
-        """Simulates upserting a record to an Airtable base."""
+        """Upsert a record to an Airtable table, merging on its HubSpot ID."""
         print(f"[AirtableClient] Upserting record to {base_id}/{table_name}: {record.get('id')}")
+        return await self.writer.submit(base_id, table_name, "upsert", {"fields": record})
+
+    async def create_contact(self, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a contact record."""
+        buffer = current_write_buffer()
+        if buffer is not None:
+            return buffer.create(settings.AIRTABLE_BASE_ID, settings.AIRTABLE_CONTACTS_TABLE, fields)
+        return await self.writer.submit(
+            settings.AIRTABLE_BASE_ID, settings.AIRTABLE_CONTACTS_TABLE, "create", {"fields": fields}
+        )
+
+    async def create_contacts(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Create up to 10 contact records in a single request."""
+        return await self._write_batch(
+            settings.AIRTABLE_BASE_ID, settings.AIRTABLE_CONTACTS_TABLE, "create",
+            [{"fields": fields} for fields in records],
+        )
+
+    async def update_record(self, record_id: str, fields: Dict[str, Any],
+                            table_name: Optional[str] = None) -> Dict[str, Any]:
+        """Update a record."""
+        table_name = table_name or settings.AIRTABLE_DEFAULT_TABLE
+        buffer = current_write_buffer()
+        if buffer is not None:
+            return buffer.update(settings.AIRTABLE_BASE_ID, table_name, record_id, fields)
+        return await self.writer.submit(
+            settings.AIRTABLE_BASE_ID, table_name, "update", {"id": record_id, "fields": fields}
+        )
+
+    async def update_records(self, updates: List[Dict[str, Any]],
+                             table_name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Update up to 10 records ({"id", "fields"}) in a single request."""
+        return await self._write_batch(
+            settings.AIRTABLE_BASE_ID, table_name or settings.AIRTABLE_DEFAULT_TABLE, "update", updates
+        )
+
+    async def _write_batch(self, base_id: str, table_name: str, operation: str,
+                           records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """One create, update or upsert request for up to 10 records, in order."""
+        if len(records) > AIRTABLE_BATCH_LIMIT:
+            raise ValueError(f"Airtable accepts at most {AIRTABLE_BATCH_LIMIT} records per request")
+        print(f"[AirtableClient] Sending {operation} of {len(records)} record(s) to {base_id}/{table_name}")
+        if self.simulated:
+            return await self._simulate_write(operation, records)
+        if operation == "create":
+            body: Dict[str, Any] = {"records": records, "typecast": True}
+            method = "POST"
+        elif operation == "upsert":
+            body = {
+                "performUpsert": {"fieldsToMergeOn": [UPSERT_MERGE_FIELD]},
+                "records": [{"fields": {k: v for k, v in r["fields"].items() if k != "id"}} for r in records],
+                "typecast": True,
+            }
+            method = "PATCH"
+        else:
+            body = {"records": records, "typecast": True}
+            method = "PATCH"
+        response = await send(
+            self._client(), method, f"/v0/{base_id}/{quote(table_name, safe='')}", self.stats,
+            settings.CONNECTOR_MAX_RETRIES, json=body, rate_limit_wait=settings.AIRTABLE_RATE_LIMIT_WAIT_SECONDS,
+            # Upserts and updates can be repeated safely; creates can't
+            idempotent=operation != "create",
+        )
+        return response["records"]
+
+    async def _simulate_write(self, operation: str, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Simulated request: one round trip for the whole batch."""
+        self.stats["api_calls"] += 1
         await asyncio.sleep(0.1) # Simulate network latency
-        return {
-            "id": record.get("id", "rec_new_id"),
-            "fields": record,
-            "createdTime": "2025-09-29T00:00:00.000Z",
-        }
+        if operation == "update":
+            return [{"id": record["id"], "fields": record["fields"]} for record in records]
+        if operation == "upsert":
+            return [
+                {
+                    "id": record["fields"].get("id", "rec_new_id"),
+                    "fields": record["fields"],
+                    "createdTime": "2025-09-29T00:00:00.000Z",
+                }
+                for record in records
+            ]
+        return [
+            {
+                "id": f"rec_{record['fields'].get('HubSpot ID') or 'new_id'}",
+                "fields": record["fields"],
+                "createdTime": "2025-09-29T00:00:00.000Z",
+            }
+            for record in records
+        ]
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                base_url=self.api_url,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=httpx.Timeout(30.0, connect=10.0),
+            )
+        return self._http
+
+    async def close(self):
+        await self.writer.close()
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+# Global instance, shared by the workflows so their writes are batched and paced together
+airtable_client = AirtableClient()
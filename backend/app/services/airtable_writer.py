@@ -0,0 +1,179 @@
+import asyncio
+import itertools
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+# Airtable accepts at most 10 records per create/update request
+AIRTABLE_BATCH_LIMIT = 10
+
+# (base_id, table_name, operation); operation is "create", "update" or "upsert"
+WriteKey = Tuple[str, str, str]
+SendBatch = Callable[[str, str, str, List[Dict[str, Any]]], Awaitable[List[Dict[str, Any]]]]
+
+
+class _Write:
+    __slots__ = ("record", "future", "dedupe_key", "seq", "solo")
+
+    def __init__(self, record: Dict[str, Any], future: asyncio.Future, dedupe_key: Optional[str], seq: int):
+        self.record = record
+        self.future = future
+        self.dedupe_key = dedupe_key
+        self.seq = seq
+        # Sent in a request of its own (after its batch was rejected as invalid)
+        self.solo = False
+
+
+class AirtableBatchWriter:
+    """
+    Always-on batching writer for Airtable, one queue per base, table and operation.
+
+    Writes from concurrent runs are queued, and one background worker per
+    base sends them as requests of up to 10 records, paced to
+    requests_per_second (Airtable allows 5 per base). While a base is at its
+    request rate, new writes collect in the queues, so under load every
+    request carries 10 records: about 50 records per second per base instead
+    of 5. When idle, a write waits at most max_wait before it is sent. Each
+    caller gets its own record back, or its own error: if Airtable rejects a
+    batch as invalid, its records are retried one by one. Two writes to the
+    same record (or upsert key) never share a request.
+    """
+
+    def __init__(self, send_batch: SendBatch, requests_per_second: float = 5.0, max_wait: float = 0.02,
+                 dedupe_field: Optional[str] = None):
+        self.send_batch = send_batch
+        self.interval = 1.0 / requests_per_second
+        self.max_wait = max_wait
+        self.dedupe_field = dedupe_field
+        self._queues: Dict[WriteKey, Deque[_Write]] = {}
+        self._pending: Dict[str, asyncio.Event] = {}
+        self._next_slot: Dict[str, float] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+        self._requests: Set[asyncio.Task] = set()
+        self._seq = itertools.count()
+        self.stats = {"requests": 0, "records": 0, "full_batches": 0, "split_batches": 0}
+
+    async def submit(self, base_id: str, table_name: str, operation: str, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Queue one record write and wait for its own result."""
+        future = asyncio.get_running_loop().create_future()
+        key = (base_id, table_name, operation)
+        write = _Write(record, future, self._dedupe_key(operation, record), next(self._seq))
+        self._queues.setdefault(key, deque()).append(write)
+        self._pending.setdefault(base_id, asyncio.Event()).set()
+        worker = self._workers.get(base_id)
+        if worker is None or worker.done():
+            self._workers[base_id] = asyncio.ensure_future(self._run_base(base_id))
+        return await future
+
+    def _dedupe_key(self, operation: str, record: Dict[str, Any]) -> Optional[str]:
+        if operation == "update":
+            return record.get("id")
+        if operation == "upsert" and self.dedupe_field:
+            return str(record.get("fields", {}).get(self.dedupe_field))
+        return None
+
+    async def _run_base(self, base_id: str):
+        loop = asyncio.get_running_loop()
+        pending = self._pending[base_id]
+        while True:
+            await pending.wait()
+            keys = [key for key, queue in self._queues.items() if key[0] == base_id and queue]
+            if not keys:
+                pending.clear()
+                continue
+            if all(len(self._queues[key]) < AIRTABLE_BATCH_LIMIT for key in keys):
+                # Give concurrent writers a moment to join the batch
+                await asyncio.sleep(self.max_wait)
+            wait = self._next_slot.get(base_id, 0.0) - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._next_slot[base_id] = max(loop.time(), self._next_slot.get(base_id, 0.0)) + self.interval
+
+            # Serve the queue whose oldest write has waited longest (queues are FIFO)
+            keys = [key for key, queue in self._queues.items() if key[0] == base_id and queue]
+            if not keys:
+                continue
+            key = min(keys, key=lambda k: self._queues[k][0].seq)
+            batch = self._take(key)
+            task = asyncio.ensure_future(self._send(key, batch))
+            self._requests.add(task)
+            task.add_done_callback(self._requests.discard)
+
+    def _take(self, key: WriteKey) -> List[_Write]:
+        """Pop up to 10 writes, leaving repeated writes to one record for a later request."""
+        queue = self._queues[key]
+        batch: List[_Write] = []
+        skipped: List[_Write] = []
+        seen: Set[str] = set()
+        while queue and len(batch) < AIRTABLE_BATCH_LIMIT:
+            write = queue.popleft()
+            if write.future.done():
+                continue
+            if write.solo:
+                if batch:
+                    queue.appendleft(write)
+                    break
+                batch.append(write)
+                break
+            if write.dedupe_key is not None and write.dedupe_key in seen:
+                skipped.append(write)
+                continue
+            if write.dedupe_key is not None:
+                seen.add(write.dedupe_key)
+            batch.append(write)
+        queue.extendleft(reversed(skipped))
+        return batch
+
+    async def _send(self, key: WriteKey, batch: List[_Write]):
+        if not batch:
+            return
+        base_id, table_name, operation = key
+        self.stats["requests"] += 1
+        self.stats["records"] += len(batch)
+        if len(batch) == AIRTABLE_BATCH_LIMIT:
+            self.stats["full_batches"] += 1
+        try:
+            results = await self.send_batch(base_id, table_name, operation, [write.record for write in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"Airtable returned {len(results)} records for {len(batch)} writes")
+        except Exception as e:
+            if len(batch) > 1 and _is_invalid_request(e):
+                # One invalid record fails the whole request; retry each on its own
+                self.stats["split_batches"] += 1
+                for write in reversed(batch):
+                    write.solo = True
+                    self._queues[key].appendleft(write)
+                self._pending[base_id].set()
+                return
+            for write in batch:
+                if not write.future.done():
+                    write.future.set_exception(e)
+            return
+        for write, result in zip(batch, results):
+            if not write.future.done():
+                write.future.set_result(result)
+
+    async def drain(self):
+        """Wait until every queued write has been sent."""
+        while any(self._queues.values()) or self._requests:
+            await asyncio.sleep(self.max_wait)
+
+    async def close(self):
+        """Send what is queued, then stop the workers."""
+        await self.drain()
+        for worker in self._workers.values():
+            worker.cancel()
+        self._workers.clear()
+
+    @property
+    def summary(self) -> Dict[str, Any]:
+        requests = self.stats["requests"]
+        return {
+            **self.stats,
+            "records_per_request": round(self.stats["records"] / requests, 2) if requests else 0.0,
+            "queued": sum(len(queue) for queue in self._queues.values()),
+        }
+
+
+def _is_invalid_request(error: Exception) -> bool:
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None) == 422
@@ -0,0 +1,118 @@
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+BatchFn = Callable[[List[Any]], Awaitable[List[Any]]]
+
+
+class MicroBatcher:
+    """
+    Collects concurrent submissions and flushes them as a single batch call.
+
+    A flush happens when max_batch_size items are waiting or max_wait seconds
+    after the first item arrived, whichever comes first. batch_fn receives the
+    list of items and must return one result per item, in order; an Exception
+    in the result list is raised only to the caller that submitted that item.
+    """
+
+    def __init__(self, batch_fn: BatchFn, max_batch_size: int = 10, max_wait: float = 0.01):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._items: List[Any] = []
+        self._futures: List[asyncio.Future] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.stats = {"batches": 0, "items": 0}
+
+    async def submit(self, item: Any) -> Any:
+        """Queue an item for the next batch and wait for its own result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._items.append(item)
+        self._futures.append(future)
+
+        if len(self._items) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        items, futures = self._items, self._futures
+        self._items, self._futures = [], []
+        if not items:
+            return
+        task = asyncio.ensure_future(self._run(items, futures))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, items: List[Any], futures: List[asyncio.Future]):
+        self.stats["batches"] += 1
+        self.stats["items"] += len(items)
+        try:
+            results = await self.batch_fn(items)
+            if len(results) != len(items):
+                raise RuntimeError(f"Batch returned {len(results)} results for {len(items)} items")
+        except Exception as e:
+            results = [e] * len(items)
+
+        for future, result in zip(futures, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+class BatchScope:
+    """
+    Holds the micro-batchers shared by all runs of one batch.
+
+    Runs executing inside the scope submit LLM and connector calls to the
+    scope's batchers instead of calling the service directly, so N runs that
+    reach the same node together are served by one batch call.
+    """
+
+    def __init__(self, size: int, max_wait: float = 0.05):
+        self.size = size
+        self.max_wait = max_wait
+        self._batchers: Dict[str, MicroBatcher] = {}
+
+    def batcher(self, key: str, batch_fn: BatchFn, max_batch_size: Optional[int] = None) -> MicroBatcher:
+        """Get or create the batcher for a given call site."""
+        if key not in self._batchers:
+            self._batchers[key] = MicroBatcher(
+                batch_fn,
+                max_batch_size=min(max_batch_size or self.size, self.size),
+                max_wait=self.max_wait,
+            )
+        return self._batchers[key]
+
+    @property
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {key: batcher.stats for key, batcher in self._batchers.items()}
+
+
+_current_scope: ContextVar[Optional[BatchScope]] = ContextVar("batch_scope", default=None)
+
+
+def current_batch_scope() -> Optional[BatchScope]:
+    """Return the batch scope of the running workflow, if any."""
+    return _current_scope.get()
+
+
+@contextmanager
+def batch_scope(size: int, max_wait: float = 0.05):
+    """Run the enclosed workflow invocations as one lockstep batch."""
+    scope = BatchScope(size, max_wait)
+    token = _current_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _current_scope.reset(token)
@@ -0,0 +1,128 @@
+import asyncio
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional
+from cachetools import LRUCache
+from app.config import settings
+from .redis_service import redis_service
+
+BLOB_REF_KEY = "__blob__"
+
+
+class BlobStore:
+    """
+    Content-addressed store for large workflow state payloads.
+
+    Values are serialized to canonical JSON and stored once under their
+    SHA-256 digest, in Redis or on the local filesystem. Workflow state keeps
+    only a small reference ({"__blob__": "sha256:<hex>", "size": n}), so
+    checkpoints, progress events and cached run results no longer grow with
+    the size of enrichment data or LLM analyses.
+
+    Checkpoints never expire, so by default neither do blobs. With
+    BLOB_TTL_SECONDS set, every read from Redis extends a blob's TTL, so
+    blobs of threads that are still being read stay available.
+    """
+
+    def __init__(self):
+        self.redis_service = redis_service
+        self.backend = settings.BLOB_STORE_BACKEND
+        self.path = settings.BLOB_STORE_PATH
+        self.inline_max_bytes = settings.BLOB_INLINE_MAX_BYTES
+        self.ttl = settings.BLOB_TTL_SECONDS
+        # Serialized blobs by digest. Every resolve decodes its own copy, so a
+        # node that edits a resolved value can't change it for other runs.
+        self._cache: LRUCache = LRUCache(maxsize=512)
+
+    @staticmethod
+    def is_ref(value: Any) -> bool:
+        """Check whether a state value is a blob reference."""
+        return isinstance(value, dict) and BLOB_REF_KEY in value
+
+    @staticmethod
+    def _serialize(value: Any) -> str:
+        return json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+
+    async def offload(self, value: Any) -> Any:
+        """Store a value and return its reference, or the value itself if it is small."""
+        if value is None or self.is_ref(value):
+            return value
+        payload = self._serialize(value)
+        if len(payload) <= self.inline_max_bytes:
+            return value
+        return await self._put(payload)
+
+    async def resolve(self, value: Any) -> Any:
+        """Return the stored value for a reference; other values are returned unchanged."""
+        if not self.is_ref(value):
+            return value
+        digest = value[BLOB_REF_KEY]
+        payload = self._cache.get(digest)
+        if payload is None:
+            payload = await self._read(digest)
+            if payload is None:
+                raise KeyError(f"Blob {digest} not found in the blob store")
+            self._cache[digest] = payload
+        return json.loads(payload)
+
+    async def resolve_all(self, value: Any) -> Any:
+        """Resolve references anywhere in a nested value, e.g. before it leaves the workflow."""
+        value = await self.resolve(value)
+        if isinstance(value, dict):
+            return {key: await self.resolve_all(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [await self.resolve_all(item) for item in value]
+        return value
+
+    async def _put(self, payload: str) -> Dict[str, Any]:
+        digest = "sha256:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        if digest not in self._cache:
+            await self._write(digest, payload)
+            self._cache[digest] = payload
+        return {BLOB_REF_KEY: digest, "size": len(payload)}
+
+    def _use_redis(self) -> bool:
+        return self.backend == "redis" and self.redis_service.client is not None
+
+    def _file_path(self, digest: str) -> str:
+        hex_digest = digest.split(":", 1)[1]
+        return os.path.join(self.path, hex_digest[:2], hex_digest[2:] + ".json")
+
+    async def _write(self, digest: str, payload: str):
+        if self._use_redis():
+            # NX: identical content is only ever written once; refresh the TTL otherwise
+            key = f"blob:{digest}"
+            if not await self.redis_service.client.set(key, payload, ex=self.ttl or None, nx=True) and self.ttl:
+                await self.redis_service.client.expire(key, self.ttl)
+            return
+        await asyncio.to_thread(self._write_file, self._file_path(digest), payload)
+
+    async def _read(self, digest: str) -> Optional[str]:
+        if self._use_redis():
+            if self.ttl:
+                return await self.redis_service.client.getex(f"blob:{digest}", ex=self.ttl)
+            return await self.redis_service.client.get(f"blob:{digest}")
+        return await asyncio.to_thread(self._read_file, self._file_path(digest))
+
+    @staticmethod
+    def _write_file(path: str, payload: str):
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _read_file(path: str) -> Optional[str]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+# Global instance
+blob_store = BlobStore()
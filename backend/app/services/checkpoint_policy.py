@@ -0,0 +1,347 @@
+from enum import Enum
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+from cachetools import LRUCache
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+)
+from langgraph.checkpoint.memory import MemorySaver
+from .write_buffer import RunWriteBuffer, current_write_buffer
+
+
+class CheckpointPolicy(str, Enum):
+    """
+    Per-node durability setting for the checkpoint written after a node runs.
+
+    ALWAYS: persist the checkpoint after every run of the node (HITL waits, run end).
+    AFTER_SIDE_EFFECT: persist only when the node produced an update, i.e. an LLM
+        or connector call actually happened and its result must not be repeated.
+    NEVER: pure transforms and nodes whose Airtable writes are buffered. The
+        checkpoint is kept in memory and folded into the next durable
+        checkpoint of the run, and the node's task writes are never saved, so
+        a resumed run re-runs it.
+
+    Workflows declare a NODE_CHECKPOINT_POLICY map, so durable checkpoints
+    are only taken around LLM calls, connector calls and HITL waits.
+    """
+    ALWAYS = "always"
+    AFTER_SIDE_EFFECT = "after_side_effect"
+    NEVER = "never"
+
+
+# Strongest policy wins when several nodes write in the same super-step.
+_POLICY_STRENGTH = {
+    CheckpointPolicy.NEVER: 0,
+    CheckpointPolicy.AFTER_SIDE_EFFECT: 1,
+    CheckpointPolicy.ALWAYS: 2,
+}
+
+
+class _ThreadState:
+    """Checkpoints of one (thread_id, checkpoint_ns) seen since its last durable checkpoint."""
+    __slots__ = ("parent_config", "last_id", "versions", "pending", "early_writes")
+
+    def __init__(self, parent_config: RunnableConfig):
+        # Config of the last durable checkpoint; the next durable one is saved as its child
+        self.parent_config = parent_config
+        # ID of the last checkpoint put, durable or not
+        self.last_id: Optional[str] = None
+        # Channel versions changed by the skipped checkpoints
+        self.versions: ChannelVersions = {}
+        # Latest skipped checkpoint, holding the task writes made on top of it
+        self.pending: Optional[CheckpointTuple] = None
+        # Task writes that arrived before the put of their checkpoint, by checkpoint ID
+        self.early_writes: Dict[str, List[Tuple[str, Sequence[Tuple[str, Any]]]]] = {}
+
+
+class PolicyCheckpointSaver(BaseCheckpointSaver):
+    """
+    Checkpointer that applies per-node CheckpointPolicy on top of the engine's saver.
+
+    A skipped checkpoint is kept in memory, together with the task writes made
+    on top of it, and never reaches the durable saver: the next durable
+    checkpoint already contains its channel values and those writes. That
+    checkpoint is saved as a child of the last durable one, with every
+    channel version changed since, so the parent chain in Redis only links
+    checkpoints that were saved. Thread states are kept in an LRU of
+    max_pending threads; the first put of a thread this process has not
+    tracked checks that its parent was saved.
+
+    The run's buffered Airtable writes made before a checkpoint, or by the
+    tasks whose writes are saved, are flushed before they reach the durable
+    saver, so a resumed run never skips a node whose writes were not sent, and
+    provisional record IDs in what is saved are replaced by real ones. Puts
+    run in the background while the next step runs, so writes of later steps
+    stay buffered.
+
+    The underlying saver is resolved lazily so graphs can be compiled at import time,
+    before the workflow engine has connected to Redis.
+    """
+
+    def __init__(self, engine, node_policies: Optional[Dict[str, CheckpointPolicy]] = None,
+                 default_policy: CheckpointPolicy = CheckpointPolicy.ALWAYS,
+                 max_pending: int = 1024):
+        super().__init__()
+        self.engine = engine
+        self.node_policies = node_policies or {}
+        self.default_policy = default_policy
+        self._threads: LRUCache = LRUCache(maxsize=max_pending)
+        self._fallback = MemorySaver()
+        # Checkpoints and task writes sent to the durable saver, and those kept in memory
+        self.stats = {"persisted": 0, "skipped": 0, "writes_persisted": 0, "writes_skipped": 0}
+
+    @property
+    def saver(self) -> BaseCheckpointSaver:
+        """The durable saver, or an in-memory one if the engine is not initialized."""
+        return self.engine.checkpointer or self._fallback
+
+    @staticmethod
+    def _thread_key(config: RunnableConfig) -> Tuple[str, str]:
+        configurable = config.get("configurable", {})
+        return configurable.get("thread_id", ""), configurable.get("checkpoint_ns", "")
+
+    def _should_persist(self, metadata: CheckpointMetadata, new_versions: ChannelVersions) -> bool:
+        """Decide whether the checkpoint produced by a super-step must be durable."""
+        if metadata.get("source") != "loop":
+            # Input and update checkpoints are always kept
+            return True
+        writes = metadata.get("writes") or {}
+        if not writes:
+            # Nodes that returned no update aren't listed, but a StateGraph node
+            # still writes the channel named after it
+            writes = {channel: None for channel in new_versions if channel in self.node_policies}
+            if not writes:
+                return True
+
+        policy = CheckpointPolicy.NEVER
+        produced_update = False
+        for node, update in writes.items():
+            node_policy = self.node_policies.get(node, self.default_policy)
+            if _POLICY_STRENGTH[node_policy] > _POLICY_STRENGTH[policy]:
+                policy = node_policy
+            if node_policy == CheckpointPolicy.AFTER_SIDE_EFFECT and update:
+                produced_update = True
+
+        if policy == CheckpointPolicy.ALWAYS:
+            return True
+        if policy == CheckpointPolicy.AFTER_SIDE_EFFECT:
+            return produced_update
+        return False
+
+    def _state(self, config: RunnableConfig) -> _ThreadState:
+        key = self._thread_key(config)
+        state = self._threads.get(key)
+        if state is None:
+            # First checkpoint of the thread in this process: the config points at a durable one
+            state = _ThreadState(config)
+            self._threads[key] = state
+        return state
+
+    def _skip(self, config: RunnableConfig, checkpoint: Checkpoint,
+              metadata: CheckpointMetadata, new_versions: ChannelVersions) -> RunnableConfig:
+        state = self._state(config)
+        state.versions.update(new_versions)
+        state.last_id = checkpoint["id"]
+        thread_id, checkpoint_ns = self._thread_key(config)
+        next_config = {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+        early_writes = state.early_writes.pop(checkpoint["id"], [])
+        state.pending = CheckpointTuple(
+            config=next_config,
+            checkpoint=checkpoint,
+            metadata=metadata,
+            parent_config=state.parent_config,
+            pending_writes=[
+                (task_id, channel, value) for task_id, writes in early_writes for channel, value in writes
+            ],
+        )
+        self.stats["skipped"] += 1
+        self.stats["writes_skipped"] += len(early_writes)
+        return next_config
+
+    def _durable(self, config: RunnableConfig, checkpoint: Checkpoint, new_versions: ChannelVersions):
+        """
+        Re-parent a checkpoint about to be saved onto the last durable one.
+
+        Returns the config and versions to save it with, and the task writes
+        that arrived for it before this put.
+        """
+        state = self._state(config)
+        self.stats["persisted"] += 1
+        early_writes = state.early_writes.pop(checkpoint["id"], [])
+        if state.pending is not None:
+            config = state.parent_config
+            new_versions = {**state.versions, **new_versions}
+        state.last_id = checkpoint["id"]
+        state.versions = {}
+        state.pending = None
+        return config, new_versions, early_writes
+
+    def _first_put(self, config: RunnableConfig) -> bool:
+        """Whether this process puts on top of a checkpoint of the thread it has not put itself."""
+        state = self._threads.get(self._thread_key(config))
+        return (state is None or state.last_id is None) and bool(config.get("configurable", {}).get("checkpoint_id"))
+
+    def _orphaned(self, config: RunnableConfig, checkpoint: Checkpoint,
+                  latest: Optional[CheckpointTuple]) -> Tuple[RunnableConfig, ChannelVersions]:
+        """
+        The parent is a skipped checkpoint this process forgot (its thread
+        state was evicted): put on top of the thread's latest durable
+        checkpoint instead, with every channel version, since those changed by
+        the forgotten checkpoints are lost.
+        """
+        print(f"[PolicyCheckpointSaver] Parent checkpoint of thread {self._thread_key(config)[0]} was not saved; re-parenting")
+        if latest is None:
+            thread_id, checkpoint_ns = self._thread_key(config)
+            return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}}, dict(checkpoint["channel_versions"])
+        return latest.config, dict(checkpoint["channel_versions"])
+
+    def _saved(self, config: RunnableConfig, saved_config: RunnableConfig):
+        self._state(config).parent_config = saved_config
+
+    def _never_task(self, writes: Sequence[Tuple[str, Any]]) -> bool:
+        """Whether the writes come from a NEVER node; a StateGraph node writes its name to its own channel."""
+        return any(
+            isinstance(value, str) and channel == value
+            and self.node_policies.get(channel) == CheckpointPolicy.NEVER
+            for channel, value in writes
+        )
+
+    def _hold_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]],
+                     task_id: str) -> bool:
+        """
+        Keep the writes of a task in memory unless they belong on a durable
+        checkpoint. Writes can arrive before the put of their checkpoint (it
+        waits for the previous put); those are held until it is decided.
+        Writes of NEVER nodes are dropped rather than saved.
+        """
+        state = self._threads.get(self._thread_key(config))
+        checkpoint_id = config.get("configurable", {}).get("checkpoint_id")
+        if state is not None and state.last_id is not None:
+            if state.pending is not None and checkpoint_id == state.pending.checkpoint["id"]:
+                state.pending.pending_writes.extend((task_id, channel, value) for channel, value in writes)
+                self.stats["writes_skipped"] += 1
+                return True
+            if checkpoint_id != state.last_id:
+                state.early_writes.setdefault(checkpoint_id, []).append((task_id, writes))
+                return True
+        if self._never_task(writes):
+            self.stats["writes_skipped"] += 1
+            return True
+        return False
+
+    @staticmethod
+    async def _flush_writes(through: Optional[str], inclusive: bool) -> Optional[RunWriteBuffer]:
+        """Send the run's writes made up to checkpoint `through` before something durable depends on them."""
+        buffer = current_write_buffer()
+        if buffer is not None:
+            await buffer.flush(through, inclusive)
+        return buffer
+
+    def _get_pending(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        state = self._threads.get(self._thread_key(config))
+        if state is None or state.pending is None:
+            return None
+        checkpoint_id = config.get("configurable", {}).get("checkpoint_id")
+        if checkpoint_id and checkpoint_id != state.pending.checkpoint["id"]:
+            return None
+        return state.pending
+
+    def _load(self, config: RunnableConfig):
+        """
+        The thread is read from the durable saver: forget what this process
+        saw of it, another worker may have moved it on since.
+        """
+        key = self._thread_key(config)
+        state = self._threads.get(key)
+        if state is not None and state.pending is None and not state.early_writes:
+            del self._threads[key]
+
+    # Sync interface
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        pending = self._get_pending(config)
+        if pending is not None:
+            return pending
+        self._load(config)
+        return self.saver.get_tuple(config)
+
+    def list(self, config: Optional[RunnableConfig], **kwargs: Any) -> Iterator[CheckpointTuple]:
+        return self.saver.list(config, **kwargs)
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint,
+            metadata: CheckpointMetadata, new_versions: ChannelVersions) -> RunnableConfig:
+        if self._first_put(config) and self.saver.get_tuple(config) is None:
+            latest = self.saver.get_tuple({"configurable": {**config["configurable"], "checkpoint_id": None}})
+            config, new_versions = self._orphaned(config, checkpoint, latest)
+        if not self._should_persist(metadata, new_versions):
+            return self._skip(config, checkpoint, metadata, new_versions)
+        parent_config, new_versions, early_writes = self._durable(config, checkpoint, new_versions)
+        saved_config = self.saver.put(parent_config, checkpoint, metadata, new_versions)
+        self._saved(config, saved_config)
+        for task_id, writes in early_writes:
+            self.put_writes(saved_config, writes, task_id)
+        return saved_config
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]],
+                   task_id: str) -> None:
+        if self._hold_writes(config, writes, task_id):
+            return
+        self.stats["writes_persisted"] += 1
+        return self.saver.put_writes(config, writes, task_id)
+
+    # Async interface
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        pending = self._get_pending(config)
+        if pending is not None:
+            return pending
+        self._load(config)
+        return await self.saver.aget_tuple(config)
+
+    async def alist(self, config: Optional[RunnableConfig], **kwargs: Any) -> AsyncIterator[CheckpointTuple]:
+        async for item in self.saver.alist(config, **kwargs):
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint,
+                   metadata: CheckpointMetadata, new_versions: ChannelVersions) -> RunnableConfig:
+        if self._first_put(config) and await self.saver.aget_tuple(config) is None:
+            latest = await self.saver.aget_tuple({"configurable": {**config["configurable"], "checkpoint_id": None}})
+            config, new_versions = self._orphaned(config, checkpoint, latest)
+        if not self._should_persist(metadata, new_versions):
+            return self._skip(config, checkpoint, metadata, new_versions)
+        parent_config, new_versions, early_writes = self._durable(config, checkpoint, new_versions)
+        # Only the tasks that ran on earlier checkpoints are done
+        buffer = await self._flush_writes(checkpoint["id"], inclusive=False)
+        if buffer is not None:
+            checkpoint = {
+                **checkpoint,
+                "channel_values": {name: buffer.resolve(value) for name, value in checkpoint["channel_values"].items()},
+            }
+        saved_config = await self.saver.aput(parent_config, checkpoint, metadata, new_versions)
+        self._saved(config, saved_config)
+        for task_id, writes in early_writes:
+            await self.aput_writes(saved_config, writes, task_id)
+        return saved_config
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]],
+                          task_id: str) -> None:
+        if self._hold_writes(config, writes, task_id):
+            return
+        buffer = await self._flush_writes(config.get("configurable", {}).get("checkpoint_id"), inclusive=True)
+        if buffer is not None:
+            writes = [(channel, buffer.resolve(value)) for channel, value in writes]
+        self.stats["writes_persisted"] += 1
+        return await self.saver.aput_writes(config, writes, task_id)
+
+    def get_next_version(self, current: Optional[Any], channel: Any) -> Any:
+        return self.saver.get_next_version(current, channel)
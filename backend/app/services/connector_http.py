@@ -0,0 +1,71 @@
+import asyncio
+import random
+from typing import Any, Dict, Optional
+import httpx
+
+# Backoff for 5xx responses and connection errors: base * 2^attempt, capped
+SERVER_ERROR_BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 8.0
+
+# Transport errors raised before the request reached the API; safe to retry any request
+CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def retry_after_seconds(response: httpx.Response, default: float) -> float:
+    """The response's Retry-After (seconds form), or default."""
+    try:
+        return max(0.0, float(response.headers.get("retry-after")))
+    except (TypeError, ValueError):
+        return default
+
+
+async def send(client: httpx.AsyncClient, method: str, path: str, stats: Dict[str, int],
+               max_retries: int, json: Optional[Dict[str, Any]] = None,
+               rate_limit_wait: float = 1.0, idempotent: bool = False,
+               limiter: Optional[Any] = None) -> Dict[str, Any]:
+    """
+    Send a connector API request and return the decoded JSON body.
+
+    429s are retried after Retry-After (rate_limit_wait when the API doesn't
+    send one), and connection errors with jittered exponential backoff. 5xx
+    responses and other transport errors (e.g. read timeouts) may come after
+    the API applied the request, so they are only retried for idempotent
+    requests; a retried create would create twice. After max_retries the last
+    error is raised. stats counts api_calls, retries, rate_limited,
+    server_errors and bytes_received.
+
+    A shared limiter (acquire, observe and penalize, like
+    hubspot_rate_limiter) is acquired before every attempt and shown every
+    response's headers. A 429 penalizes it rather than sleeping here, since
+    its next acquire waits out Retry-After for every worker.
+    """
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            await limiter.acquire()
+        stats["api_calls"] = stats.get("api_calls", 0) + 1
+        final = attempt == max_retries
+        try:
+            response = await client.request(method, path, json=json)
+        except httpx.TransportError as e:
+            if final or not (idempotent or isinstance(e, CONNECT_ERRORS)):
+                raise
+            stats["server_errors"] = stats.get("server_errors", 0) + 1
+            wait = min(MAX_BACKOFF_SECONDS, SERVER_ERROR_BACKOFF_SECONDS * 2 ** attempt)
+        else:
+            stats["bytes_received"] = stats.get("bytes_received", 0) + len(response.content)
+            if limiter is not None:
+                await limiter.observe(response.headers)
+            if response.status_code == 429 and not final:
+                stats["rate_limited"] = stats.get("rate_limited", 0) + 1
+                wait = retry_after_seconds(response, rate_limit_wait)
+                if limiter is not None:
+                    await limiter.penalize(wait)
+                    wait = 0.0
+            elif response.status_code >= 500 and idempotent and not final:
+                stats["server_errors"] = stats.get("server_errors", 0) + 1
+                wait = min(MAX_BACKOFF_SECONDS, SERVER_ERROR_BACKOFF_SECONDS * 2 ** attempt)
+            else:
+                response.raise_for_status()
+                return response.json()
+        stats["retries"] = stats.get("retries", 0) + 1
+        await asyncio.sleep(wait * random.uniform(1.0, 1.25))
@@ -0,0 +1,54 @@
+import asyncio
+from enum import Enum
+from typing import Any, Dict, List
+from .enrichment_cache import EnrichmentCache
+from .hubspot_client import HubSpotClient, SINGULAR
+
+
+class EnrichmentDepth(str, Enum):
+    """How much of the CRM graph around an event's object a workflow needs."""
+    DETAILS = "details"
+    ASSOCIATIONS = "associations"
+    ASSOCIATED_OBJECTS = "associated_objects"
+
+
+async def enrich(hubspot_client: HubSpotClient, cache: EnrichmentCache, object_type: str, object_id: str,
+                 occurred_at: Any = None, depth: EnrichmentDepth = EnrichmentDepth.ASSOCIATED_OBJECTS) -> Dict[str, Any]:
+    """
+    Fetch an object and, depending on depth, its associations and associated objects.
+
+    The fetches form a two-level dependency graph. The object details and its
+    association lists don't depend on each other and are fetched concurrently.
+    The associated objects depend on the association lists; they are requested
+    all at once, so the client's micro-batcher sends one batch read per object
+    type. Enrichment latency is the slowest call at each level, not the sum.
+    """
+    details_call = cache.get_object(object_type, object_id, min_version=occurred_at)
+    if depth == EnrichmentDepth.DETAILS:
+        return {"details": await details_call, "associations": {}}
+
+    details, associations = await asyncio.gather(
+        details_call, hubspot_client.get_associations(object_type, object_id)
+    )
+    if depth == EnrichmentDepth.ASSOCIATED_OBJECTS:
+        associations = await _attach_associated_objects(cache, associations)
+    return {"details": details, "associations": associations}
+
+
+async def _attach_associated_objects(cache: EnrichmentCache,
+                                     associations: Dict[str, List[Dict[str, Any]]]) -> Dict[str, List[Dict[str, Any]]]:
+    """Add each associated object's properties to its association entry."""
+    entries = [(to_type, item) for to_type, items in associations.items() for item in items]
+    objects = await asyncio.gather(
+        *(cache.get_object(SINGULAR[to_type], item["id"]) for to_type, item in entries),
+        return_exceptions=True,
+    )
+    attached: Dict[str, List[Dict[str, Any]]] = {to_type: [] for to_type in associations}
+    for (to_type, item), obj in zip(entries, objects):
+        if isinstance(obj, Exception):
+            # An associated object that can't be read is kept without properties
+            print(f"Could not fetch associated {to_type} {item['id']}: {obj}")
+            attached[to_type].append(item)
+        else:
+            attached[to_type].append({**item, "properties": obj.get("properties", {})})
+    return attached
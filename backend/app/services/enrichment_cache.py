@@ -0,0 +1,172 @@
+import asyncio
+import json
+from typing import Any, Dict, Optional, Tuple
+from app.config import settings
+from .hubspot_client import OBJECT_TYPES, to_epoch_ms, to_hubspot_timestamp
+from .hubspot_mirror import HubSpotMirror
+from .redis_service import redis_service
+
+# Webhook object type -> HubSpotClient getter
+FETCHERS = {"company": "get_company", "contact": "get_contact", "deal": "get_deal"}
+
+
+def _to_int(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _version(obj: Dict[str, Any]) -> Optional[int]:
+    """An object's version: its hs_lastmodifieddate in epoch millis."""
+    return to_epoch_ms(obj.get("properties", {}).get("hs_lastmodifieddate"))
+
+
+class EnrichmentCache:
+    """
+    Versioned cache of HubSpot objects in front of HubSpotClient.
+
+    Each entry holds an object and its version, the object's own
+    hs_lastmodifieddate. A lookup with min_version only accepts entries at
+    least that new. Writes are
+    compare-and-set on the version, so a slow fetch never overwrites newer
+    data. Webhook events go through observe_event first: a property change
+    upgrades the cached object in place, and any other event leaves a
+    tombstone at its occurredAt so the next lookup refetches. Concurrent
+    misses for the same object share one fetch, which reads the local
+    HubSpot mirror first and the API only when the mirror can't serve it. A
+    caller whose min_version the shared result doesn't reach fetches again
+    for itself.
+
+    Entries are keyed by the client's property projection, so a change to the
+    properties the workflows read starts from a fresh cache instead of
+    serving objects that lack the new properties.
+    """
+
+    _STORE_SCRIPT = """
+        local current = redis.call('GET', KEYS[1])
+        if current then
+            local stored = tonumber(cjson.decode(current)['version'])
+            if stored and stored > tonumber(ARGV[1]) then
+                return 0
+            end
+        end
+        redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+        return 1
+    """
+
+    def __init__(self, hubspot_client: Any, mirror: Optional[HubSpotMirror] = None):
+        self.hubspot_client = hubspot_client
+        self.mirror = mirror
+        self.redis_service = redis_service
+        self.ttl = settings.ENRICHMENT_CACHE_TTL_SECONDS
+        self._in_flight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "refetches": 0, "upgrades": 0, "invalidations": 0}
+
+    def _key(self, object_type: str, object_id: str) -> str:
+        projection = self.hubspot_client.projection_id(OBJECT_TYPES[object_type])
+        return f"enrichment:{object_type}:{projection}:{object_id}"
+
+    async def get_object(self, object_type: str, object_id: str, min_version: Any = None) -> Dict[str, Any]:
+        """Return the object from the cache if it is at least min_version, else fetch it."""
+        object_id = str(object_id)
+        min_version = _to_int(min_version)
+        entry = await self._get(object_type, object_id)
+        if entry and entry.get("object") is not None and (min_version is None or entry["version"] >= min_version):
+            self._stats["hits"] += 1
+            return entry["object"]
+
+        shared = self._in_flight.get((object_type, object_id))
+        if shared is not None:
+            self._stats["coalesced"] += 1
+            fetched = await asyncio.shield(shared)
+            if min_version is None or (_version(fetched) or 0) >= min_version:
+                return fetched
+            # The shared fetch started before the change this caller waits for
+            self._stats["refetches"] += 1
+        else:
+            self._stats["misses"] += 1
+        return await self._fetch(object_type, object_id, min_version)
+
+    async def _fetch(self, object_type: str, object_id: str, min_version: Optional[int]) -> Dict[str, Any]:
+        """Fetch an object, sharing the fetch with concurrent misses, and cache it at its own version."""
+        key = (object_type, object_id)
+        future = asyncio.get_running_loop().create_future()
+        # A refetch doesn't displace a fetch other callers are waiting on
+        owner = key not in self._in_flight
+        if owner:
+            self._in_flight[key] = future
+        try:
+            fetched = await self.mirror.get_object(object_type, object_id, min_version) if self.mirror else None
+            if fetched is None:
+                fetched = await getattr(self.hubspot_client, FETCHERS[object_type])(object_id)
+                if self.mirror:
+                    await self.mirror.store(OBJECT_TYPES[object_type], [fetched])
+            future.set_result(fetched)
+            await self._store(object_type, object_id, _version(fetched) or 0, fetched)
+            return fetched
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            if owner:
+                self._in_flight.pop(key, None)
+
+    async def observe_event(self, hubspot_event: Dict[str, Any]):
+        """Upgrade or invalidate the cached object a webhook event refers to."""
+        event_type = hubspot_event.get("subscriptionType") or ""
+        object_type = event_type.split(".")[0]
+        occurred_at = _to_int(hubspot_event.get("occurredAt"))
+        if object_type not in FETCHERS or occurred_at is None:
+            return
+        object_id = str(hubspot_event.get("objectId"))
+        entry = await self._get(object_type, object_id)
+        if entry and entry["version"] >= occurred_at:
+            return
+
+        property_name = hubspot_event.get("propertyName")
+        if entry and entry.get("object") is not None and event_type.endswith(".propertyChange") and property_name:
+            upgraded = json.loads(json.dumps(entry["object"]))
+            properties = upgraded.setdefault("properties", {})
+            if property_name in self.hubspot_client.properties[OBJECT_TYPES[object_type]]:
+                properties[property_name] = hubspot_event.get("propertyValue")
+            properties["hs_lastmodifieddate"] = to_hubspot_timestamp(occurred_at)
+            self._stats["upgrades"] += 1
+            await self._store(object_type, object_id, occurred_at, upgraded)
+        else:
+            # Tombstone: no entry older than this event can be (re)written
+            self._stats["invalidations"] += 1
+            await self._store(object_type, object_id, occurred_at, None)
+
+    async def _get(self, object_type: str, object_id: str) -> Optional[Dict[str, Any]]:
+        if self.redis_service.client is None:
+            return None
+        try:
+            payload = await self.redis_service.client.get(self._key(object_type, object_id))
+            return json.loads(payload) if payload else None
+        except Exception as e:
+            print(f"Error reading enrichment cache: {e}")
+            return None
+
+    async def _store(self, object_type: str, object_id: str, version: int, obj: Optional[Dict[str, Any]]):
+        if self.redis_service.client is None:
+            return
+        try:
+            await self.redis_service.client.eval(
+                self._STORE_SCRIPT, 1, self._key(object_type, object_id),
+                version, json.dumps({"version": version, "object": obj}), self.ttl,
+            )
+        except Exception as e:
+            print(f"Error writing enrichment cache: {e}")
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """Hit ratio and HubSpot calls saved (hits plus coalesced misses)."""
+        lookups = self._stats["hits"] + self._stats["misses"] + self._stats["coalesced"]
+        saved = self._stats["hits"] + self._stats["coalesced"] - self._stats["refetches"]
+        return {
+            **self._stats,
+            "hit_ratio": round(saved / lookups, 4) if lookups else 0.0,
+            "hubspot_calls_saved": saved,
+        }
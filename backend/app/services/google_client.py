@@ -1,18 +1,52 @@
 import asyncio
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+import httpx
+from app.config import settings
+from app.services.connector_http import send
 
 class GoogleClient:
     """
-    A mock client to simulate interactions with Google Calendar API.
+    Client for the Google Calendar API.
+
+    Without GOOGLE_ACCESS_TOKEN the client simulates Google Calendar.
+    GOOGLE_CALENDAR_API_URL can point at a local stand-in server.
     """
 
-    async def create_calendar_event(self, event_details: Dict[str, Any]) -> Dict[str, Any]:
-        """Simulates creating a Google Calendar event."""
+    def __init__(self, api_url: Optional[str] = None, access_token: Optional[str] = None):
+        self.api_url = api_url or settings.GOOGLE_CALENDAR_API_URL
+        self.access_token = access_token if access_token is not None else settings.GOOGLE_ACCESS_TOKEN
+        self._http: Optional[httpx.AsyncClient] = None
+        self.stats: Dict[str, int] = {"api_calls": 0}
+
+    @property
+    def simulated(self) -> bool:
+        return not self.access_token
+
+    async def create_calendar_event(self, event_details: Dict[str, Any],
+                                    calendar_id: str = "primary") -> Dict[str, Any]:
+        """Create a Google Calendar event."""
         print(f"[GoogleClient] Creating calendar event: {event_details.get('summary')}")
-        await asyncio.sleep(0.1) # Simulate network latency
-        return {
-            "id": "evt_random_id",
-            "summary": event_details.get("summary"),
-            "status": "confirmed",
-            "htmlLink": "https://calendar.google.com/event?id=evt_random_id",
-        }
+        if self.simulated:
+            await asyncio.sleep(0.1) # Simulate network latency
+            return {
+                "id": "evt_random_id",
+                "summary": event_details.get("summary"),
+                "status": "confirmed",
+                "htmlLink": "https://calendar.google.com/event?id=evt_random_id",
+            }
+        return await send(self._client(), "POST", f"/calendar/v3/calendars/{calendar_id}/events", self.stats,
+                          settings.CONNECTOR_MAX_RETRIES, json=event_details)
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                base_url=self.api_url,
+                headers={"Authorization": f"Bearer {self.access_token}"},
+                timeout=httpx.Timeout(30.0, connect=10.0),
+            )
+        return self._http
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
@@ -1,66 +1,290 @@
 import asyncio
-from typing import Dict, Any, List
+import hashlib
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+import httpx
+from app.config import settings
+from app.services.batching import MicroBatcher
+from app.services.connector_http import send
+from app.services.hubspot_rate_limiter import hubspot_rate_limiter
+
+# HubSpot CRM batch endpoints accept at most 100 inputs per call
+HUBSPOT_BATCH_LIMIT = 100
+
+# CRM object type (API path) for each webhook object type
+OBJECT_TYPES = {"company": "companies", "contact": "contacts", "deal": "deals"}
+
+# Properties requested for each object type when no projection is given
+DEFAULT_PROPERTIES = {
+    "companies": ["name", "domain", "industry", "numberofemployees", "annualrevenue",
+                  "lifecyclestage", "hs_lastmodifieddate"],
+    "contacts": ["email", "firstname", "lastname", "jobtitle", "phone", "company", "department",
+                 "seniority", "hs_lead_source", "hs_lastmodifieddate"],
+    "deals": ["dealname", "amount", "dealstage", "dealtype", "pipeline", "closedate",
+              "hs_deal_stage_probability", "hs_lastmodifieddate"],
+}
+
+# Associated object types fetched for each object type
+ASSOCIATION_TYPES = {
+    "contact": ["companies", "deals"],
+    "company": ["contacts", "deals"],
+    "deal": ["companies", "contacts"],
+}
+
+SINGULAR = {"companies": "company", "contacts": "contact", "deals": "deal"}
+
+# Always requested: enrichment versions cached objects by it
+VERSION_PROPERTY = "hs_lastmodifieddate"
+
+
+def to_epoch_ms(value: Any) -> Optional[int]:
+    """Parse a HubSpot timestamp (epoch millis or ISO 8601) into epoch millis."""
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return int(datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp() * 1000)
+    except ValueError:
+        return None
+
+
+def to_hubspot_timestamp(epoch_ms: int) -> str:
+    """Format epoch millis the way HubSpot returns timestamps, e.g. 2024-01-15T10:00:00.000Z."""
+    moment = datetime.fromtimestamp(epoch_ms / 1000, tz=timezone.utc)
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.") + f"{moment.microsecond // 1000:03d}Z"
+
+
+def property_projection(workflows: Iterable[Any]) -> Dict[str, List[str]]:
+    """
+    Union of the properties the given workflows read, per CRM object type.
+
+    Workflows declare REQUIRED_PROPERTIES ({object type: [properties]}); one
+    that doesn't is assumed to read DEFAULT_PROPERTIES.
+    """
+    projection = {object_type: {VERSION_PROPERTY} for object_type in DEFAULT_PROPERTIES}
+    for workflow in workflows:
+        required = getattr(workflow, "REQUIRED_PROPERTIES", None) or DEFAULT_PROPERTIES
+        for object_type, properties in required.items():
+            projection[object_type].update(properties)
+    return {object_type: sorted(properties) for object_type, properties in projection.items()}
+
 
 class HubSpotClient:
     """
-    A mock client to simulate interactions with the HubSpot API.
-    In a real application, this would make HTTP requests to HubSpot.
+    HubSpot CRM client built on the batch-read endpoints.
+
+    get_contact/get_company/get_deal and get_associations don't call HubSpot
+    one object at a time: concurrent requests are collected for
+    HUBSPOT_BATCH_WAIT_MS by a per-endpoint MicroBatcher and sent as one
+    batch read of up to 100 IDs, and each caller gets its own object back
+    (or its own error). HUBSPOT_BASE_URL can point at a local stand-in
+    server. Without HUBSPOT_ACCESS_TOKEN the client simulates HubSpot
+    responses, one simulated round trip per batch.
+
+    Objects are read with a property projection per object type (by default
+    DEFAULT_PROPERTIES), so one batch read serves every caller and the
+    response carries only the properties the workflows use.
+
+    Every API call first takes a token from the cluster-wide rate limiter and
+    is retried after Retry-After on a 429, or with backoff on a 5xx, up to
+    HUBSPOT_MAX_RETRIES times.
     """
 
-    async def get_contact(self, contact_id: str) -> Dict[str, Any]:
-        """Simulates fetching a contact from HubSpot."""
-        print(f"[HubSpotClient] Fetching contact: {contact_id}")
-        await asyncio.sleep(0.1)  # Simulate network latency
-        return {
-            "id": contact_id,
-            "properties": {
-                "email": f"contact_{contact_id}@example.com",
-                "firstname": "John",
-                "lastname": "Doe",
-                "jobtitle": "Software Engineer",
-            }
+    def __init__(self, base_url: Optional[str] = None, access_token: Optional[str] = None,
+                 properties: Optional[Dict[str, List[str]]] = None):
+        self.base_url = base_url or settings.HUBSPOT_BASE_URL
+        self.access_token = access_token if access_token is not None else settings.HUBSPOT_ACCESS_TOKEN
+        self.max_wait = settings.HUBSPOT_BATCH_WAIT_MS / 1000
+        self._http: Optional[httpx.AsyncClient] = None
+        self._loaders: Dict[str, MicroBatcher] = {}
+        self.properties = {
+            object_type: sorted(set((properties or {}).get(object_type) or defaults) | {VERSION_PROPERTY})
+            for object_type, defaults in DEFAULT_PROPERTIES.items()
         }
+        self.stats = {"api_calls": 0, "objects_requested": 0, "bytes_received": 0, "retries": 0}
+
+    @property
+    def simulated(self) -> bool:
+        return not self.access_token
+
+    def projection_id(self, object_type: str) -> str:
+        """Short, stable identifier of the property projection used for an object type."""
+        return hashlib.blake2b(",".join(self.properties[object_type]).encode("utf-8"), digest_size=4).hexdigest()
+
+    async def get_contact(self, contact_id: str) -> Dict[str, Any]:
+        """Fetch a contact from HubSpot."""
+        return await self._loader("contacts").submit(contact_id)
 
     async def get_company(self, company_id: str) -> Dict[str, Any]:
-        """Simulates fetching a company from HubSpot."""
-        print(f"[HubSpotClient] Fetching company: {company_id}")
-        await asyncio.sleep(0.1)
-        return {
-            "id": company_id,
-            "properties": {
-                "name": f"Company {company_id} Inc.",
-                "domain": f"company{company_id}.com",
-                "industry": "Technology",
-            }
-        }
+        """Fetch a company from HubSpot."""
+        return await self._loader("companies").submit(company_id)
 
     async def get_deal(self, deal_id: str) -> Dict[str, Any]:
-        """Simulates fetching a deal from HubSpot."""
-        print(f"[HubSpotClient] Fetching deal: {deal_id}")
-        await asyncio.sleep(0.1)
-        return {
-            "id": deal_id,
-            "properties": {
-                "dealname": f"Big Deal {deal_id}",
-                "amount": "50000.00",
-                "dealstage": "presentationscheduled",
-            }
-        }
+        """Fetch a deal from HubSpot."""
+        return await self._loader("deals").submit(deal_id)
 
     async def get_associations(
         self, object_type: str, object_id: str
     ) -> Dict[str, List[Dict[str, Any]]]:
-        """Simulates fetching associations for a HubSpot object."""
-        print(f"[HubSpotClient] Fetching associations for {object_type}:{object_id}")
+        """Fetch associated object IDs for a HubSpot object, by associated object type."""
+        to_types = ASSOCIATION_TYPES.get(object_type, [])
+        results = await asyncio.gather(*(
+            self._loader(f"associations:{OBJECT_TYPES[object_type]}:{to_type}").submit(object_id)
+            for to_type in to_types
+        ))
+        return {to_type: result for to_type, result in zip(to_types, results) if result}
+
+    async def batch_read(self, object_type: str, ids: List[str],
+                         properties: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Read objects by ID with the CRM batch-read endpoint, in chunks of 100.
+        Returns {id: object}; IDs HubSpot doesn't know are left out.
+        """
+        unique_ids = list(dict.fromkeys(str(i) for i in ids))
+        properties = properties or self.properties[object_type]
+        found: Dict[str, Dict[str, Any]] = {}
+        for start in range(0, len(unique_ids), HUBSPOT_BATCH_LIMIT):
+            chunk = unique_ids[start:start + HUBSPOT_BATCH_LIMIT]
+            if self.simulated:
+                results = await self._simulate_read(object_type, chunk, properties)
+            else:
+                response = await self._post(f"/crm/v3/objects/{object_type}/batch/read", {
+                    "properties": properties,
+                    "inputs": [{"id": object_id} for object_id in chunk],
+                })
+                results = response.get("results", [])
+            for result in results:
+                found[str(result["id"])] = {"id": str(result["id"]), "properties": result.get("properties", {})}
+        return found
+
+    async def batch_read_associations(self, from_type: str, to_type: str,
+                                      ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Read associations for many objects with the v4 batch endpoint. Returns {id: [associations]}."""
+        unique_ids = list(dict.fromkeys(str(i) for i in ids))
+        label = f"{SINGULAR[from_type]}_to_{SINGULAR[to_type]}"
+        found: Dict[str, List[Dict[str, Any]]] = {}
+        for start in range(0, len(unique_ids), HUBSPOT_BATCH_LIMIT):
+            chunk = unique_ids[start:start + HUBSPOT_BATCH_LIMIT]
+            if self.simulated:
+                results = await self._simulate_associations(from_type, to_type, chunk)
+            else:
+                response = await self._post(f"/crm/v4/associations/{from_type}/{to_type}/batch/read", {
+                    "inputs": [{"id": object_id} for object_id in chunk],
+                })
+                results = response.get("results", [])
+            for result in results:
+                found[str(result["from"]["id"])] = [
+                    {"id": str(item["toObjectId"]), "type": label} for item in result.get("to", [])
+                ]
+        return found
+
+    async def search_modified_since(self, object_type: str, since: Optional[int], after: Optional[str] = None,
+                                    limit: int = 100) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        One page of the CRM search endpoint: objects modified at or after since
+        (epoch millis), oldest first. Returns (objects, cursor of the next page).
+        """
+        if self.simulated:
+            return [], None
+        body: Dict[str, Any] = {
+            "sorts": [{"propertyName": VERSION_PROPERTY, "direction": "ASCENDING"}],
+            "properties": self.properties[object_type],
+            "limit": limit,
+        }
+        if since is not None:
+            body["filterGroups"] = [{"filters": [
+                {"propertyName": VERSION_PROPERTY, "operator": "GTE", "value": str(since)}
+            ]}]
+        if after:
+            body["after"] = after
+        response = await self._post(f"/crm/v3/objects/{object_type}/search", body)
+        results = [
+            {"id": str(result["id"]), "properties": result.get("properties", {})}
+            for result in response.get("results", [])
+        ]
+        return results, response.get("paging", {}).get("next", {}).get("after")
+
+    def _loader(self, key: str) -> MicroBatcher:
+        if key not in self._loaders:
+            if key.startswith("associations:"):
+                _, from_type, to_type = key.split(":")
+
+                async def load(ids: List[str]) -> List[Any]:
+                    found = await self.batch_read_associations(from_type, to_type, ids)
+                    return [found.get(str(object_id), []) for object_id in ids]
+            else:
+                async def load(ids: List[str]) -> List[Any]:
+                    found = await self.batch_read(key, ids)
+                    return [
+                        found.get(str(object_id)) or KeyError(f"HubSpot {key} {object_id} not found")
+                        for object_id in ids
+                    ]
+            self._loaders[key] = MicroBatcher(load, max_batch_size=HUBSPOT_BATCH_LIMIT, max_wait=self.max_wait)
+        return self._loaders[key]
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {self.access_token}"},
+                timeout=httpx.Timeout(30.0, connect=10.0),
+            )
+        return self._http
+
+    async def _post(self, path: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        """A read-only POST (batch read or search), paced by the shared rate limiter."""
+        self.stats["objects_requested"] += len(body.get("inputs", []))
+        return await send(
+            self._client(), "POST", path, self.stats, settings.HUBSPOT_MAX_RETRIES, json=body,
+            idempotent=True, limiter=hubspot_rate_limiter,
+        )
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def _simulate_read(self, object_type: str, ids: List[str], properties: List[str]) -> List[Dict[str, Any]]:
+        """Simulated batch read: one round trip for the whole chunk, projected like the real API."""
+        print(f"[HubSpotClient] Fetching {len(ids)} {object_type}: {ids}")
+        self.stats["api_calls"] += 1
+        self.stats["objects_requested"] += len(ids)
+        await asyncio.sleep(0.1)  # Simulate network latency
+        if object_type == "contacts":
+            results = [{"id": i, "properties": {
+                "email": f"contact_{i}@example.com",
+                "firstname": "John",
+                "lastname": "Doe",
+                "jobtitle": "Software Engineer",
+            }} for i in ids]
+        elif object_type == "companies":
+            results = [{"id": i, "properties": {
+                "name": f"Company {i} Inc.",
+                "domain": f"company{i}.com",
+                "industry": "Technology",
+            }} for i in ids]
+        else:
+            results = [{"id": i, "properties": {
+                "dealname": f"Big Deal {i}",
+                "amount": "50000.00",
+                "dealstage": "presentationscheduled",
+            }} for i in ids]
+        # The simulated objects are current as of the read
+        modified = to_hubspot_timestamp(int(datetime.now(timezone.utc).timestamp() * 1000))
+        for result in results:
+            result["properties"][VERSION_PROPERTY] = modified
+            result["properties"] = {k: v for k, v in result["properties"].items() if k in properties}
+        return results
+
+    async def _simulate_associations(self, from_type: str, to_type: str, ids: List[str]) -> List[Dict[str, Any]]:
+        print(f"[HubSpotClient] Fetching {from_type} to {to_type} associations for {len(ids)} objects")
+        self.stats["api_calls"] += 1
+        self.stats["objects_requested"] += len(ids)
         await asyncio.sleep(0.1)
-        if object_type == "contact":
-            return {
-                "companies": [{"id": "comp_123", "type": "contact_to_company"}],
-                "deals": [{"id": "deal_456", "type": "contact_to_deal"}],
-            }
-        elif object_type == "company":
-            return {
-                "contacts": [{"id": "cont_789", "type": "company_to_contact"}],
-                "deals": [{"id": "deal_456", "type": "company_to_deal"}],
-            }
-        return {}
+        associated = {"companies": "comp_123", "contacts": "cont_789", "deals": "deal_456"}
+        if from_type == "deals":
+            return []
+        return [{"from": {"id": i}, "to": [{"toObjectId": associated[to_type]}]} for i in ids]
@@ -0,0 +1,329 @@
+import json
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from app.config import settings
+from app.database import AsyncSessionLocal, engine
+from app.models import Account, Contact, Deal
+from .batching import MicroBatcher
+from .hubspot_client import HUBSPOT_BATCH_LIMIT, OBJECT_TYPES, HubSpotClient
+from .hubspot_rate_limiter import HubSpotPriority, hubspot_priority
+from .redis_service import redis_service
+
+# HubSpot search returns at most 10,000 results per query; past that the
+# sync restarts the query from the last modification date it has seen.
+SEARCH_RESULT_LIMIT = 10000
+SEARCH_PAGE_SIZE = 200
+
+# Key in a row's properties JSON holding the epoch-ms version of each property
+# changed by a webhook delta since the row was written. HubSpot property names
+# start with a letter, so it can't clash with one.
+PROPERTY_VERSIONS_KEY = "@versions"
+
+
+def _to_datetime(value: Any) -> Optional[datetime]:
+    """Parse a HubSpot timestamp (epoch millis or ISO 8601) into a naive UTC datetime."""
+    if value in (None, ""):
+        return None
+    try:
+        parsed = datetime.fromtimestamp(int(value) / 1000, tz=timezone.utc)
+    except (TypeError, ValueError):
+        try:
+            parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _to_epoch_ms(value: Optional[datetime]) -> Optional[int]:
+    return int(value.replace(tzinfo=timezone.utc).timestamp() * 1000) if value else None
+
+
+def _apply_property_change(properties: Dict[str, Any], row_version: Optional[int], name: str,
+                           value: Any, occurred_at: int) -> bool:
+    """
+    Apply one property change to a row's properties if it is newer than that
+    property's version (the row's version until a delta changed it).
+    Returns whether it was applied.
+    """
+    versions = properties.setdefault(PROPERTY_VERSIONS_KEY, {})
+    if occurred_at <= (versions.get(name) or row_version or 0):
+        return False
+    properties[name] = value
+    versions[name] = occurred_at
+    return True
+
+
+def _number(value: Any, cast: Callable[[Any], Any]) -> Any:
+    try:
+        return cast(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _account_columns(p: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "name": p.get("name") or "",
+        "domain": p.get("domain"),
+        "industry": p.get("industry"),
+        "employee_count": _number(p.get("numberofemployees"), lambda v: int(float(v))),
+        "annual_revenue": _number(p.get("annualrevenue"), float),
+        "lifecycle_stage": p.get("lifecyclestage"),
+    }
+
+
+def _contact_columns(p: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "email": p.get("email"),
+        "first_name": p.get("firstname"),
+        "last_name": p.get("lastname"),
+        "job_title": p.get("jobtitle"),
+        "phone": p.get("phone"),
+        "lifecycle_stage": p.get("lifecyclestage"),
+    }
+
+
+def _deal_columns(p: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "name": p.get("dealname") or "",
+        "stage": p.get("dealstage") or "",
+        "amount": _number(p.get("amount"), float),
+        "close_date": _to_datetime(p.get("closedate")),
+        "probability": _number(p.get("hs_deal_stage_probability"), float),
+    }
+
+
+# CRM object type -> (mirror table model, typed columns from HubSpot properties)
+MIRROR_MODELS = {
+    "companies": (Account, _account_columns),
+    "contacts": (Contact, _contact_columns),
+    "deals": (Deal, _deal_columns),
+}
+
+
+class HubSpotMirror:
+    """
+    Local mirror of HubSpot companies, contacts and deals in the accounts,
+    contacts and deals tables.
+
+    sync() pages through CRM search results sorted by hs_lastmodifieddate,
+    starting at a per-type cursor kept in Redis, and bulk-upserts them
+    HUBSPOT_MIRROR_UPSERT_BATCH rows per statement. Its HubSpot calls run at
+    backfill priority. apply_event() applies webhook deltas as they arrive,
+    and store() writes through objects enrichment had to fetch from the API.
+    A row is only ever replaced by a newer version of the object.
+
+    A delta changes one property, so it is versioned on its own and never
+    raises the row's version (hs_lastmodifieddate): the other properties are
+    still as old as the row. A later delta for another property with an older
+    occurredAt still applies.
+
+    get_object() serves enrichment: concurrent lookups for a type are
+    collected into one indexed query on hubspot_id. It returns None when the
+    mirror is disabled, unavailable, older than min_version or lacks a
+    property the client's projection needs; enrichment then falls back to
+    the API.
+    """
+
+    CURSOR_KEY = "hubspot_mirror:cursor:{object_type}"
+
+    def __init__(self, hubspot_client: HubSpotClient):
+        self.hubspot_client = hubspot_client
+        self.redis_service = redis_service
+        self.enabled = settings.HUBSPOT_MIRROR_ENABLED
+        self.upsert_batch = settings.HUBSPOT_MIRROR_UPSERT_BATCH
+        self._loaders: Dict[str, MicroBatcher] = {}
+        self.stats = {"hits": 0, "misses": 0, "synced": 0, "deltas": 0, "written_through": 0}
+
+    async def create_tables(self):
+        """Create the mirror tables if they don't exist yet."""
+        async with engine.begin() as conn:
+            await conn.run_sync(
+                lambda sync_conn: Account.metadata.create_all(
+                    sync_conn, tables=[model.__table__ for model, _ in MIRROR_MODELS.values()]
+                )
+            )
+
+    async def sync(self, object_type: Optional[str] = None) -> Dict[str, int]:
+        """Pull everything modified since the last sync, for one or all object types."""
+        object_types = [object_type] if object_type else list(MIRROR_MODELS)
+        synced = {}
+        with hubspot_priority(HubSpotPriority.BACKFILL):
+            for crm_type in object_types:
+                synced[crm_type] = await self._sync_type(crm_type)
+        return synced
+
+    async def _sync_type(self, object_type: str) -> int:
+        cursor_key = self.CURSOR_KEY.format(object_type=object_type)
+        stored = await self.redis_service.client.get(cursor_key)
+        since = int(stored) if stored else None
+        query_since, after = since, None
+        fetched, pending = 0, []
+        while True:
+            page, after = await self.hubspot_client.search_modified_since(
+                object_type, query_since, after, limit=SEARCH_PAGE_SIZE
+            )
+            pending.extend(page)
+            fetched += len(page)
+            if len(pending) >= self.upsert_batch or not after:
+                since = await self._flush_sync_batch(object_type, pending, since, cursor_key)
+                pending = []
+            if not after:
+                break
+            if int(after) >= SEARCH_RESULT_LIMIT:
+                # Restart the query from the newest modification date seen so far
+                since = await self._flush_sync_batch(object_type, pending, since, cursor_key)
+                if since == query_since:
+                    print(f"[HubSpotMirror] Over {SEARCH_RESULT_LIMIT} {object_type} share one modification date; stopping at it")
+                    break
+                query_since, pending, after = since, [], None
+        print(f"[HubSpotMirror] Synced {fetched} {object_type}")
+        self.stats["synced"] += fetched
+        return fetched
+
+    async def _flush_sync_batch(self, object_type: str, objects: List[Dict[str, Any]],
+                                since: Optional[int], cursor_key: str) -> Optional[int]:
+        """Upsert a batch and advance the cursor to its newest modification date."""
+        if not objects:
+            return since
+        await self._upsert(object_type, objects)
+        newest = max(
+            (_to_epoch_ms(_to_datetime(o["properties"].get("hs_lastmodifieddate"))) or 0 for o in objects),
+            default=0,
+        )
+        if newest and (since is None or newest > since):
+            # The search filter is GTE, so objects sharing the cursor's timestamp are re-read, never skipped
+            await self.redis_service.client.set(cursor_key, newest)
+            return newest
+        return since
+
+    async def store(self, object_type: str, objects: List[Dict[str, Any]]):
+        """Write through objects fetched from the API (best effort)."""
+        if not self.enabled or not objects:
+            return
+        try:
+            await self._upsert(object_type, objects)
+            self.stats["written_through"] += len(objects)
+        except Exception as e:
+            print(f"Error writing HubSpot mirror: {e}")
+
+    async def _upsert(self, object_type: str, objects: List[Dict[str, Any]]):
+        model, columns = MIRROR_MODELS[object_type]
+        rows: Dict[str, Dict[str, Any]] = {}
+        for obj in objects:
+            properties = obj.get("properties", {})
+            modified = _to_datetime(properties.get("hs_lastmodifieddate"))
+            if modified is None:
+                continue
+            # One row per object per statement; the newest version wins
+            previous = rows.get(str(obj["id"]))
+            if previous and previous["last_modified_date"] > modified:
+                continue
+            rows[str(obj["id"])] = {
+                "id": str(uuid.uuid4()),
+                "hubspot_id": str(obj["id"]),
+                "last_modified_date": modified,
+                "properties": json.dumps(properties),
+                **columns(properties),
+            }
+        if not rows:
+            return
+        values = list(rows.values())
+        updated = [name for name in values[0] if name not in ("id", "hubspot_id")]
+        async with AsyncSessionLocal() as session:
+            for start in range(0, len(values), self.upsert_batch):
+                statement = insert(model).values(values[start:start + self.upsert_batch])
+                statement = statement.on_conflict_do_update(
+                    index_elements=[model.hubspot_id],
+                    set_={**{name: statement.excluded[name] for name in updated}, "updated_at": func.now()},
+                    where=model.last_modified_date <= statement.excluded.last_modified_date,
+                )
+                await session.execute(statement)
+            await session.commit()
+
+    async def apply_event(self, hubspot_event: Dict[str, Any]):
+        """Apply a webhook delta (property change or deletion) to the mirrored row."""
+        if not self.enabled:
+            return
+        event_type = hubspot_event.get("subscriptionType") or ""
+        object_type = OBJECT_TYPES.get(event_type.split(".")[0])
+        occurred_at = _to_datetime(hubspot_event.get("occurredAt"))
+        if object_type is None or occurred_at is None:
+            return
+        model, columns = MIRROR_MODELS[object_type]
+        hubspot_id = str(hubspot_event.get("objectId"))
+        try:
+            async with AsyncSessionLocal() as session:
+                if event_type.endswith(".deletion"):
+                    await session.execute(delete(model).where(
+                        model.hubspot_id == hubspot_id, model.last_modified_date <= occurred_at
+                    ))
+                elif event_type.endswith(".propertyChange") and hubspot_event.get("propertyName"):
+                    row = (await session.execute(
+                        select(model).where(model.hubspot_id == hubspot_id).with_for_update()
+                    )).scalar_one_or_none()
+                    # Objects not mirrored yet arrive with the next sync or enrichment fetch
+                    if row is None:
+                        return
+                    properties = json.loads(row.properties or "{}")
+                    if not _apply_property_change(
+                        properties, _to_epoch_ms(row.last_modified_date), hubspot_event["propertyName"],
+                        hubspot_event.get("propertyValue"), _to_epoch_ms(occurred_at),
+                    ):
+                        return
+                    for name, value in columns(properties).items():
+                        setattr(row, name, value)
+                    row.properties = json.dumps(properties)
+                else:
+                    return
+                await session.commit()
+                self.stats["deltas"] += 1
+        except Exception as e:
+            print(f"Error applying webhook delta to HubSpot mirror: {e}")
+
+    async def get_object(self, object_type: str, object_id: str,
+                         min_version: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """The mirrored object if it is at least min_version and has the projected properties."""
+        if not self.enabled:
+            return None
+        crm_type = OBJECT_TYPES[object_type]
+        try:
+            found = await self._loader(crm_type).submit(str(object_id))
+        except Exception as e:
+            print(f"Error reading HubSpot mirror: {e}")
+            return None
+        if found is None or (min_version is not None and (found["version"] or 0) < min_version):
+            self.stats["misses"] += 1
+            return None
+        properties = json.loads(found["properties"] or "{}")
+        projection = self.hubspot_client.properties[crm_type]
+        if any(name not in properties for name in projection):
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return {"id": str(object_id), "properties": {name: properties[name] for name in projection}}
+
+    def _loader(self, object_type: str) -> MicroBatcher:
+        if object_type not in self._loaders:
+            model, _ = MIRROR_MODELS[object_type]
+
+            async def load(ids: List[str]) -> List[Any]:
+                async with AsyncSessionLocal() as session:
+                    rows = (await session.execute(
+                        select(model.hubspot_id, model.properties, model.last_modified_date)
+                        .where(model.hubspot_id.in_(ids))
+                    )).all()
+                found = {
+                    row.hubspot_id: {"properties": row.properties, "version": _to_epoch_ms(row.last_modified_date)}
+                    for row in rows
+                }
+                return [found.get(object_id) for object_id in ids]
+
+            self._loaders[object_type] = MicroBatcher(
+                load, max_batch_size=HUBSPOT_BATCH_LIMIT, max_wait=settings.HUBSPOT_BATCH_WAIT_MS / 1000
+            )
+        return self._loaders[object_type]
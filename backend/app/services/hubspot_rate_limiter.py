@@ -0,0 +1,184 @@
+import asyncio
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from enum import IntEnum
+from typing import Any, Mapping, Optional
+from app.config import settings
+from app.middleware.error_handler import ExternalServiceError
+from .batching import current_batch_scope
+from .redis_service import redis_service
+
+
+class HubSpotPriority(IntEnum):
+    """Interactive enrichment may use the whole bucket; backfill leaves a reserve for it."""
+    INTERACTIVE = 0
+    BACKFILL = 1
+
+
+_priority: ContextVar[Optional[HubSpotPriority]] = ContextVar("hubspot_priority", default=None)
+
+
+@contextmanager
+def hubspot_priority(priority: HubSpotPriority):
+    """Run the enclosed HubSpot calls at the given priority (e.g. BACKFILL for reconciliation jobs)."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> HubSpotPriority:
+    """Explicit priority if set; batch runs count as backfill, everything else as interactive."""
+    priority = _priority.get()
+    if priority is not None:
+        return priority
+    return HubSpotPriority.BACKFILL if current_batch_scope() is not None else HubSpotPriority.INTERACTIVE
+
+
+class HubSpotRateLimiter:
+    """
+    Cluster-wide token bucket for HubSpot API calls, kept in Redis.
+
+    The bucket holds HUBSPOT_BURST_LIMIT tokens refilled over
+    HUBSPOT_BURST_INTERVAL_MS, and a per-day counter enforces
+    HUBSPOT_DAILY_LIMIT. Backfill calls cannot take the last
+    HUBSPOT_BACKFILL_RESERVE share of the bucket, so interactive enrichment
+    keeps flowing during a backfill. After every response the bucket is synced
+    to HubSpot's X-HubSpot-RateLimit-* headers, and a 429 empties it until
+    Retry-After. Callers wait for a token instead of failing, except when the
+    daily quota is used up: interactive calls then fail at once, so their
+    event is retried or dead-lettered, and backfill calls wait for the reset
+    for at most HUBSPOT_MAX_QUOTA_WAIT_SECONDS.
+    """
+
+    BUCKET_KEY = "hubspot_rate:bucket"
+
+    _ACQUIRE_SCRIPT = """
+        local now = tonumber(ARGV[1])
+        local b = redis.call('HMGET', KEYS[1], 'tokens', 'ts', 'capacity', 'interval')
+        local capacity = tonumber(b[3]) or tonumber(ARGV[2])
+        local interval = tonumber(b[4]) or tonumber(ARGV[3])
+        local rate = capacity / interval
+        local tokens = tonumber(b[1]) or capacity
+        local ts = tonumber(b[2]) or now
+        tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+        if now > ts then ts = now end
+        if tonumber(redis.call('GET', KEYS[2]) or '0') >= tonumber(ARGV[6]) then
+            return -1
+        end
+        local floor = 0
+        if ARGV[5] == '1' then floor = capacity * tonumber(ARGV[4]) end
+        if tokens - 1 < floor then
+            redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', ts)
+            return math.max(1, math.ceil((floor + 1 - tokens) / rate) + math.max(0, ts - now))
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens - 1), 'ts', ts)
+        redis.call('PEXPIRE', KEYS[1], interval * 10)
+        redis.call('INCR', KEYS[2])
+        redis.call('EXPIRE', KEYS[2], 172800)
+        return 0
+    """
+
+    _OBSERVE_SCRIPT = """
+        if ARGV[3] ~= '' then redis.call('HSET', KEYS[1], 'capacity', ARGV[3]) end
+        if ARGV[4] ~= '' then redis.call('HSET', KEYS[1], 'interval', ARGV[4]) end
+        if ARGV[2] ~= '' then
+            local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens') or ARGV[2])
+            redis.call('HSET', KEYS[1], 'tokens', tostring(math.min(tokens, tonumber(ARGV[2]))))
+            if not redis.call('HGET', KEYS[1], 'ts') then redis.call('HSET', KEYS[1], 'ts', ARGV[1]) end
+        end
+        if ARGV[5] ~= '' then
+            redis.call('SET', KEYS[2], math.max(0, tonumber(ARGV[6]) - tonumber(ARGV[5])), 'EX', 172800)
+        end
+        return 1
+    """
+
+    def __init__(self):
+        self.redis_service = redis_service
+        self.capacity = settings.HUBSPOT_BURST_LIMIT
+        self.interval_ms = settings.HUBSPOT_BURST_INTERVAL_MS
+        self.daily_limit = settings.HUBSPOT_DAILY_LIMIT
+        self.backfill_reserve = settings.HUBSPOT_BACKFILL_RESERVE
+        self.max_quota_wait = settings.HUBSPOT_MAX_QUOTA_WAIT_SECONDS
+        self.stats = {"acquired": 0, "waits": 0, "wait_seconds": 0.0, "rate_limited": 0, "quota_exhausted": 0}
+
+    @staticmethod
+    def _daily_key() -> str:
+        return f"hubspot_rate:daily:{datetime.now(timezone.utc):%Y%m%d}"
+
+    async def acquire(self, priority: Optional[HubSpotPriority] = None):
+        """
+        Wait until a token is available for a call at this priority. Raises
+        ExternalServiceError when the daily quota is used up (see class docstring).
+        """
+        priority = current_priority() if priority is None else priority
+        started = time.perf_counter()
+        while True:
+            wait_ms = await self._try_acquire(priority)
+            if wait_ms == 0:
+                break
+            if wait_ms < 0:
+                # Daily quota used up; only backfill polls for the reset, and not forever
+                waited = time.perf_counter() - started
+                if priority == HubSpotPriority.INTERACTIVE or waited >= self.max_quota_wait:
+                    self.stats["quota_exhausted"] += 1
+                    raise ExternalServiceError("hubspot", "HubSpot daily API quota is used up")
+                wait_ms = min(60000, (self.max_quota_wait - waited) * 1000)
+            self.stats["waits"] += 1
+            await asyncio.sleep(wait_ms / 1000 * random.uniform(1.0, 1.2))
+        self.stats["acquired"] += 1
+        self.stats["wait_seconds"] += time.perf_counter() - started
+
+    async def _try_acquire(self, priority: HubSpotPriority) -> int:
+        if self.redis_service.client is None:
+            return 0
+        try:
+            return int(await self.redis_service.client.eval(
+                self._ACQUIRE_SCRIPT, 2, self.BUCKET_KEY, self._daily_key(),
+                int(time.time() * 1000), self.capacity, self.interval_ms,
+                self.backfill_reserve, int(priority), self.daily_limit,
+            ))
+        except Exception as e:
+            # If Redis is down, let the call through; HubSpot's own limits still apply
+            print(f"Error acquiring HubSpot rate-limit token: {e}")
+            return 0
+
+    async def observe(self, headers: Mapping[str, Any]):
+        """Sync the shared bucket with HubSpot's rate-limit response headers."""
+        def header(name: str) -> str:
+            value = headers.get(name)
+            return str(value) if value not in (None, "") else ""
+
+        remaining = header("x-hubspot-ratelimit-remaining")
+        daily_remaining = header("x-hubspot-ratelimit-daily-remaining")
+        if (not remaining and not daily_remaining) or self.redis_service.client is None:
+            return
+        try:
+            await self.redis_service.client.eval(
+                self._OBSERVE_SCRIPT, 2, self.BUCKET_KEY, self._daily_key(),
+                int(time.time() * 1000), remaining,
+                header("x-hubspot-ratelimit-max"), header("x-hubspot-ratelimit-interval-milliseconds"),
+                daily_remaining, header("x-hubspot-ratelimit-daily") or self.daily_limit,
+            )
+        except Exception as e:
+            print(f"Error syncing HubSpot rate-limit headers: {e}")
+
+    async def penalize(self, retry_after: Optional[float]):
+        """After a 429, empty the bucket for every worker until Retry-After has passed."""
+        self.stats["rate_limited"] += 1
+        resume_at = int((time.time() + (retry_after or 1.0)) * 1000)
+        if self.redis_service.client is None:
+            await asyncio.sleep(retry_after or 1.0)
+            return
+        try:
+            await self.redis_service.client.hset(self.BUCKET_KEY, mapping={"tokens": 0, "ts": resume_at})
+        except Exception as e:
+            print(f"Error recording HubSpot 429: {e}")
+
+
+# Global instance
+hubspot_rate_limiter = HubSpotRateLimiter()
@@ -6,6 +6,7 @@ from langgraph.checkpoint.redis import RedisSaver
 from langgraph.graph import StateGraph
 from langchain_core.messages import HumanMessage
 from .workflow_engine import workflow_engine
+from .blob_store import blob_store
 from ..config import settings
 import inngest
 
@@ -68,7 +69,7 @@ class InngestService:
             
             # Prepare LangGraph workflow input from the envelope
             workflow_input = {
-                "hubspot_event": envelope.get("payload", {}),
+                "hubspot_event": await blob_store.offload(envelope.get("payload", {})),
                 "enriched_data": {},  # This would be populated by the event processor
                 "correlation_id": correlation_id,
                 "workflow_name": name
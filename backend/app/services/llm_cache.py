@@ -0,0 +1,111 @@
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from cachetools import LRUCache
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from app.config import settings
+from .redis_service import redis_service
+
+
+class LLMResponseCache:
+    """
+    Exact-match cache for deterministic (temperature 0) LLM calls.
+
+    Keys are a hash of the model, the call parameters and the messages with
+    whitespace normalized, so prompts that only differ in indentation share
+    an entry. Responses are kept in Redis with a TTL (and in a small local
+    LRU); entries above LLM_CACHE_MAX_ENTRY_BYTES are not cached. Identical
+    requests that are in flight at the same time are coalesced into one call.
+    """
+
+    def __init__(self):
+        self.redis_service = redis_service
+        self.enabled = settings.LLM_CACHE_ENABLED
+        self.ttl = settings.LLM_CACHE_TTL_SECONDS
+        self.max_entry_bytes = settings.LLM_CACHE_MAX_ENTRY_BYTES
+        self._local: LRUCache = LRUCache(maxsize=256)
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        # Per workflow node: hits, misses, coalesced
+        self.node_stats: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def make_key(model: str, messages: List[BaseMessage], params: Dict[str, Any]) -> str:
+        normalized = {
+            "model": model,
+            "params": params,
+            "messages": [[message.type, " ".join(str(message.content).split())] for message in messages],
+        }
+        payload = json.dumps(normalized, sort_keys=True, separators=(",", ":"), default=str)
+        return "llm_cache:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get_or_invoke(self, model: str, params: Dict[str, Any], messages: List[BaseMessage],
+                            invoke: Callable[[], Awaitable[BaseMessage]], node: Optional[str] = None) -> BaseMessage:
+        """Return a cached response for the request, or invoke the model and cache its response."""
+        if not self.enabled:
+            return await invoke()
+
+        key = self.make_key(model, messages, params)
+        cached = await self._get(key)
+        if cached is not None:
+            self._record(node, "hits")
+            return cached
+
+        if key in self._in_flight:
+            self._record(node, "coalesced")
+            return await asyncio.shield(self._in_flight[key])
+
+        self._record(node, "misses")
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            response = await invoke()
+            future.set_result(response)
+            await self._set(key, response)
+            return response
+        except Exception as e:
+            future.set_exception(e)
+            # Don't leave "exception was never retrieved" warnings when nobody coalesced
+            future.exception()
+            raise
+        finally:
+            self._in_flight.pop(key, None)
+
+    async def _get(self, key: str) -> Optional[BaseMessage]:
+        if key in self._local:
+            return self._local[key]
+        if self.redis_service.client is None:
+            return None
+        payload = await self.redis_service.cache_get(key)
+        if payload is None:
+            return None
+        message = messages_from_dict([payload])[0]
+        self._local[key] = message
+        return message
+
+    async def _set(self, key: str, response: BaseMessage):
+        payload = json.dumps(message_to_dict(response), default=str)
+        if len(payload) > self.max_entry_bytes:
+            return
+        self._local[key] = response
+        if self.redis_service.client is not None:
+            await self.redis_service.cache_set(key, payload, self.ttl)
+
+    def _record(self, node: Optional[str], outcome: str):
+        stats = self.node_stats.setdefault(node or "unknown", {"hits": 0, "misses": 0, "coalesced": 0})
+        stats[outcome] += 1
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Hit rate per workflow node; coalesced requests count as hits."""
+        report = {}
+        for node, stats in self.node_stats.items():
+            total = stats["hits"] + stats["misses"] + stats["coalesced"]
+            report[node] = {
+                **stats,
+                "hit_rate": round((stats["hits"] + stats["coalesced"]) / total, 4) if total else 0.0,
+            }
+        return report
+
+
+# Global instance
+llm_cache = LLMResponseCache()
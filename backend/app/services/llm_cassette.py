@@ -0,0 +1,151 @@
+import asyncio
+import gzip
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from app.config import settings
+from .llm_cache import LLMResponseCache
+
+
+class LLMCassette:
+    """
+    Record/replay layer under the LLM client, for offline benchmarks and
+    regression runs.
+
+    LLM_CASSETTE_MODE=record calls the provider as usual and appends every
+    request hash, response and latency to a plain JSON-lines file next to the
+    cassette (LLM_CASSETTE_PATH + ".part"); close() compresses them into the
+    gzipped cassette at LLM_CASSETTE_PATH, rewritten as a single gzip member.
+    LLM_CASSETTE_MODE=replay serves those responses without
+    touching the provider (or the LLM governor), either after the recorded
+    latency or instantly (LLM_CASSETTE_LATENCY=instant). A request with no
+    recording fails in replay mode rather than going to the network. Requests
+    recorded more than once are replayed in recorded order, cycling.
+    Disable the response cache (LLM_CACHE_ENABLED=false) when recording to
+    capture every call.
+    """
+
+    def __init__(self):
+        self.mode = settings.LLM_CASSETTE_MODE
+        self.path = settings.LLM_CASSETTE_PATH
+        self.instant = settings.LLM_CASSETTE_LATENCY == "instant"
+        self._recordings: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        self._positions: Dict[str, int] = {}
+        self._lock = asyncio.Lock()
+        self.stats = {"recorded": 0, "replayed": 0}
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @staticmethod
+    def key(llm: Any, messages: List[BaseMessage]) -> str:
+        params = {"temperature": llm.temperature, "max_tokens": llm.max_tokens}
+        return LLMResponseCache.make_key(llm.model_name, messages, params).split(":", 1)[1]
+
+    async def replay(self, llm: Any, messages: List[BaseMessage]) -> BaseMessage:
+        """Serve a recorded response for the request."""
+        if self._recordings is None:
+            self._recordings = await asyncio.to_thread(self._load)
+        key = self.key(llm, messages)
+        entries = self._recordings.get(key)
+        if not entries:
+            raise KeyError(f"No cassette recording for LLM request {key[:12]} ({llm.model_name})")
+        position = self._positions.get(key, 0)
+        self._positions[key] = position + 1
+        entry = entries[position % len(entries)]
+        if not self.instant:
+            await asyncio.sleep(entry["latency_ms"] / 1000)
+        self.stats["replayed"] += 1
+        return messages_from_dict([entry["response"]])[0]
+
+    async def record(self, llm: Any, messages: List[BaseMessage], response: Any, latency: float):
+        """Append a provider response to the cassette file."""
+        if not isinstance(response, BaseMessage):
+            return
+        row = json.dumps({
+            "key": self.key(llm, messages),
+            "model": llm.model_name,
+            "latency_ms": round(latency * 1000, 1),
+            "response": message_to_dict(response),
+        }, separators=(",", ":"), default=str)
+        async with self._lock:
+            await asyncio.to_thread(self._append, row)
+        self.stats["recorded"] += 1
+
+    async def ainvoke(self, llm: Any, messages: List[BaseMessage], **kwargs) -> Any:
+        """Call the provider, recording the response in record mode."""
+        started = time.perf_counter()
+        response = await llm.ainvoke(messages, **kwargs)
+        if self.recording and not kwargs:
+            await self.record(llm, messages, response, time.perf_counter() - started)
+        return response
+
+    async def abatch(self, llm: Any, batch: List[List[BaseMessage]]) -> List[Any]:
+        """Batch variant of ainvoke; each item is recorded with the batch latency."""
+        started = time.perf_counter()
+        responses = await llm.abatch(batch, return_exceptions=True)
+        if self.recording:
+            latency = time.perf_counter() - started
+            for messages, response in zip(batch, responses):
+                await self.record(llm, messages, response, latency)
+        return responses
+
+    async def close(self):
+        """Compress the rows recorded by this process into the cassette."""
+        async with self._lock:
+            await asyncio.to_thread(self._compress)
+
+    @property
+    def _part_path(self) -> str:
+        return f"{self.path}.part"
+
+    def _append(self, row: str):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Plain text, so every row is on disk even if the process never closes the cassette
+        with open(self._part_path, "a", encoding="utf-8") as f:
+            f.write(row + "\n")
+
+    def _compress(self):
+        if not os.path.exists(self._part_path):
+            return
+        lines = self._read_lines()
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            f.writelines(lines)
+        os.replace(tmp_path, self.path)
+        os.remove(self._part_path)
+
+    def _read_lines(self) -> List[str]:
+        """The cassette's rows, then those recorded since it was last compressed."""
+        lines: List[str] = []
+        if os.path.exists(self.path):
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                lines.extend(line for line in f if line.strip())
+        if os.path.exists(self._part_path):
+            with open(self._part_path, "r", encoding="utf-8") as f:
+                lines.extend(line for line in f if line.strip())
+        return lines
+
+    def _load(self) -> Dict[str, List[Dict[str, Any]]]:
+        recordings: Dict[str, List[Dict[str, Any]]] = {}
+        lines = self._read_lines()
+        if not lines:
+            print(f"LLM cassette {self.path} not found; every request will fail in replay mode")
+        for line in lines:
+            entry = json.loads(line)
+            recordings.setdefault(entry["key"], []).append(entry)
+        print(f"Loaded {sum(len(v) for v in recordings.values())} LLM recordings from {self.path}")
+        return recordings
+
+
+# Global instance
+llm_cassette = LLMCassette()
@@ -1,17 +1,267 @@
+import asyncio
+import functools
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import httpx
+from langchain_core.messages import AIMessage
 from langchain_openai import ChatOpenAI
 from app.config import settings
+from app.services.batching import current_batch_scope
+from app.services.llm_cache import llm_cache
+from app.services.llm_cassette import llm_cassette
+from app.services.llm_usage import llm_usage
+from app.services.llm_governor import (
+    BACKFILL_PRIORITY_OFFSET, DEFAULT_LLM_PRIORITY, LLM_WORKFLOW_PRIORITY,
+    estimate_tokens, is_rate_limited, llm_governor, retry_after_seconds,
+)
 
-def get_llm_client(temperature: float = 0) -> ChatOpenAI:
+# Process-wide HTTP pool and models, shared by every workflow module
+_http_client: Optional[httpx.AsyncClient] = None
+_models: Dict[Tuple[Any, ...], ChatOpenAI] = {}
+# Per workflow node: which path answered (primary, hedge, fallback)
+llm_path_stats: Dict[str, Dict[str, int]] = {}
+
+
+class LLMClient:
+    """
+    Thin wrapper around the chat model used by the workflow nodes.
+
+    Deterministic (temperature 0) calls are served from the shared exact-match
+    response cache when possible. Everything that reaches the provider goes
+    through the cluster-wide LLM governor, queued by workflow priority. Inside
+    a batch scope, concurrent ainvoke calls are collected and sent together
+    with abatch; outside a batch scope calls go straight through.
+
+    Nodes listed in LLM_NODE_OVERRIDES get a copy of the model with those
+    parameters; every copy shares the process-wide HTTP connection pool.
+
+    Provider calls pass through the record/replay cassette (LLM_CASSETTE_MODE).
+
+    Nodes listed in LLM_NODE_BUDGETS are deadline-aware: a hedged request to
+    LLM_FALLBACK_MODEL starts once LLM_HEDGE_AFTER_FRACTION of the budget has
+    passed, and when the budget runs out the node's fallback answer is
+    returned. The path that answered is kept in
+    response.response_metadata["answered_by"] and counted in llm_path_stats.
+    """
+
+    def __init__(self, llm: ChatOpenAI, workflow: Optional[str] = None):
+        self.llm = llm
+        self.workflow = workflow
+
+    async def ainvoke(self, messages: List[Any], node: Optional[str] = None,
+                      fallback: Optional[Dict[str, Any]] = None, **kwargs) -> Any:
+        """
+        Invoke the model. node names the calling workflow node for parameter
+        overrides, latency budgets and cache statistics. fallback is the
+        node's deterministic answer, returned as JSON content if the budget
+        runs out; without it the call waits for the model.
+        """
+        budget = settings.LLM_NODE_BUDGETS.get(node) if node else None
+        if not budget:
+            return await self._call(self.for_node(node), messages, node, **kwargs)
+
+        started = time.perf_counter()
+        tasks = {asyncio.ensure_future(self._call(self.for_node(node), messages, node, **kwargs)): "primary"}
+        hedge_at = budget * settings.LLM_HEDGE_AFTER_FRACTION
+        error: Optional[BaseException] = None
+        hedged = False
+        while True:
+            elapsed = time.perf_counter() - started
+            hedge_pending = settings.LLM_FALLBACK_MODEL and not hedged and elapsed < budget
+            # A primary that failed early is hedged right away rather than at hedge_at
+            if hedge_pending and (elapsed >= hedge_at or not tasks):
+                hedge_llm = _shared_model(settings.LLM_FALLBACK_MODEL, self.llm.temperature, self.llm.max_tokens)
+                tasks[asyncio.ensure_future(self._call(hedge_llm, messages, node, **kwargs))] = "hedge"
+                hedged = True
+                continue
+            if not tasks:
+                break
+            if fallback is not None:
+                timeout = (hedge_at if hedge_pending else budget) - elapsed
+            else:
+                timeout = hedge_at - elapsed if hedge_pending else None
+            done, _ = await asyncio.wait(tasks, timeout=max(timeout, 0) if timeout is not None else None,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                path = tasks.pop(task)
+                if task.exception() is not None:
+                    error = error or task.exception()
+                    continue
+                _abandon(tasks)
+                return self._answered(node, path, task.result())
+            if not done and not hedge_pending and fallback is not None:
+                break
+
+        _abandon(tasks)
+        if fallback is None:
+            # Only reached once every call has failed
+            raise error
+        if tasks or error is None:
+            print(f"LLM budget of {budget}s exceeded for {node}; using the deterministic fallback")
+        else:
+            print(f"LLM calls failed for {node} ({error}); using the deterministic fallback")
+        return self._answered(node, "fallback", AIMessage(content=json.dumps(fallback)))
+
+    def _answered(self, node: str, path: str, response: Any) -> Any:
+        stats = llm_path_stats.setdefault(node, {"primary": 0, "hedge": 0, "fallback": 0})
+        stats[path] += 1
+        metadata = {**(getattr(response, "response_metadata", None) or {}), "answered_by": path}
+        # Copy: cached responses are shared between callers
+        return response.model_copy(update={"response_metadata": metadata})
+
+    async def _call(self, llm: ChatOpenAI, messages: List[Any], node: Optional[str], **kwargs) -> Any:
+        if kwargs or llm.temperature:
+            return await self._provider_call(llm, messages, node, **kwargs)
+        params = {"temperature": llm.temperature, "max_tokens": llm.max_tokens}
+        return await llm_cache.get_or_invoke(
+            llm.model_name, params, messages, lambda: self._provider_call(llm, messages, node), node=node
+        )
+
+    async def _provider_call(self, llm: ChatOpenAI, messages: List[Any], node: Optional[str], **kwargs) -> Any:
+        response = await self._invoke(llm, messages, **kwargs)
+        llm_usage.record(self.workflow, node, llm.model_name, response)
+        return response
+
+    def for_node(self, node: Optional[str]) -> ChatOpenAI:
+        """Return the model configured for a node (the shared model unless overridden)."""
+        overrides = settings.LLM_NODE_OVERRIDES.get(node) if node else None
+        if not overrides:
+            return self.llm
+        return _shared_model(
+            overrides.get("model", self.llm.model_name),
+            overrides.get("temperature", self.llm.temperature),
+            overrides.get("max_tokens", self.llm.max_tokens),
+        )
+
+    def _priority(self) -> int:
+        priority = LLM_WORKFLOW_PRIORITY.get(self.workflow, DEFAULT_LLM_PRIORITY)
+        # Batch runs are backfills; interactive runs go first
+        if current_batch_scope() is not None:
+            priority += BACKFILL_PRIORITY_OFFSET
+        return priority
+
+    async def _invoke(self, llm: ChatOpenAI, messages: List[Any], **kwargs) -> Any:
+        if llm_cassette.replaying:
+            return await llm_cassette.replay(llm, messages)
+        scope = current_batch_scope()
+        if scope is None or kwargs:
+            tokens = estimate_tokens(messages, llm.max_tokens)
+            response = await llm_governor.run(
+                lambda: llm_cassette.ainvoke(llm, messages, **kwargs), self._priority(), tokens
+            )
+            await llm_governor.record_tokens(tokens, _total_tokens(response))
+            return response
+        batcher = scope.batcher(f"llm:{id(llm)}", functools.partial(self._abatch, llm))
+        return await batcher.submit(messages)
+
+    async def _abatch(self, llm: ChatOpenAI, batch: List[List[Any]]) -> List[Any]:
+        results: List[Any] = [None] * len(batch)
+        pending = list(range(len(batch)))
+        for attempt in range(llm_governor.max_retries + 1):
+            tokens = sum(estimate_tokens(batch[i], llm.max_tokens) for i in pending)
+            responses = await llm_governor.run(
+                lambda: llm_cassette.abatch(llm, [batch[i] for i in pending]),
+                self._priority(), tokens, weight=len(pending),
+            )
+            await llm_governor.record_tokens(tokens, sum(_total_tokens(r) or 0 for r in responses) or None)
+            limited = []
+            for i, response in zip(pending, responses):
+                results[i] = response
+                if isinstance(response, Exception) and is_rate_limited(response):
+                    limited.append(i)
+            if not limited or attempt >= llm_governor.max_retries:
+                break
+            # Retry only the rate-limited items, after the shared cooldown
+            await llm_governor.record_rate_limited(retry_after_seconds(results[limited[0]]))
+            pending = limited
+        return results
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.llm, name)
+
+
+def _abandon(tasks: Dict[asyncio.Future, str]):
+    """
+    Leave losing requests running in the background instead of cancelling them:
+    they still fill the response cache and answer any coalesced callers.
+    """
+    for task in tasks:
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+
+def compact_json(value: Any) -> str:
+    """
+    Serialize prompt data without whitespace and with sorted keys, for the
+    variable suffix of a prompt (the static instructions go first).
+    """
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def _total_tokens(response: Any) -> Optional[int]:
+    usage = getattr(response, "usage_metadata", None)
+    return usage.get("total_tokens") if usage else None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Process-wide async HTTP pool for LLM calls. Keep-alive connections are held
+    for LLM_HTTP_KEEPALIVE_SECONDS so calls spaced out by node work reuse an open
+    TLS connection instead of paying a new handshake each time.
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        http2 = settings.LLM_HTTP2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                print("LLM_HTTP2 is enabled but the h2 package is not installed; using HTTP/1.1")
+                http2 = False
+        _http_client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=settings.LLM_HTTP_KEEPALIVE_SECONDS,
+            ),
+            timeout=httpx.Timeout(settings.LLM_HTTP_TIMEOUT_SECONDS, connect=10.0),
+        )
+    return _http_client
+
+
+async def close_http_client():
+    """Close the shared LLM HTTP pool (called on application shutdown)."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def _shared_model(model: str, temperature: float, max_tokens: Optional[int]) -> ChatOpenAI:
+    key = (model, temperature, max_tokens)
+    if key not in _models:
+        _models[key] = ChatOpenAI(
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            openai_api_key=settings.OPENAI_API_KEY,
+            openai_api_base=settings.OPENAI_BASE_URL,
+            http_async_client=get_http_client(),
+            # 429s are retried by the governor after a shared cooldown, not per request
+            max_retries=0,
+            default_headers={
+                "HTTP-Referer": settings.SITE_URL,
+                "X-Title": settings.SITE_NAME,
+            }
+        )
+    return _models[key]
+
+
+def get_llm_client(temperature: float = 0, workflow: Optional[str] = None) -> LLMClient:
     """
-    Get configured LLM client for OpenRouter/OpenAI compatibility
+    Get configured LLM client for OpenRouter/OpenAI compatibility.
+    Clients share one model instance and HTTP pool per parameter set;
+    workflow sets the client's priority in the LLM governor queue.
     """
-    return ChatOpenAI(
-        model=settings.OPENAI_MODEL,
-        temperature=temperature,
-        openai_api_key=settings.OPENAI_API_KEY,
-        openai_api_base=settings.OPENAI_BASE_URL,
-        default_headers={
-            "HTTP-Referer": settings.SITE_URL,
-            "X-Title": settings.SITE_NAME,
-        }
-    )
+    return LLMClient(_shared_model(settings.OPENAI_MODEL, temperature, None), workflow=workflow)
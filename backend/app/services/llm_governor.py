@@ -0,0 +1,223 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+import uuid
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+from app.config import settings
+from .redis_service import redis_service
+
+# Lower value = served first. Interactive approvals beat enrichment-heavy flows.
+LLM_WORKFLOW_PRIORITY = {
+    "procurement_approval": 0,
+    "deal_stage_kickoff": 1,
+    "company_intake": 2,
+    "contact_role_mapping": 3,
+}
+DEFAULT_LLM_PRIORITY = 5
+# Added to the priority of calls made by batch runs (backfills)
+BACKFILL_PRIORITY_OFFSET = 10
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """Check whether an exception is a provider 429."""
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError"
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Read Retry-After from a provider error response, if present."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMGovernor:
+    """
+    Cluster-wide concurrency cap and tokens-per-minute budget for LLM calls.
+
+    Slots are leases in a Redis sorted set and token usage is counted in a
+    per-minute Redis key, so all worker replicas share one limit. Within a
+    worker, waiters are served in workflow priority order. The concurrency
+    limit adapts (AIMD): it is halved and a shared cooldown is set on a 429,
+    reduced when latency exceeds LLM_LATENCY_TARGET_SECONDS and grown slowly
+    on success, so throughput stays near the provider limit without every
+    worker retrying at once.
+    """
+
+    LEASES_KEY = "llm_governor:leases"
+    LIMIT_KEY = "llm_governor:limit"
+    COOLDOWN_KEY = "llm_governor:cooldown_until"
+
+    _ACQUIRE_SCRIPT = """
+        local now = tonumber(ARGV[1])
+        redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+        local cooldown = tonumber(redis.call('GET', KEYS[3]) or '0')
+        if cooldown > now then
+            return cooldown - now
+        end
+        local limit = math.max(1, math.floor(tonumber(redis.call('GET', KEYS[2]) or ARGV[5])))
+        local weight = tonumber(ARGV[4])
+        local in_use = redis.call('ZCARD', KEYS[1])
+        if in_use > 0 and in_use + weight > limit then
+            return 50
+        end
+        local used = tonumber(redis.call('GET', KEYS[4]) or '0')
+        local tokens = tonumber(ARGV[6])
+        if used > 0 and used + tokens > tonumber(ARGV[7]) then
+            return 60000 - (now % 60000)
+        end
+        redis.call('INCRBY', KEYS[4], tokens)
+        redis.call('PEXPIRE', KEYS[4], 120000)
+        for i = 1, weight do
+            redis.call('ZADD', KEYS[1], now + tonumber(ARGV[2]), ARGV[3] .. ':' .. i)
+        end
+        return 0
+    """
+
+    _FEEDBACK_SCRIPT = """
+        local limit = tonumber(redis.call('GET', KEYS[1]) or ARGV[2])
+        local max_limit = tonumber(ARGV[2])
+        local outcome = ARGV[1]
+        if outcome == 'rate_limited' then
+            limit = math.max(1, limit / 2)
+            redis.call('SET', KEYS[2], ARGV[3], 'PX', math.max(1, tonumber(ARGV[4])))
+        elseif outcome == 'slow' then
+            limit = math.max(1, limit * 0.9)
+        else
+            limit = math.min(max_limit, limit + 1 / limit)
+        end
+        redis.call('SET', KEYS[1], tostring(limit))
+        return tostring(limit)
+    """
+
+    def __init__(self):
+        self.redis_service = redis_service
+        self.max_concurrency = settings.LLM_MAX_CONCURRENCY
+        self.tokens_per_minute = settings.LLM_TOKENS_PER_MINUTE
+        self.latency_target = settings.LLM_LATENCY_TARGET_SECONDS
+        self.max_retries = settings.LLM_MAX_RATE_LIMIT_RETRIES
+        self.lease_ms = 120000
+        self._waiters: List[Tuple[int, int]] = []
+        self._sequence = itertools.count()
+        self._condition = asyncio.Condition()
+        self.stats = {"calls": 0, "rate_limited": 0, "slow": 0, "wait_seconds": 0.0}
+
+    async def run(self, call: Callable[[], Awaitable[Any]], priority: int = DEFAULT_LLM_PRIORITY,
+                  tokens: int = 1000, weight: int = 1) -> Any:
+        """
+        Run a provider call under the governor, retrying on 429 after the shared cooldown.
+        weight is the number of concurrent provider requests the call makes.
+        """
+        for attempt in range(self.max_retries + 1):
+            lease = await self.acquire(priority, tokens, weight)
+            started = time.perf_counter()
+            try:
+                result = await call()
+            except Exception as e:
+                if not is_rate_limited(e) or attempt >= self.max_retries:
+                    raise
+                await self.record_rate_limited(retry_after_seconds(e))
+                continue
+            finally:
+                await self.release(lease, weight)
+            await self.record_latency(time.perf_counter() - started)
+            self.stats["calls"] += 1
+            return result
+
+    async def acquire(self, priority: int, tokens: int, weight: int = 1) -> str:
+        """Wait for a slot and token budget; higher-priority local waiters go first."""
+        entry = (priority, next(self._sequence))
+        lease = str(uuid.uuid4())
+        weight = max(1, min(weight, self.max_concurrency))
+        started = time.perf_counter()
+        async with self._condition:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    timeout = 0.05
+                    if self._waiters[0] == entry:
+                        wait_ms = await self._try_acquire(lease, tokens, weight)
+                        if wait_ms <= 0:
+                            heapq.heappop(self._waiters)
+                            self._condition.notify_all()
+                            self.stats["wait_seconds"] += time.perf_counter() - started
+                            return lease
+                        # Jitter so replicas don't all retry at the same instant
+                        timeout = wait_ms / 1000 * random.uniform(1.0, 1.2)
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                    self._condition.notify_all()
+                raise
+
+    async def release(self, lease: str, weight: int = 1):
+        weight = max(1, min(weight, self.max_concurrency))
+        try:
+            await self.redis_service.client.zrem(self.LEASES_KEY, *[f"{lease}:{i}" for i in range(1, weight + 1)])
+        except Exception as e:
+            print(f"Error releasing LLM governor lease: {e}")
+        async with self._condition:
+            self._condition.notify_all()
+
+    async def _try_acquire(self, lease: str, tokens: int, weight: int) -> float:
+        """Returns 0 if a slot was acquired, otherwise milliseconds to wait before retrying."""
+        try:
+            return float(await self.redis_service.client.eval(
+                self._ACQUIRE_SCRIPT, 4,
+                self.LEASES_KEY, self.LIMIT_KEY, self.COOLDOWN_KEY, f"llm_governor:tokens:{int(time.time() // 60)}",
+                int(time.time() * 1000), self.lease_ms, lease, weight, self.max_concurrency,
+                int(tokens), self.tokens_per_minute,
+            ))
+        except Exception as e:
+            # If Redis is down, let the request through
+            print(f"Error acquiring LLM governor slot: {e}")
+            return 0
+
+    async def _feedback(self, outcome: str, cooldown_ms: int = 0):
+        try:
+            now_ms = int(time.time() * 1000)
+            await self.redis_service.client.eval(
+                self._FEEDBACK_SCRIPT, 2, self.LIMIT_KEY, self.COOLDOWN_KEY,
+                outcome, self.max_concurrency, now_ms + cooldown_ms, cooldown_ms,
+            )
+        except Exception as e:
+            print(f"Error recording LLM governor feedback: {e}")
+
+    async def record_rate_limited(self, retry_after: Optional[float] = None):
+        """Halve the shared concurrency limit and pause all workers until the cooldown ends."""
+        self.stats["rate_limited"] += 1
+        await self._feedback("rate_limited", int((retry_after or 2.0) * 1000))
+
+    async def record_latency(self, latency: float):
+        if latency > self.latency_target:
+            self.stats["slow"] += 1
+            await self._feedback("slow")
+        else:
+            await self._feedback("ok")
+
+    async def record_tokens(self, estimated: int, actual: Optional[int]):
+        """Correct the current minute's token count once actual usage is known."""
+        if actual is None or actual == estimated:
+            return
+        try:
+            await self.redis_service.client.incrby(f"llm_governor:tokens:{int(time.time() // 60)}", actual - estimated)
+        except Exception as e:
+            print(f"Error recording LLM token usage: {e}")
+
+
+def estimate_tokens(messages: List[Any], max_tokens: Optional[int] = None) -> int:
+    """Rough token estimate (about 4 characters per token) plus the expected completion."""
+    prompt_chars = sum(len(str(getattr(message, "content", message))) for message in messages)
+    return prompt_chars // 4 + (max_tokens or 512)
+
+
+# Global instance
+llm_governor = LLMGovernor()
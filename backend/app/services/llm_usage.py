@@ -0,0 +1,74 @@
+from typing import Any, Dict, Optional
+from app.config import settings
+
+
+class LLMUsageTracker:
+    """
+    Token and cost accounting for provider LLM calls.
+
+    Input, output and cached (prefix-cache read) tokens are taken from each
+    response's usage_metadata and totalled per workflow node; cost is
+    computed from LLM_PRICING (USD per million tokens, by model) and totalled
+    per workflow. Responses served from the local response cache are not
+    counted, since they cost nothing.
+    """
+
+    def __init__(self):
+        self.node_stats: Dict[str, Dict[str, int]] = {}
+        self.workflow_stats: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, workflow: Optional[str], node: Optional[str], model: str, response: Any):
+        usage = getattr(response, "usage_metadata", None)
+        if not usage:
+            return
+        input_tokens = usage.get("input_tokens", 0)
+        output_tokens = usage.get("output_tokens", 0)
+        cached_tokens = (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+
+        stats = self.node_stats.setdefault(node or "unknown", {
+            "calls": 0, "input_tokens": 0, "output_tokens": 0, "cached_tokens": 0,
+        })
+        stats["calls"] += 1
+        stats["input_tokens"] += input_tokens
+        stats["output_tokens"] += output_tokens
+        stats["cached_tokens"] += cached_tokens
+
+        totals = self.workflow_stats.setdefault(workflow or "unknown", {
+            "calls": 0, "input_tokens": 0, "output_tokens": 0, "cached_tokens": 0, "cost_usd": 0.0,
+        })
+        totals["calls"] += 1
+        totals["input_tokens"] += input_tokens
+        totals["output_tokens"] += output_tokens
+        totals["cached_tokens"] += cached_tokens
+        totals["cost_usd"] += self.cost(model, input_tokens, output_tokens, cached_tokens)
+
+    @staticmethod
+    def cost(model: str, input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> float:
+        """USD cost of a call; cached input tokens are billed at the cached rate."""
+        pricing = settings.LLM_PRICING.get(model)
+        if not pricing:
+            return 0.0
+        uncached = max(input_tokens - cached_tokens, 0)
+        return (
+            uncached * pricing.get("input", 0)
+            + cached_tokens * pricing.get("cached_input", pricing.get("input", 0))
+            + output_tokens * pricing.get("output", 0)
+        ) / 1_000_000
+
+    def stats(self) -> Dict[str, Any]:
+        """Tokens per node (with prefix-cache hit rate) and tokens/cost per workflow."""
+        nodes = {}
+        for node, stats in self.node_stats.items():
+            nodes[node] = {
+                **stats,
+                "cached_ratio": round(stats["cached_tokens"] / stats["input_tokens"], 4) if stats["input_tokens"] else 0.0,
+            }
+        workflows = {
+            workflow: {**totals, "cost_usd": round(totals["cost_usd"], 6)}
+            for workflow, totals in self.workflow_stats.items()
+        }
+        return {"nodes": nodes, "workflows": workflows}
+
+
+# Global instance
+llm_usage = LLMUsageTracker()
@@ -1,13 +1,52 @@
 import asyncio
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+import httpx
+from app.config import settings
+from app.services.connector_http import send
+
+# Notion API version sent with every request
+NOTION_VERSION = "2022-06-28"
 
 class NotionClient:
     """
-    A mock client to simulate interactions with the Notion API.
+    Client for the Notion API.
+
+    Without NOTION_API_KEY the client simulates Notion. NOTION_API_URL can
+    point at a local stand-in server.
     """
 
+    def __init__(self, api_url: Optional[str] = None, api_key: Optional[str] = None):
+        self.api_url = api_url or settings.NOTION_API_URL
+        self.api_key = api_key if api_key is not None else settings.NOTION_API_KEY
+        self._http: Optional[httpx.AsyncClient] = None
+        self.stats: Dict[str, int] = {"api_calls": 0}
+
+    @property
+    def simulated(self) -> bool:
+        return not self.api_key
+
     async def attach_sop_link(self, page_id: str, sop_url: str) -> Dict[str, Any]:
-        """Simulates attaching a link to a Notion page."""
+        """Append a bookmark to the SOP at the end of a Notion page."""
         print(f"[NotionClient] Attaching SOP link {sop_url} to page {page_id}")
-        await asyncio.sleep(0.1) # Simulate network latency
+        if self.simulated:
+            await asyncio.sleep(0.1) # Simulate network latency
+            return {"status": "ok", "page_id": page_id}
+        await send(self._client(), "PATCH", f"/v1/blocks/{page_id}/children", self.stats,
+                   settings.CONNECTOR_MAX_RETRIES, json={
+                       "children": [{"object": "block", "type": "bookmark", "bookmark": {"url": sop_url}}],
+                   })
         return {"status": "ok", "page_id": page_id}
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                base_url=self.api_url,
+                headers={"Authorization": f"Bearer {self.api_key}", "Notion-Version": NOTION_VERSION},
+                timeout=httpx.Timeout(30.0, connect=10.0),
+            )
+        return self._http
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
@@ -139,6 +139,91 @@ class RedisService:
             print(f"Error getting idempotency result: {e}")
             return None
     
+    # Input fingerprint utilities for skipping runs whose inputs haven't changed
+    async def set_input_fingerprint(self, workflow_name: str, object_id: str, fingerprint: str,
+                                    result: Any, ttl: int = 7 * 86400) -> bool:
+        """Record the input fingerprint and result of the last successful run for an object."""
+        try:
+            key = f"input_fingerprint:{workflow_name}:{object_id}"
+            return await self.cache_set(key, {"fingerprint": fingerprint, "result": result}, ttl)
+        except Exception as e:
+            print(f"Error setting input fingerprint: {e}")
+            return False
+    
+    async def get_input_fingerprint(self, workflow_name: str, object_id: str) -> Optional[Dict[str, Any]]:
+        """Get the input fingerprint and result of the last successful run for an object."""
+        try:
+            key = f"input_fingerprint:{workflow_name}:{object_id}"
+            return await self.cache_get(key)
+        except Exception as e:
+            print(f"Error getting input fingerprint: {e}")
+            return None
+    
+    # Version tracking utilities for discarding stale and out-of-order events
+    _ADVANCE_HWM_SCRIPT = """
+        local current = redis.call('GET', KEYS[1])
+        if current then
+            local stored, incoming = tonumber(current), tonumber(ARGV[1])
+            if stored > incoming or (stored == incoming and ARGV[3] == '0') then
+                return {0, current}
+            end
+        end
+        redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+        return {1, current or false}
+    """
+    
+    _RELEASE_HWM_SCRIPT = """
+        if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+            return 0
+        end
+        if ARGV[2] == '' then
+            redis.call('DEL', KEYS[1])
+        else
+            redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+        end
+        return 1
+    """
+    
+    async def advance_high_water_mark(self, key: str, version: int, allow_equal: bool = False,
+                                      ttl: int = 30 * 86400) -> Dict[str, Any]:
+        """
+        Atomically raise the high-water mark stored at key to version.
+        
+        Returns {"advanced": bool, "previous": Optional[str]}. advanced is False when
+        the stored mark is above version (or equal to it, unless allow_equal), i.e.
+        the event is superseded. Safe under concurrency: the compare and set run
+        as a single Lua script.
+        """
+        try:
+            advanced, previous = await self.client.eval(
+                self._ADVANCE_HWM_SCRIPT, 1, f"hwm:{key}", int(version), ttl, "1" if allow_equal else "0"
+            )
+            return {"advanced": bool(advanced), "previous": previous or None}
+        except Exception as e:
+            print(f"Error advancing high-water mark: {e}")
+            # If Redis is down, let the event through
+            return {"advanced": True, "previous": None}
+    
+    async def release_high_water_mark(self, key: str, version: int, previous: Optional[str],
+                                      ttl: int = 30 * 86400) -> bool:
+        """Restore the previous mark if the mark at key is still version (e.g. the run failed)."""
+        try:
+            result = await self.client.eval(
+                self._RELEASE_HWM_SCRIPT, 1, f"hwm:{key}", int(version), previous or "", ttl
+            )
+            return result == 1
+        except Exception as e:
+            print(f"Error releasing high-water mark: {e}")
+            return False
+    
+    async def increment_counter(self, name: str, amount: int = 1) -> int:
+        """Increment a cluster-wide counter."""
+        try:
+            return await self.client.incrby(f"counter:{name}", amount)
+        except Exception as e:
+            print(f"Error incrementing counter: {e}")
+            return 0
+    
     # LangGraph checkpoint utilities
     async def save_checkpoint(self, thread_id: str, checkpoint_id: str, data: Any) -> bool:
         """Save a LangGraph checkpoint."""
@@ -0,0 +1,239 @@
+import json
+import math
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.config import settings
+from .redis_service import redis_service
+
+REGULATED_INDUSTRIES = {"Government", "Healthcare", "Financial Services"}
+
+# Logistic model: score = sigmoid(bias + features . weights). These are starting
+# weights only; calibrate() refits them against recorded LLM verdicts.
+DEAL_FEATURES = ["log_amount", "new_business", "missing_company", "missing_contact", "prior_high_ratio", "first_deal"]
+DEAL_WEIGHTS = np.array([1.6, 0.6, 1.0, 0.5, 2.5, 0.4])
+DEAL_BIAS = -9.0
+
+COMPANY_FEATURES = ["log_employees", "log_revenue", "regulated", "missing_domain", "missing_industry", "prior_high_ratio"]
+COMPANY_WEIGHTS = np.array([0.5, 0.35, 1.5, 0.8, 0.8, 2.5])
+COMPANY_BIAS = -5.0
+
+# Target score of each LLM risk level when fitting the weights
+RISK_LABELS = {"LOW": 0.0, "MEDIUM": 0.5, "HIGH": 1.0, "CRITICAL": 1.0}
+
+# Outcomes that count towards a company's prior_high_ratio
+HIGH_RISK_LEVELS = ("HIGH", "CRITICAL")
+
+
+def _amount(value: Any) -> float:
+    try:
+        return max(float(value or 0), 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def deal_features(deal_data: Dict[str, Any], history: Optional[Dict[str, int]] = None) -> List[float]:
+    """Feature vector (DEAL_FEATURES order) for a procurement deal."""
+    history = history or {}
+    runs = history.get("runs", 0)
+    return [
+        math.log10(1 + _amount(deal_data.get("amount"))),
+        1.0 if deal_data.get("deal_type") in ("", None, "newbusiness") else 0.0,
+        0.0 if deal_data.get("company_name") else 1.0,
+        0.0 if deal_data.get("contact_name") else 1.0,
+        history.get("high", 0) / runs if runs else 0.0,
+        0.0 if runs else 1.0,
+    ]
+
+
+def company_features(company_data: Dict[str, Any], history: Optional[Dict[str, int]] = None) -> List[float]:
+    """Feature vector (COMPANY_FEATURES order) for a company intake."""
+    history = history or {}
+    runs = history.get("runs", 0)
+    return [
+        math.log10(1 + _amount(company_data.get("Employee Count"))),
+        math.log10(1 + _amount(company_data.get("Annual Revenue"))),
+        1.0 if company_data.get("Industry") in REGULATED_INDUSTRIES else 0.0,
+        0.0 if company_data.get("Domain") else 1.0,
+        0.0 if company_data.get("Industry") else 1.0,
+        history.get("high", 0) / runs if runs else 0.0,
+    ]
+
+
+def fit_logistic(features: np.ndarray, labels: np.ndarray, weights: np.ndarray, bias: float,
+                 iterations: int = 2000, learning_rate: float = 0.05, l2: float = 0.01) -> Tuple[np.ndarray, float]:
+    """Fit logistic weights to (soft) labels by gradient descent, starting from the given weights."""
+    weights = weights.astype(float).copy()
+    for _ in range(iterations):
+        error = 1.0 / (1.0 + np.exp(-(features @ weights + bias))) - labels
+        weights -= learning_rate * (features.T @ error / len(labels) + l2 * weights)
+        bias -= learning_rate * float(error.mean())
+    return weights, bias
+
+
+class RiskScorer:
+    """
+    Deterministic risk pre-scoring for deals and companies.
+
+    Features from the deal or company and from past assessments for the same
+    company are scored with a logistic model. Every LLM verdict is recorded
+    with its features, and calibrate() refits the model against them at
+    startup and every RISK_SCORE_CALIBRATE_INTERVAL_SECONDS. Only LLM (or
+    human) verdicts go into a company's history: a local answer is derived
+    from that history, and recording it would feed prior_high_ratio its own
+    output. Until a model has been fitted to RISK_SCORE_MIN_VERDICTS
+    verdicts, and for inputs with missing data, everything goes to the LLM.
+    Otherwise scores below RISK_SCORE_LOW_BAND or above RISK_SCORE_HIGH_BAND
+    are clear-cut and are answered locally; only the ambiguous middle band
+    goes to the LLM.
+    """
+
+    HISTORY_PREFIX = "risk_history"
+    VERDICTS_PREFIX = "risk_verdicts"
+
+    def __init__(self, max_verdicts: int = 5000):
+        self.redis_service = redis_service
+        self.low_band = settings.RISK_SCORE_LOW_BAND
+        self.high_band = settings.RISK_SCORE_HIGH_BAND
+        self.min_verdicts = settings.RISK_SCORE_MIN_VERDICTS
+        self.max_verdicts = max_verdicts
+        self.models: Dict[str, Tuple[np.ndarray, float]] = {
+            "deal": (DEAL_WEIGHTS, DEAL_BIAS),
+            "company": (COMPANY_WEIGHTS, COMPANY_BIAS),
+        }
+        # Models fitted to enough LLM verdicts to answer locally
+        self.calibrated = set()
+        self.stats = {"low": 0, "high": 0, "ambiguous": 0, "uncalibrated": 0, "incomplete": 0}
+
+    def _score(self, kind: str, features: List[List[float]]) -> np.ndarray:
+        weights, bias = self.models[kind]
+        matrix = np.asarray(features, dtype=float).reshape(-1, len(weights))
+        return 1.0 / (1.0 + np.exp(-(matrix @ weights + bias)))
+
+    def score_deals(self, features: List[List[float]]) -> np.ndarray:
+        """Risk scores in [0, 1] for deal feature vectors."""
+        return self._score("deal", features)
+
+    def score_companies(self, features: List[List[float]]) -> np.ndarray:
+        """Risk scores in [0, 1] for company feature vectors."""
+        return self._score("company", features)
+
+    async def calibrate(self):
+        """Refit each model against the LLM verdicts recorded so far."""
+        for kind, (weights, bias) in self.models.items():
+            try:
+                verdicts = [json.loads(verdict) for verdict in
+                            await self.redis_service.client.lrange(f"{self.VERDICTS_PREFIX}:{kind}", 0, -1)]
+            except Exception as e:
+                print(f"Error loading {kind} risk verdicts: {e}")
+                continue
+            if len(verdicts) < self.min_verdicts:
+                print(f"Only {len(verdicts)} {kind} risk verdicts recorded; {kind} risk stays with the LLM")
+                continue
+            features = np.array([verdict["features"] for verdict in verdicts], dtype=float)
+            labels = np.array([verdict["label"] for verdict in verdicts], dtype=float)
+            self.models[kind] = fit_logistic(features, labels, weights, bias)
+            self.calibrated.add(kind)
+            print(f"Calibrated the {kind} risk model on {len(verdicts)} LLM verdicts")
+
+    async def record_verdict(self, kind: str, features: List[float], risk_level: str):
+        """Keep an LLM verdict and its features for the next calibration."""
+        if risk_level not in RISK_LABELS:
+            return
+        try:
+            key = f"{self.VERDICTS_PREFIX}:{kind}"
+            await self.redis_service.client.lpush(key, json.dumps({"features": features, "label": RISK_LABELS[risk_level]}))
+            await self.redis_service.client.ltrim(key, 0, self.max_verdicts - 1)
+        except Exception as e:
+            print(f"Error recording risk verdict: {e}")
+
+    def _answerable(self, kind: str, complete: bool) -> bool:
+        if kind not in self.calibrated:
+            self.stats["uncalibrated"] += 1
+            return False
+        if not complete:
+            self.stats["incomplete"] += 1
+            return False
+        return True
+
+    def classify(self, score: float) -> Optional[str]:
+        """LOW/HIGH/CRITICAL for clear-cut scores, None for the ambiguous band."""
+        if score < self.low_band:
+            self.stats["low"] += 1
+            return "LOW"
+        if score > self.high_band:
+            self.stats["high"] += 1
+            return "CRITICAL" if score > 0.95 else "HIGH"
+        self.stats["ambiguous"] += 1
+        return None
+
+    def assess_deal(self, deal_data: Dict[str, Any], history: Optional[Dict[str, int]] = None) -> Tuple[float, Optional[Dict[str, Any]]]:
+        """
+        Score one deal. Returns (score, risk_assessment); risk_assessment has the
+        same fields as the LLM assessment, or is None if the deal is ambiguous.
+        """
+        features = deal_features(deal_data, history)
+        score = float(self.score_deals([features])[0])
+        complete = _amount(deal_data.get("amount")) > 0 and not features[2] and not features[3]
+        risk_level = self.classify(score) if self._answerable("deal", complete) else None
+        if risk_level is None:
+            return score, None
+
+        red_flags = []
+        if features[2]:
+            red_flags.append("No associated company")
+        if features[3]:
+            red_flags.append("No associated contact")
+        if features[4] >= 0.5:
+            red_flags.append("Company has a history of high-risk deals")
+        high = risk_level != "LOW"
+        return score, {
+            "risk_level": risk_level,
+            "customer_risk": "HIGH" if features[4] >= 0.5 else ("MODERATE" if features[5] else "LOW"),
+            "market_risk": "LOW",
+            "contract_risk": "HIGH" if high else "LOW",
+            "recommended_approval_level": "EXECUTIVE" if high else "MANAGER",
+            "mitigation_strategies": ["Executive and finance review", "Staged payment terms"] if high
+                else ["Standard contract review"],
+            "red_flags": red_flags,
+            "risk_score": round(score, 4),
+        }
+
+    def assess_company(self, company_data: Dict[str, Any], history: Optional[Dict[str, int]] = None) -> Tuple[float, Optional[str]]:
+        """Score one company. Returns (score, risk_level), with risk_level None if it needs the LLM."""
+        features = company_features(company_data, history)
+        score = float(self.score_companies([features])[0])
+        complete = _amount(company_data.get("Employee Count")) > 0 and not features[3] and not features[4]
+        return score, self.classify(score) if self._answerable("company", complete) else None
+
+    async def history(self, key: str) -> Dict[str, int]:
+        """Past assessment counts (runs, high) for a company."""
+        if not key:
+            return {}
+        try:
+            counts = await self.redis_service.client.hgetall(f"{self.HISTORY_PREFIX}:{key.lower()}")
+            return {field: int(value) for field, value in counts.items()}
+        except Exception as e:
+            print(f"Error reading risk history: {e}")
+            return {}
+
+    async def record(self, key: str, risk_level: str) -> bool:
+        """
+        Add an LLM or human assessment outcome to the company's history. Returns
+        True for a high-risk outcome, after which earlier assessments of the
+        company are stale.
+        """
+        if not key:
+            return False
+        try:
+            history_key = f"{self.HISTORY_PREFIX}:{key.lower()}"
+            await self.redis_service.client.hincrby(history_key, "runs", 1)
+            if risk_level in HIGH_RISK_LEVELS:
+                await self.redis_service.client.hincrby(history_key, "high", 1)
+                return True
+        except Exception as e:
+            print(f"Error recording risk history: {e}")
+        return False
+
+
+# Global instance
+risk_scorer = RiskScorer()
@@ -0,0 +1,259 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from app.config import settings
+from .redis_service import redis_service
+
+# Abbreviations expanded during title normalization
+TITLE_ABBREVIATIONS = {
+    "vp": "vice president", "svp": "senior vice president", "evp": "executive vice president",
+    "avp": "assistant vice president", "sr": "senior", "jr": "junior", "mgr": "manager",
+    "dir": "director", "eng": "engineering", "engr": "engineer", "ops": "operations",
+    "mktg": "marketing", "hr": "human resources", "it": "information technology",
+    "cs": "customer success", "bd": "business development", "pm": "product manager",
+    "ceo": "chief executive officer", "cfo": "chief financial officer",
+    "cto": "chief technology officer", "coo": "chief operating officer",
+    "cmo": "chief marketing officer", "cio": "chief information officer",
+    "cro": "chief revenue officer", "cpo": "chief procurement officer",
+}
+
+TITLE_STOPWORDS = {"of", "and", "the", "for", "to", "in", "at"}
+
+# Seed table: keyword -> functional area
+FUNCTIONAL_AREA_KEYWORDS = {
+    "engineering": "Engineering", "engineer": "Engineering", "developer": "Engineering",
+    "software": "Engineering", "technology": "Engineering", "devops": "Engineering",
+    "architect": "Engineering", "information": "Engineering",
+    "sales": "Sales", "account": "Sales", "revenue": "Sales", "business development": "Sales",
+    "marketing": "Marketing", "brand": "Marketing", "growth": "Marketing", "demand": "Marketing",
+    "operations": "Operations", "operating": "Operations", "logistics": "Operations",
+    "supply": "Operations",
+    "procurement": "Procurement", "purchasing": "Procurement", "buyer": "Procurement",
+    "sourcing": "Procurement",
+    "finance": "Finance", "financial": "Finance", "accounting": "Finance",
+    "controller": "Finance", "treasury": "Finance",
+    "human resources": "Human Resources", "people": "Human Resources",
+    "talent": "Human Resources", "recruiting": "Human Resources",
+    "legal": "Legal", "counsel": "Legal", "compliance": "Legal",
+    "product": "Product", "customer success": "Customer Success", "support": "Customer Success",
+    "executive": "Executive",
+}
+
+# Seed table: keyword -> (seniority level, decision authority 1-10), strongest first
+SENIORITY_KEYWORDS: List[Tuple[str, str, int]] = [
+    ("chief", "Executive", 10), ("president", "Executive", 9), ("founder", "Executive", 10),
+    ("owner", "Executive", 10), ("partner", "Executive", 9), ("head", "Executive", 8),
+    ("director", "Manager", 7), ("manager", "Manager", 6), ("lead", "Manager", 5),
+    ("principal", "Individual Contributor", 5), ("senior", "Individual Contributor", 4),
+    ("specialist", "Individual Contributor", 3), ("analyst", "Individual Contributor", 3),
+    ("engineer", "Individual Contributor", 3), ("developer", "Individual Contributor", 3),
+    ("coordinator", "Individual Contributor", 2), ("assistant", "Individual Contributor", 2),
+    ("associate", "Individual Contributor", 2), ("intern", "Individual Contributor", 1),
+]
+
+GATEKEEPER_KEYWORDS = {"assistant", "coordinator", "administrator", "office"}
+
+# Keywords that often appear in titles outside their area or level ("Information
+# Security", "Account Payable Clerk", "Team Lead"); they start out less reliable.
+WEAK_KEYWORDS = {
+    "information", "technology", "account", "people", "support", "operating", "executive",
+    "growth", "demand", "supply", "brand", "product", "lead", "partner", "head", "owner",
+    "associate", "senior", "office", "administrator",
+}
+
+# Starting reliability of a seed keyword, and how many LLM labels it is worth
+SEED_RELIABILITY = 0.9
+WEAK_SEED_RELIABILITY = 0.5
+SEED_LABELS = 5
+
+ENGAGEMENT_STRATEGIES = {
+    "Decision Maker": "Executive alignment on business outcomes and ROI",
+    "Influencer": "Technical and functional deep dives to build champions",
+    "End User": "Hands-on enablement and onboarding support",
+    "Gatekeeper": "Clear scheduling and concise summaries to earn access",
+}
+
+
+def normalize_title(title: str) -> str:
+    """Lowercase, strip punctuation, expand abbreviations and drop stopwords."""
+    tokens = re.sub(r"[^a-z0-9 ]+", " ", (title or "").lower()).split()
+    expanded = []
+    for token in tokens:
+        expanded.extend(TITLE_ABBREVIATIONS.get(token, token).split())
+    return " ".join(token for token in expanded if token not in TITLE_STOPWORDS)
+
+
+def _has_phrase(text: str, phrase: str) -> bool:
+    """Whole-word match of a (possibly multi-word) keyword in normalized text."""
+    return f" {phrase} " in f" {text} "
+
+
+class RoleClassifier:
+    """
+    Local job-title classifier used before falling back to the LLM.
+
+    An exact index of normalized titles, learned from past LLM answers and
+    shared through Redis, is checked first. Unknown titles are matched, whole
+    words only, against the seed keyword tables. The confidence of a match is
+    how reliable its keywords have been: how often past LLM labels agreed with
+    them, starting from a seed reliability that is low for ambiguous keywords.
+    The caller only goes to the LLM when the confidence is below
+    ROLE_CLASSIFIER_MIN_CONFIDENCE, and feeds the answer back with learn().
+    """
+
+    INDEX_KEY = "role_classifier:index"
+
+    def __init__(self, max_entries: int = 50000):
+        self.redis_service = redis_service
+        self.min_confidence = settings.ROLE_CLASSIFIER_MIN_CONFIDENCE
+        self.max_entries = max_entries
+        self._index: Dict[str, Dict[str, Any]] = {}
+        # (kind, keyword) -> (LLM labels that agreed with the keyword, labels seen)
+        self._agreement: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        self.stats = {"index_hits": 0, "rule_hits": 0, "llm_fallbacks": 0}
+
+    async def load(self):
+        """Load the learned index from Redis."""
+        try:
+            entries = await self.redis_service.client.hgetall(self.INDEX_KEY)
+            for title, payload in list(entries.items())[:self.max_entries]:
+                self._index[title] = json.loads(payload)
+                self._record_agreement(title, self._index[title])
+            print(f"Loaded {len(self._index)} learned job titles into the role classifier")
+        except Exception as e:
+            print(f"Error loading role classifier index: {e}")
+
+    def classify(self, job_title: str, department: str = "", seniority: str = "") -> Tuple[Optional[Dict[str, Any]], float]:
+        """
+        Classify a job title. Returns (classification, confidence); classification
+        has role_category, functional_area, seniority_level and decision_authority.
+        """
+        normalized = normalize_title(job_title)
+        if not normalized:
+            return None, 0.0
+
+        if normalized in self._index:
+            return dict(self._index[normalized]), 1.0
+
+        match = self._match(normalized, normalize_title(department), normalize_title(seniority))
+        level = match["level"]
+        # Confidence is how often the LLM agreed with the matched keywords on past
+        # titles; an area matched by keywords that disagree counts for half.
+        confidence = 0.0
+        if match["area"] and level:
+            confidence = self._reliability("area", match["area_keyword"]) * self._reliability("level", match["level_keyword"])
+            if match["conflicting"]:
+                confidence *= 0.5
+        functional_area = match["area"]
+        if level is None:
+            return None, confidence
+
+        seniority_level, decision_authority = level
+        if match["is_gatekeeper"]:
+            role_category = "Gatekeeper"
+        elif seniority_level == "Executive" or decision_authority >= 7:
+            role_category = "Decision Maker"
+        elif seniority_level == "Manager" or decision_authority >= 5:
+            role_category = "Influencer"
+        else:
+            role_category = "End User"
+
+        return {
+            "role_category": role_category,
+            "functional_area": functional_area or "Unknown",
+            "seniority_level": seniority_level,
+            "decision_authority": decision_authority,
+        }, confidence
+
+    def _match(self, title: str, department: str, seniority: str) -> Dict[str, Any]:
+        """Find the functional area and level keywords of a normalized title."""
+        text = f"{title} {department}"
+        area_matches = [(keyword, area) for keyword, area in FUNCTIONAL_AREA_KEYWORDS.items() if _has_phrase(text, keyword)]
+        area_keyword, area = area_matches[0] if area_matches else (None, None)
+
+        gatekeeper = next((keyword for keyword in GATEKEEPER_KEYWORDS if _has_phrase(title, keyword)), None)
+        level_keyword, level = None, None
+        if gatekeeper:
+            # "Executive Assistant to the CEO" supports an executive; it isn't one
+            level_keyword, level = gatekeeper, ("Individual Contributor", 2)
+        else:
+            for source in (title, seniority):
+                level_keyword, level = next(
+                    ((keyword, (lvl, authority)) for keyword, lvl, authority in SENIORITY_KEYWORDS if _has_phrase(source, keyword)),
+                    (None, None),
+                )
+                if level:
+                    break
+        return {
+            "area": area,
+            "area_keyword": area_keyword,
+            "conflicting": len({area for _, area in area_matches}) > 1,
+            "level": level,
+            "level_keyword": level_keyword,
+            "is_gatekeeper": bool(gatekeeper),
+        }
+
+    def _reliability(self, kind: str, keyword: str) -> float:
+        """Share of past LLM labels that agreed with a keyword, starting from its seed reliability."""
+        seed = WEAK_SEED_RELIABILITY if keyword in WEAK_KEYWORDS else SEED_RELIABILITY
+        agreed, total = self._agreement.get((kind, keyword), (0, 0))
+        return (agreed + seed * SEED_LABELS) / (total + SEED_LABELS)
+
+    def _record_agreement(self, title: str, label: Dict[str, Any]):
+        """Count whether the keywords matched in a title agree with its LLM label."""
+        match = self._match(title, "", "")
+        checks = []
+        if match["area_keyword"]:
+            checks.append((("area", match["area_keyword"]), match["area"] == label.get("functional_area")))
+        if match["level_keyword"]:
+            checks.append((("level", match["level_keyword"]), match["level"][0] == label.get("seniority_level")))
+        for key, agreed in checks:
+            count = self._agreement.get(key, (0, 0))
+            self._agreement[key] = (count[0] + agreed, count[1] + 1)
+
+    def infer_role(self, job_title: str, department: str = "", seniority: str = "") -> Optional[Dict[str, Any]]:
+        """
+        Return a full inferred_role dict if the title can be classified locally with
+        enough confidence, or None if the caller should ask the LLM.
+        """
+        classification, confidence = self.classify(job_title, department, seniority)
+        if classification is None or confidence < self.min_confidence:
+            self.stats["llm_fallbacks"] += 1
+            return None
+        self.stats["index_hits" if confidence >= 1.0 else "rule_hits"] += 1
+
+        role_category = classification["role_category"]
+        return {
+            **classification,
+            "responsibilities": classification.get("responsibilities") or [],
+            "engagement_strategy": classification.get("engagement_strategy")
+                or ENGAGEMENT_STRATEGIES.get(role_category, "Standard approach"),
+            "permissions_needed": classification.get("permissions_needed") or ["Basic access"],
+            "source": "local_classifier",
+            "confidence": round(confidence, 2),
+        }
+
+    async def learn(self, job_title: str, inferred_role: Dict[str, Any]):
+        """Add an LLM answer to the index so the same title is classified locally next time."""
+        normalized = normalize_title(job_title)
+        required = ("role_category", "functional_area", "seniority_level", "decision_authority")
+        if not normalized or not all(inferred_role.get(field) is not None for field in required):
+            return
+        if normalized not in self._index and len(self._index) >= self.max_entries:
+            return
+
+        entry = {field: inferred_role[field] for field in required}
+        for field in ("responsibilities", "engagement_strategy", "permissions_needed"):
+            if inferred_role.get(field):
+                entry[field] = inferred_role[field]
+        if normalized not in self._index:
+            self._record_agreement(normalized, entry)
+        self._index[normalized] = entry
+        try:
+            await self.redis_service.client.hset(self.INDEX_KEY, normalized, json.dumps(entry))
+        except Exception as e:
+            print(f"Error saving role classifier entry: {e}")
+
+
+# Global instance
+role_classifier = RoleClassifier()
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import math
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.config import settings
+from .redis_service import redis_service
+
+
+def _bucket_hash(bucket: str) -> int:
+    # Stable across processes, unlike hash()
+    return int.from_bytes(hashlib.blake2b(bucket.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+
+def _log(value: Any) -> float:
+    try:
+        return math.log10(1 + max(float(value or 0), 0.0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def deal_key(deal_data: Dict[str, Any]) -> Tuple[Optional[str], List[float]]:
+    """
+    Bucket (company, stage, deal type, contact) and vector (log amount) for
+    assess_risk. The bucket is None for deals without a company, which must
+    not share assessments.
+    """
+    company = (deal_data.get("company_name") or "").lower()
+    if not company:
+        return None, [_log(deal_data.get("amount"))]
+    bucket = "|".join([
+        company,
+        deal_data.get("stage") or "",
+        deal_data.get("deal_type") or "",
+        "contact" if deal_data.get("contact_name") else "",
+    ])
+    return bucket, [_log(deal_data.get("amount"))]
+
+
+def company_key(company_data: Dict[str, Any]) -> Tuple[Optional[str], List[float]]:
+    """
+    Bucket (domain or name, industry) and vector (log employees, log revenue)
+    for normalize_company_data. The bucket is None without a domain or name.
+    """
+    vector = [_log(company_data.get("Employee Count")), _log(company_data.get("Annual Revenue"))]
+    company = (company_data.get("Domain") or company_data.get("Name") or "").lower()
+    if not company:
+        return None, vector
+    return "|".join([company, company_data.get("Industry") or ""]), vector
+
+
+def _owner(bucket: str) -> str:
+    # The first field of a bucket is the company the assessment belongs to
+    return bucket.split("|", 1)[0]
+
+
+class SimilarityIndex:
+    """
+    Bounded in-memory index of past LLM assessments for near-duplicate reuse.
+
+    Each entry is a hashed bucket of the categorical inputs (e.g. company,
+    stage, deal type) plus a small vector of log-scaled numeric inputs.
+    Lookup takes the entries in the same bucket and returns the closest one
+    whose largest per-feature difference is within SIMILARITY_TOLERANCE
+    (0.05 in log10 is about 12%), computed with NumPy over the whole index.
+    Vectors live in a fixed ring buffer of SIMILARITY_INDEX_MAX_ENTRIES rows,
+    so memory is bounded; entries are also appended to a capped Redis list,
+    from which the index is rebuilt on startup.
+
+    Inputs without an identifying company have no bucket and are never
+    reused. invalidate() drops a company's entries when its risk history
+    changes; the invalidation is persisted so a rebuild doesn't bring them back.
+    """
+
+    def __init__(self, kind: str, dim: int):
+        self.redis_service = redis_service
+        self.kind = kind
+        self.history_key = f"similarity_index:{kind}"
+        self.max_entries = settings.SIMILARITY_INDEX_MAX_ENTRIES
+        self.tolerance = settings.SIMILARITY_TOLERANCE
+        self._vectors = np.zeros((self.max_entries, dim), dtype=np.float32)
+        self._buckets = np.zeros(self.max_entries, dtype=np.int64)
+        self._owners = np.zeros(self.max_entries, dtype=np.int64)
+        self._live = np.zeros(self.max_entries, dtype=bool)
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * self.max_entries
+        self._size = 0
+        self._next = 0
+        self.stats = {"hits": 0, "misses": 0}
+
+    async def load(self):
+        """Rebuild the index from the persisted assessment history."""
+        try:
+            rows = await self.redis_service.client.lrange(self.history_key, 0, self.max_entries - 1)
+            invalidated = await self.redis_service.client.hgetall(f"{self.history_key}:invalidated")
+            # LPUSH stores newest first; insert oldest first so the newest survive
+            for row in reversed(rows):
+                entry = json.loads(row)
+                if entry["provenance"]["recorded_at"] <= invalidated.get(_owner(entry["bucket"]), ""):
+                    continue
+                self._insert(entry["bucket"], entry["vector"], entry["payload"], entry["provenance"])
+            print(f"Loaded {self._size} past {self.kind} assessments into the similarity index")
+        except Exception as e:
+            print(f"Error loading {self.kind} similarity index: {e}")
+
+    def lookup(self, bucket: Optional[str], vector: List[float]) -> Optional[Dict[str, Any]]:
+        """
+        Return {"payload", "provenance"} for the closest prior assessment within
+        tolerance, or None. provenance includes the distance to the match.
+        """
+        if self._size and bucket is not None:
+            query = np.asarray(vector, dtype=np.float32)
+            candidates = np.flatnonzero(
+                (self._buckets[:self._size] == _bucket_hash(bucket)) & self._live[:self._size]
+            )
+            if candidates.size:
+                distances = np.abs(self._vectors[candidates] - query).max(axis=1)
+                best = int(np.argmin(distances))
+                if distances[best] <= self.tolerance:
+                    entry = self._entries[int(candidates[best])]
+                    self.stats["hits"] += 1
+                    return {
+                        "payload": entry["payload"],
+                        "provenance": {**entry["provenance"], "distance": round(float(distances[best]), 4)},
+                    }
+        self.stats["misses"] += 1
+        return None
+
+    async def add(self, bucket: Optional[str], vector: List[float], payload: Dict[str, Any], source_id: str = ""):
+        """Index an LLM assessment and append it to the persisted history."""
+        if bucket is None:
+            return
+        provenance = {
+            "kind": self.kind,
+            "source_id": source_id,
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+        }
+        self._insert(bucket, vector, payload, provenance)
+        try:
+            row = json.dumps({"bucket": bucket, "vector": vector, "payload": payload, "provenance": provenance}, default=str)
+            await self.redis_service.client.lpush(self.history_key, row)
+            await self.redis_service.client.ltrim(self.history_key, 0, self.max_entries - 1)
+        except Exception as e:
+            print(f"Error saving {self.kind} similarity entry: {e}")
+
+    async def invalidate(self, company: str):
+        """Stop reusing the assessments of a company, e.g. after a new high-risk outcome."""
+        owner = (company or "").lower()
+        if not owner:
+            return
+        self._live[:self._size] &= self._owners[:self._size] != _bucket_hash(owner)
+        try:
+            await self.redis_service.client.hset(
+                f"{self.history_key}:invalidated", owner, datetime.now(timezone.utc).isoformat()
+            )
+        except Exception as e:
+            print(f"Error invalidating {self.kind} similarity entries: {e}")
+
+    def _insert(self, bucket: str, vector: List[float], payload: Dict[str, Any], provenance: Dict[str, Any]):
+        slot = self._next
+        self._vectors[slot] = vector
+        self._buckets[slot] = _bucket_hash(bucket)
+        self._owners[slot] = _bucket_hash(_owner(bucket))
+        self._live[slot] = True
+        self._entries[slot] = {"payload": payload, "provenance": provenance}
+        self._next = (slot + 1) % self.max_entries
+        self._size = min(self._size + 1, self.max_entries)
+
+
+# Global instances
+risk_similarity = SimilarityIndex("assess_risk", dim=1)
+company_similarity = SimilarityIndex("normalize_company_data", dim=2)
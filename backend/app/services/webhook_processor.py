@@ -1,8 +1,16 @@
+import asyncio
+import hashlib
+import json
 import uuid
-from typing import Dict, Any
-from app.services.hubspot_client import HubSpotClient
+from typing import Dict, Any, List, Optional
+from app.services.hubspot_client import HubSpotClient, property_projection, to_epoch_ms
+from app.services.enrichment_cache import EnrichmentCache
+from app.services.hubspot_mirror import HubSpotMirror
+from app.services.enrichment import EnrichmentDepth, enrich
 from app.services.workflow_engine import workflow_engine
 from app.services.redis_service import redis_service
+from app.services.batching import batch_scope
+from app.services.blob_store import blob_store
 
 # The actual workflow graphs will be imported here once they are defined.
 from app.workflows import company_intake, contact_role_mapping, deal_stage_kickoff, procurement_approval
@@ -12,22 +20,97 @@ class WebhookProcessor:
     Handles incoming webhook events, enriches them, and triggers the appropriate workflow.
     """
     def __init__(self):
-        self.hubspot_client = HubSpotClient()
-        self.redis_service = redis_service
-        # The workflow_registry maps event types (sometimes with property specifics) to graphs.
+        # The workflow_registry maps event types (sometimes with property specifics) to
+        # workflow modules, which expose the compiled `graph` and their INPUT_FIELDS.
         self.workflow_registry = {
-            "company.creation": company_intake.graph,
-            "company.propertyChange": company_intake.graph,
-            "contact.creation": contact_role_mapping.graph,
-            "contact.propertyChange": contact_role_mapping.graph,
-            "deal.propertyChange.dealstage": deal_stage_kickoff.graph,
-            "deal.propertyChange.amount": procurement_approval.graph,
+            "company.creation": company_intake,
+            "company.propertyChange": company_intake,
+            "contact.creation": contact_role_mapping,
+            "contact.propertyChange": contact_role_mapping,
+            "deal.propertyChange.dealstage": deal_stage_kickoff,
+            "deal.propertyChange.amount": procurement_approval,
         }
+        # Objects of a type are read by the workflows its events trigger and, as
+        # associated objects, by others; one projection per type (the union of the
+        # workflows' REQUIRED_PROPERTIES) lets every read share batches and cache entries.
+        self.hubspot_client = HubSpotClient(properties=property_projection(set(self.workflow_registry.values())))
+        self.hubspot_mirror = HubSpotMirror(self.hubspot_client)
+        self.enrichment_cache = EnrichmentCache(self.hubspot_client, self.hubspot_mirror)
+        self.redis_service = redis_service
+        # Events discarded by this worker because a newer one was already seen
+        self.stale_events_skipped = 0
 
     async def process_event(self, hubspot_event: Dict[str, Any]):
         """
         Processes a single HubSpot webhook event.
         """
+        prepared = await self._prepare_run(hubspot_event)
+        if "graph" not in prepared:
+            return prepared
+
+        # 3. Invoke the workflow
+        return await self._run(prepared)
+
+    async def process_batch(self, hubspot_events: List[Dict[str, Any]], max_wait: float = 0.05) -> List[Dict[str, Any]]:
+        """
+        Processes many events for the same workflow in lockstep.
+
+        Runs are executed concurrently inside a batch scope, so the LLM calls and
+        Airtable writes they make at the same node are sent as batch calls. Each
+        run keeps its own thread and state; a failing run is reported in its own
+        result without affecting the others. Events may be raw HubSpot events or
+        event envelopes.
+        """
+        events = [event.get("payload", event) for event in hubspot_events]
+        # Validate before any run claims high-water marks or enriches its event
+        workflows = {workflow for workflow in map(self.resolve_workflow, events) if workflow}
+        if len(workflows) > 1:
+            raise ValueError("process_batch expects events that all resolve to the same workflow")
+        prepared_runs = await asyncio.gather(*(self._prepare_run(event) for event in events), return_exceptions=True)
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(events)
+        runnable = []
+        for index, prepared in enumerate(prepared_runs):
+            if isinstance(prepared, Exception):
+                results[index] = {"status": "failed", "error": str(prepared), "error_type": type(prepared).__name__}
+            elif "graph" not in prepared:
+                results[index] = prepared
+            else:
+                runnable.append((index, prepared))
+
+        if runnable:
+            print(f"Running batch of {len(runnable)} workflow runs in lockstep")
+            with batch_scope(len(runnable), max_wait=max_wait):
+                outcomes = await asyncio.gather(*(self._run(prepared) for _, prepared in runnable), return_exceptions=True)
+            for (index, prepared), outcome in zip(runnable, outcomes):
+                if isinstance(outcome, Exception):
+                    outcome = {
+                        "thread_id": prepared["thread_id"],
+                        "status": "failed",
+                        "error": str(outcome),
+                        "error_type": type(outcome).__name__,
+                    }
+                results[index] = outcome
+
+        return results
+
+    def resolve_workflow(self, hubspot_event: Dict[str, Any]):
+        """Returns the workflow module registered for an event, or None."""
+        event_type = hubspot_event.get("subscriptionType")
+        # Simple router for deal property changes
+        if event_type == "deal.propertyChange":
+            property_name = hubspot_event.get("propertyName")
+            lookup_key = f"{event_type}.{property_name}"
+            return self.workflow_registry.get(lookup_key)
+        return self.workflow_registry.get(event_type)
+
+    async def _prepare_run(self, hubspot_event: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Runs the idempotency check, routing and enrichment for an event.
+
+        Returns either an "ignored"/"skipped" result, or the graph, input,
+        thread_id, idempotency key and input fingerprint needed to run the workflow.
+        """
         event_type = hubspot_event.get("subscriptionType")
         object_id = str(hubspot_event.get("objectId"))
 
@@ -43,65 +126,153 @@ class WebhookProcessor:
             print(f"Duplicate workflow run for object {object_id} at {occurred_at} ignored.")
             return {"status": "ignored", "reason": "Duplicate run for object state", "cached_result": existing_result}
 
-        graph = None
-        # Simple router for deal property changes
-        if event_type == "deal.propertyChange":
-            property_name = hubspot_event.get("propertyName")
-            lookup_key = f"{event_type}.{property_name}"
-            graph = self.workflow_registry.get(lookup_key)
-        else:
-            graph = self.workflow_registry.get(event_type)
+        # Every event upgrades or invalidates the cached copy of its object, even
+        # events no workflow is registered for.
+        await self.enrichment_cache.observe_event(hubspot_event)
+        await self.hubspot_mirror.apply_event(hubspot_event)
 
-        if not graph:
+        workflow = self.resolve_workflow(hubspot_event)
+        if not workflow:
             print(f"No workflow could be resolved for event: {event_type} with property {hubspot_event.get('propertyName')}. Ignored.")
             return {"status": "ignored", "reason": "No workflow resolved"}
+        workflow_name = workflow.__name__.rsplit(".", 1)[-1]
+
+        # HubSpot doesn't guarantee delivery order. Discard events older than the
+        # newest one already seen for this object and property, before enrichment.
+        object_type = (event_type or "").split(".")[0]
+        property_name = hubspot_event.get("propertyName") or event_type
+        version_marks = []
+        event_mark = await self._claim_version(f"{object_type}:{object_id}:{property_name}", occurred_at)
+        if event_mark is None:
+            return await self._discard_stale(event_type, object_id, f"{property_name} occurredAt {occurred_at}")
+        version_marks.append(event_mark)
 
         # 1. Enrich data
         print(f"Enriching data for event: {event_type} - objectId: {object_id}")
-        enriched_data = await self._enrich_data(event_type, object_id)
+        try:
+            depth = getattr(workflow, "ENRICHMENT_DEPTH", EnrichmentDepth.ASSOCIATED_OBJECTS)
+            enriched_data = await self._enrich_data(event_type, object_id, occurred_at, depth)
+        except Exception:
+            await self._release_versions(version_marks)
+            raise
+
+        # Enrichment may be served from a cache or mirror; never run a workflow on
+        # an object version older than one it has already seen.
+        last_modified = to_epoch_ms(
+            enriched_data.get("details", {}).get("properties", {}).get("hs_lastmodifieddate")
+        )
+        if last_modified is not None:
+            object_mark = await self._claim_version(f"{workflow_name}:{object_id}:hs_lastmodifieddate", last_modified, allow_equal=True)
+            if object_mark is None:
+                await self._release_versions(version_marks)
+                return await self._discard_stale(event_type, object_id, f"hs_lastmodifieddate {last_modified}")
+            version_marks.append(object_mark)
+
+        # Skip the run if the inputs the workflow reads are unchanged since the
+        # last successful run for this object: one hash and one Redis lookup.
+        fingerprint = fingerprint_inputs(
+            {"hubspot_event": hubspot_event, "enriched_data": enriched_data},
+            workflow.INPUT_FIELDS,
+        )
+        last_run = await self.redis_service.get_input_fingerprint(workflow_name, object_id)
+        if last_run and last_run.get("fingerprint") == fingerprint:
+            print(f"Inputs of {workflow_name} unchanged for object {object_id}. Skipped.")
+            return {"status": "skipped", "reason": "Workflow inputs unchanged", "cached_result": last_run.get("result")}
 
         # 2. Prepare workflow input
         # A unique thread_id is created for each run to ensure state isolation
         thread_id = f"{event_type}-{object_id}-{uuid.uuid4()}"
+        # Large payloads go to the blob store once; the state only carries references
         workflow_input = {
-            "hubspot_event": hubspot_event,
-            "enriched_data": enriched_data,
+            "hubspot_event": await blob_store.offload(hubspot_event),
+            "enriched_data": await blob_store.offload(enriched_data),
+        }
+        return {
+            "graph": workflow.graph,
+            "workflow_name": workflow_name,
+            "object_id": object_id,
+            "fingerprint": fingerprint,
+            "workflow_input": workflow_input,
+            "thread_id": thread_id,
+            "idempotency_key": idempotency_key,
+            "version_marks": version_marks,
         }
 
-        # 3. Invoke the workflow
+    async def _claim_version(self, key: str, version: Any, allow_equal: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Advance the high-water mark for key to version.
+
+        Returns the claimed mark, or None if a newer (or, unless allow_equal, the
+        same) version was already seen. Events without a version are let through.
+        """
+        try:
+            version = int(version)
+        except (TypeError, ValueError):
+            return {"key": key, "version": None, "previous": None}
+        claimed = await self.redis_service.advance_high_water_mark(key, version, allow_equal=allow_equal)
+        if not claimed["advanced"]:
+            return None
+        return {"key": key, "version": version, "previous": claimed["previous"]}
+
+    async def _release_versions(self, version_marks: List[Dict[str, Any]]):
+        """Roll back marks claimed by a run that did not complete, so retries aren't discarded."""
+        for mark in version_marks:
+            if mark["version"] is not None:
+                await self.redis_service.release_high_water_mark(mark["key"], mark["version"], mark["previous"])
+
+    async def _discard_stale(self, event_type: str, object_id: str, reason: str) -> Dict[str, Any]:
+        """Count and report a superseded event."""
+        self.stale_events_skipped += 1
+        await self.redis_service.increment_counter(f"stale_events_skipped:{event_type}")
+        print(f"Superseded {event_type} event for object {object_id} ({reason}) discarded.")
+        return {"status": "ignored", "reason": "Superseded by a newer event", "detail": reason}
+
+    async def _run(self, prepared: Dict[str, Any]) -> Dict[str, Any]:
+        """Invokes a prepared workflow run and caches its result for idempotency."""
+        thread_id = prepared["thread_id"]
         print(f"Invoking workflow for thread_id: {thread_id}")
         try:
-            final_state = await workflow_engine.invoke_workflow(graph, workflow_input, thread_id)
+            # The run result is compact and JSON-serializable, so it can be cached as-is
+            result = await workflow_engine.invoke_workflow(prepared["graph"], prepared["workflow_input"], thread_id)
             print(f"Workflow finished for thread_id: {thread_id}.")
             
             # Cache the result for idempotency
-            result = {"thread_id": thread_id, "final_state": final_state}
-            await self.redis_service.set_idempotency_key(idempotency_key, result)
+            await self.redis_service.set_idempotency_key(prepared["idempotency_key"], result)
+            # An interrupted run hasn't processed these inputs yet, so don't skip the next one
+            if result["status"] == "completed":
+                await self.redis_service.set_input_fingerprint(
+                    prepared["workflow_name"], prepared["object_id"], prepared["fingerprint"], result
+                )
             
             return result
         except Exception as e:
             print(f"Error in workflow execution for thread_id {thread_id}: {str(e)}")
+            await self._release_versions(prepared.get("version_marks", []))
             # In a real system, we'd want to implement a retry mechanism or dead-letter queue
             raise
 
-    async def _enrich_data(self, event_type: str, object_id: str) -> Dict[str, Any]:
+    async def _enrich_data(self, event_type: str, object_id: str, occurred_at: Any = None,
+                           depth: EnrichmentDepth = EnrichmentDepth.ASSOCIATED_OBJECTS) -> Dict[str, Any]:
         """
-        Fetches additional object details and associations from HubSpot.
+        Fetches object details and, as deep as the workflow needs, its associations
+        and associated objects from HubSpot. Details come from the enrichment
+        cache when it holds a version at least as new as the event.
         """
-        data = {}
         object_type = event_type.split('.')[0]  # e.g., 'company', 'contact', 'deal'
+        if object_type not in ("company", "contact", "deal"):
+            return {"associations": {}}
+        return await enrich(self.hubspot_client, self.enrichment_cache, object_type, object_id, occurred_at, depth)
 
-        if object_type == "company":
-            data['details'] = await self.hubspot_client.get_company(object_id)
-        elif object_type == "contact":
-            data['details'] = await self.hubspot_client.get_contact(object_id)
-        elif object_type == "deal":
-            data['details'] = await self.hubspot_client.get_deal(object_id)
-        
-        # Also fetch associated objects (e.g., company for a contact)
-        data['associations'] = await self.hubspot_client.get_associations(object_type, object_id)
-        
-        return data
+def fingerprint_inputs(workflow_input: Dict[str, Any], fields: List[str]) -> str:
+    """Hash the values at the given dotted paths of the workflow input."""
+    selected = {}
+    for field in fields:
+        value: Any = workflow_input
+        for part in field.split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+        selected[field] = value
+    payload = json.dumps(selected, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
 # Create a singleton instance to be used across the application
 webhook_processor = WebhookProcessor()
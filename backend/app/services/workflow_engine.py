@@ -1,6 +1,13 @@
+from typing import Any, Dict, List, Optional
+import json
+import time
+from langgraph.channels.binop import BinaryOperatorAggregate
 from langgraph.checkpoint.redis import RedisSaver
 from app.config import settings
 from .redis_service import redis_service
+from .checkpoint_policy import CheckpointPolicy, PolicyCheckpointSaver
+from .airtable_client import airtable_client
+from .write_buffer import run_write_buffer
 
 class WorkflowEngine:
     """
@@ -18,40 +25,90 @@ class WorkflowEngine:
         # Initialize Redis checkpointer for LangGraph after Redis connection is established
         self.checkpointer = RedisSaver(redis_client=self.redis_service.client)
 
-    def get_checkpointer(self):
+    def get_checkpointer(self, node_policies: Optional[Dict[str, CheckpointPolicy]] = None):
         """
-        Returns the Redis checkpointer instance.
+        Returns a checkpointer for a graph that applies the given per-node
+        checkpoint policies on top of the Redis checkpointer.
+
+        Nodes not listed in node_policies are checkpointed after every step.
         """
-        return self.checkpointer
+        return PolicyCheckpointSaver(self, node_policies)
 
-    async def invoke_workflow(self, graph, workflow_input: dict, thread_id: str):
+    async def invoke_workflow(self, graph, workflow_input: dict, thread_id: str,
+                              capture: str = "summary") -> Dict[str, Any]:
         """
-        Invokes a compiled LangGraph workflow and streams events.
+        Invokes a compiled LangGraph workflow and captures its result.
+
+        The graph is streamed as lightweight "updates" chunks (node name and
+        delta only). The final state is the input with every delta merged in,
+        through the graph's reducers, so neither full-state chunks nor an
+        extra checkpoint read are needed. The state is only read back when
+        resuming a thread (no input) or when the graph can be interrupted.
+        Airtable writes made during the run are buffered and merged per
+        record, and flushed at flushes_writes nodes and when the run ends.
 
         Args:
             graph: The compiled LangGraph runnable.
             workflow_input: The initial state or input for the workflow.
             thread_id: A unique identifier for the workflow run.
+            capture: "summary" returns a compact, JSON-serializable run result;
+                "values" additionally includes the full final state values.
         """
         config = {"configurable": {"thread_id": thread_id}}
-        final_state = None
-        
+        final_values = dict(workflow_input) if isinstance(workflow_input, dict) else None
+        steps: List[str] = []
+        started = time.perf_counter()
+
         print(f"--- Invoking Workflow for Thread ID: {thread_id} ---")
-        async for event in graph.astream(workflow_input, config):
-            # The event stream can be used for real-time logging or updates
-            print("--- Workflow Event ---")
-            print(event)
-            print("--- End Event ---")
-            # The final state is captured from the stream
-            if event.get("event") == "on_chain_end":
-                final_state = event.get("data", {}).get("output")
-
-        # If the stream didn't provide a final state, get it directly
-        if final_state is None:
-            final_state = await graph.aget_state(config)
-
-        print(f"--- Workflow Finished for Thread ID: {thread_id} ---")
-        return final_state
+        async with run_write_buffer(airtable_client):
+            async for chunk in graph.astream(workflow_input, config, stream_mode="updates"):
+                for node, update in chunk.items():
+                    steps.append(node)
+                    if final_values is not None and update:
+                        _merge_update(graph, final_values, update)
+
+        status = "completed"
+        pending_nodes: List[str] = []
+        if final_values is None or graph.interrupt_before_nodes or graph.interrupt_after_nodes:
+            snapshot = await graph.aget_state(config)
+            if final_values is None:
+                final_values = snapshot.values if snapshot else {}
+            if snapshot and snapshot.next:
+                status = "interrupted"
+                pending_nodes = list(snapshot.next)
+
+        duration_ms = round((time.perf_counter() - started) * 1000, 2)
+        print(f"--- Workflow {status.capitalize()} for Thread ID: {thread_id} ({len(steps)} steps, {duration_ms}ms) ---")
+
+        run_result = {
+            "thread_id": thread_id,
+            "status": status,
+            "steps": steps,
+            "final_result": final_values.get("final_result"),
+            "errors": list(final_values.get("errors") or []),
+            "duration_ms": duration_ms,
+        }
+        if pending_nodes:
+            run_result["next"] = pending_nodes
+        if capture == "values":
+            run_result["values"] = final_values
+        return _to_serializable(run_result)
+
+
+def _merge_update(graph, values: Dict[str, Any], update: Dict[str, Any]):
+    """Apply a node's delta the way LangGraph does: reducer channels combine, others overwrite."""
+    for key, value in update.items():
+        channel = graph.channels.get(key)
+        if isinstance(channel, BinaryOperatorAggregate) and key in values:
+            values[key] = channel.operator(values[key], value)
+        else:
+            values[key] = value
+
+
+def _to_serializable(value: Any) -> Any:
+    """Round-trip through JSON so run results can be cached and sent as events."""
+    return json.loads(json.dumps(value, default=str))
+
 
 # Create a singleton instance to be used across the application
 workflow_engine = WorkflowEngine()
@@ -0,0 +1,155 @@
+import asyncio
+import functools
+import uuid
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from langchain_core.runnables.config import var_child_runnable_config
+
+PENDING_PREFIX = "pending:"
+
+# Counters across all runs of this worker
+write_buffer_stats = {"runs": 0, "writes_buffered": 0, "writes_sent": 0}
+
+_current: ContextVar[Optional["RunWriteBuffer"]] = ContextVar("run_write_buffer", default=None)
+
+
+class RunWriteBuffer:
+    """
+    Write-behind buffer for the Airtable record writes of one workflow run.
+
+    Updates to the same record are merged field by field (later values win,
+    as with Airtable's PATCH), and updates to a record the run created are
+    folded into the create, so each record is written once per flush. A
+    buffered create returns a provisional "pending:" record ID; after the
+    flush, resolve() maps it to the real one. The buffer is flushed before
+    nodes marked with flushes_writes and at the end of the run.
+
+    Each write is tagged with the checkpoint the node that made it ran on, so
+    the checkpointer can flush only the writes made before a checkpoint it
+    saves and leave those of later steps to be merged.
+    """
+
+    def __init__(self, client: Any):
+        self.client = client
+        # Provisional ID -> (base, table, fields)
+        self._creates: Dict[str, Tuple[str, str, Dict[str, Any]]] = {}
+        # (base, table, record ID) -> fields
+        self._updates: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        self._resolved: Dict[str, str] = {}
+        # Provisional ID or update key -> checkpoint its first write was made on
+        self._made_on: Dict[Any, str] = {}
+
+    def create(self, base_id: str, table_name: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        write_buffer_stats["writes_buffered"] += 1
+        record_id = f"{PENDING_PREFIX}{uuid.uuid4().hex[:12]}"
+        self._creates[record_id] = (base_id, table_name, dict(fields))
+        self._made_on[record_id] = _running_on()
+        return {"id": record_id, "fields": fields}
+
+    def update(self, base_id: str, table_name: str, record_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        write_buffer_stats["writes_buffered"] += 1
+        record_id = self.resolve(record_id)
+        if record_id in self._creates:
+            merged = self._creates[record_id][2]
+        else:
+            key = (base_id, table_name, record_id)
+            self._made_on.setdefault(key, _running_on())
+            merged = self._updates.setdefault(key, {})
+        merged.update(fields)
+        return {"id": record_id, "fields": dict(merged)}
+
+    def resolve(self, record_id: Any) -> Any:
+        """The real record ID for a provisional one that has been flushed."""
+        return self._resolved.get(record_id, record_id) if isinstance(record_id, str) else record_id
+
+    def _take(self, entries: Dict[Any, Any], through: Optional[str], inclusive: bool) -> Dict[Any, Any]:
+        """Remove and return the entries first written on or before checkpoint `through`."""
+        if through is None:
+            taken = entries.copy()
+        else:
+            # Checkpoint IDs are time-ordered (uuid6), writes made outside a graph node sort first
+            taken = {
+                key: value for key, value in entries.items()
+                if self._made_on.get(key, "") < through or (inclusive and self._made_on.get(key, "") == through)
+            }
+        for key in taken:
+            del entries[key]
+            self._made_on.pop(key, None)
+        return taken
+
+    async def flush(self, through: Optional[str] = None, inclusive: bool = True):
+        """
+        Send the buffered writes: creates first, then updates, all through the batching writer.
+
+        With `through`, only writes made by nodes that ran on that checkpoint
+        (if inclusive) or an earlier one are sent; a record's merged write goes
+        out whole once its first write is due.
+        """
+        creates = self._take(self._creates, through, inclusive)
+        updates = self._take(self._updates, through, inclusive)
+        if not creates and not updates:
+            return
+        created = await asyncio.gather(*(
+            self.client.writer.submit(base_id, table_name, "create", {"fields": fields})
+            for base_id, table_name, fields in creates.values()
+        ), return_exceptions=True)
+        updated = await asyncio.gather(*(
+            self.client.writer.submit(base_id, table_name, "update", {"id": record_id, "fields": fields})
+            for (base_id, table_name, record_id), fields in updates.items()
+        ), return_exceptions=True)
+        write_buffer_stats["writes_sent"] += len(creates) + len(updates)
+        for provisional_id, record in zip(creates, created):
+            if not isinstance(record, BaseException):
+                self._resolved[provisional_id] = record["id"]
+        errors = [result for result in (*created, *updated) if isinstance(result, BaseException)]
+        if errors:
+            raise errors[0]
+
+
+def _running_on() -> str:
+    """ID of the checkpoint the calling graph node runs on, empty outside a graph run."""
+    config = var_child_runnable_config.get() or {}
+    return (config.get("metadata") or {}).get("checkpoint_id") or ""
+
+
+def current_write_buffer() -> Optional[RunWriteBuffer]:
+    return _current.get()
+
+
+@asynccontextmanager
+async def run_write_buffer(client: Any):
+    """Buffer the Airtable writes of the enclosed run and flush them when it ends, even if it fails."""
+    buffer = RunWriteBuffer(client)
+    token = _current.set(buffer)
+    write_buffer_stats["runs"] += 1
+    failed = False
+    try:
+        yield buffer
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        _current.reset(token)
+        try:
+            await buffer.flush()
+        except Exception as e:
+            if not failed:
+                raise
+            print(f"Failed to flush buffered writes of a failed run: {e}")
+
+
+def flushes_writes(node: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]):
+    """
+    Mark a node as a side-effect point: the run's buffered writes are sent
+    before it runs, and record IDs in its state are resolved to real ones.
+    """
+    @functools.wraps(node)
+    async def run(state: Dict[str, Any]) -> Dict[str, Any]:
+        buffer = current_write_buffer()
+        if buffer is not None:
+            await buffer.flush()
+            state = {key: buffer.resolve(value) for key, value in state.items()}
+        return await node(state)
+    return run
@@ -1,11 +1,39 @@
-from typing import TypedDict, Dict, Any, List
+from typing import TypedDict, Dict, Any, List, Annotated
+import operator
 from langgraph.graph import StateGraph, END
 from langchain_core.messages import HumanMessage, SystemMessage
 import json
 from app.services.workflow_engine import workflow_engine
-from app.services.airtable_client import AirtableClient
+from app.services.checkpoint_policy import CheckpointPolicy
+from app.services.enrichment import EnrichmentDepth
+from app.services.airtable_client import airtable_client
 from app.services.notion_client import NotionClient
-from app.services.llm_client import get_llm_client
+from app.services.llm_client import compact_json, get_llm_client
+from app.services.blob_store import blob_store
+from app.services.risk_scorer import HIGH_RISK_LEVELS, company_features, risk_scorer
+from app.services.similarity_index import company_key, company_similarity
+
+# Input fields (dotted paths into the workflow input) this workflow depends on.
+# A run is skipped when these are unchanged since the last successful run for the object.
+INPUT_FIELDS = [
+    "enriched_data.details.id",
+    "enriched_data.details.properties.name",
+    "enriched_data.details.properties.domain",
+    "enriched_data.details.properties.industry",
+    "enriched_data.details.properties.numberofemployees",
+    "enriched_data.details.properties.annualrevenue",
+    "enriched_data.details.properties.lifecyclestage",
+]
+
+# How much of the CRM graph enrichment fetches for this workflow.
+# Only the company itself is read.
+ENRICHMENT_DEPTH = EnrichmentDepth.DETAILS
+
+# CRM properties (by object type) this workflow reads from the enriched objects.
+# Enrichment requests only these, unioned with the other workflows' declarations.
+REQUIRED_PROPERTIES = {
+    "companies": ["name", "domain", "industry", "numberofemployees", "annualrevenue", "lifecyclestage"],
+}
 
 # 1. Define the State for the workflow
 class CompanyIntakeState(TypedDict):
@@ -19,94 +47,127 @@ class CompanyIntakeState(TypedDict):
     requires_approval: bool
     approval_data: Dict[str, Any]
     final_result: Dict[str, Any]
-    errors: List[str]
+    errors: Annotated[List[str], operator.add]
 
 # 2. Create Node functions
-airtable_client = AirtableClient()
 notion_client = NotionClient()
-llm = get_llm_client()
+llm = get_llm_client(workflow="company_intake")
 
-async def start_intake(state: CompanyIntakeState) -> CompanyIntakeState:
+async def start_intake(state: CompanyIntakeState) -> Dict[str, Any]:
     """Node to start the workflow and perform initial validation."""
     print("--- Node: start_intake ---")
     # In a real scenario, we might do some initial validation here
-    state["kickoff_scheduled"] = False  # Initialize
-    state["requires_approval"] = False
-    state["approval_data"] = {}
-    if "errors" not in state:
-        state["errors"] = []
-    return state
+    return {
+        "kickoff_scheduled": False,  # Initialize
+        "requires_approval": False,
+        "approval_data": {},
+    }
 
-async def extract_company_data(state: CompanyIntakeState) -> CompanyIntakeState:
+async def extract_company_data(state: CompanyIntakeState) -> Dict[str, Any]:
     """Extract and normalize company data from HubSpot."""
     print("--- Node: extract_company_data ---")
     try:
-        company_details = state["enriched_data"]["details"]["properties"]
+        enriched_data = await blob_store.resolve(state["enriched_data"])
+        company_details = enriched_data["details"]["properties"]
         
         company_data = {
-            "id": state["enriched_data"]["details"]["id"],
+            "id": enriched_data["details"]["id"],
             "Name": company_details.get("name"),
             "Domain": company_details.get("domain"),
             "Industry": company_details.get("industry"),
             "Employee Count": int(company_details.get("numberofemployees", 0) or 0),
             "Annual Revenue": float(company_details.get("annualrevenue", 0) or 0),
             "Lifecycle Stage": company_details.get("lifecyclestage", "prospect"),
-            "HubSpot ID": state["enriched_data"]["details"]["id"]
+            "HubSpot ID": enriched_data["details"]["id"]
         }
-        state["company_data"] = company_data
         print(f"Extracted company data: {company_data}")
-        return state
+        return {"company_data": company_data}
     except Exception as e:
-        state["errors"].append(f"Failed to extract company data: {str(e)}")
+        print(f"Failed to extract company data: {str(e)}")
         raise
 
-async def normalize_company_data(state: CompanyIntakeState) -> CompanyIntakeState:
+# Static prompt prefix; the company is appended as compact JSON so the provider can cache the prefix
+NORMALIZE_COMPANY_INSTRUCTIONS = """You are a data analyst specializing in company data enrichment.
+
+Analyze and enrich the company data in the user message. Please:
+1. Validate the industry classification
+2. Suggest any missing critical information
+3. Flag any data quality issues
+4. Provide a risk assessment (LOW/MEDIUM/HIGH)
+5. Calculate potential customer value score (1-10)
+6. Recommend onboarding priority level
+
+Return a JSON object with the enriched data and analysis."""
+
+async def normalize_company_data(state: CompanyIntakeState) -> Dict[str, Any]:
     """Node to normalize company data from HubSpot using AI enrichment."""
     print("--- Node: normalize_company_data ---")
     try:
-        company_data = state["company_data"]
-        
-        # Use LLM to enrich and validate data
-        enrichment_prompt = f"""
-        Analyze and enrich this company data:
-        {json.dumps(company_data, indent=2)}
-        
-        Please:
-        1. Validate the industry classification
-        2. Suggest any missing critical information
-        3. Flag any data quality issues
-        4. Provide a risk assessment (LOW/MEDIUM/HIGH)
-        5. Calculate potential customer value score (1-10)
-        6. Recommend onboarding priority level
+        # Copy so the extracted company_data is not rewritten in place
+        company_data = dict(state["company_data"])
+        history_key = company_data.get("Domain") or company_data.get("Name") or ""
         
-        Return a JSON object with the enriched data and analysis.
-        """
+        # The enrichment always comes from the LLM (or a near-duplicate's answer);
+        # only the risk level of clear-cut companies is scored locally.
+        history = await risk_scorer.history(history_key)
+        risk_score, risk_level = risk_scorer.assess_company(company_data, history)
+        risk_features = company_features(company_data, history)
+        # A local risk level isn't recorded into the history it was scored from;
+        # a high-risk one still makes the company's earlier analyses stale
+        if risk_level in HIGH_RISK_LEVELS:
+            await company_similarity.invalidate(history_key)
         
-        response = await llm.ainvoke([
-            SystemMessage(content="You are a data analyst specializing in company data enrichment."),
-            HumanMessage(content=enrichment_prompt)
-        ])
+        # Reuse the analysis of a near-duplicate intake (same domain and industry,
+        # similar size) instead of asking the LLM again
+        bucket, vector = company_key(company_data)
+        prior = company_similarity.lookup(bucket, vector)
+        if prior is not None:
+            company_data.update(prior["payload"].get("enriched_data", {}))
+            company_data["ai_analysis"] = dict(prior["payload"].get("analysis", {}))
+            company_data["ai_answered_by"] = "similarity"
+            company_data["ai_reused_from"] = prior["provenance"]
+        else:
+            # Use LLM to enrich and validate data
+            response = await llm.ainvoke([
+                SystemMessage(content=NORMALIZE_COMPANY_INSTRUCTIONS),
+                HumanMessage(content=compact_json(company_data))
+            ], node="normalize_company_data", fallback={"analysis": {"error": "LLM latency budget exceeded"}})
+            
+            # Parse LLM response and merge with normalized data
+            try:
+                llm_analysis = json.loads(response.content)
+                company_data.update(llm_analysis.get("enriched_data", {}))
+                company_data["ai_analysis"] = llm_analysis.get("analysis", {})
+            except json.JSONDecodeError:
+                llm_analysis = None
+                company_data["ai_analysis"] = {"error": "Failed to parse LLM response"}
+            company_data["ai_answered_by"] = response.response_metadata.get("answered_by", "primary")
+            if company_data["ai_answered_by"] != "fallback" and isinstance(company_data["ai_analysis"], dict):
+                llm_risk_level = company_data["ai_analysis"].get("risk_level", "")
+                if await risk_scorer.record(history_key, llm_risk_level):
+                    await company_similarity.invalidate(history_key)
+                if llm_analysis is not None:
+                    await risk_scorer.record_verdict("company", risk_features, llm_risk_level)
+                    await company_similarity.add(bucket, vector, llm_analysis, source_id=str(company_data.get("id", "")))
         
-        # Parse LLM response and merge with normalized data
-        try:
-            llm_analysis = json.loads(response.content)
-            company_data.update(llm_analysis.get("enriched_data", {}))
-            company_data["ai_analysis"] = llm_analysis.get("analysis", {})
-        except json.JSONDecodeError:
-            company_data["ai_analysis"] = {"error": "Failed to parse LLM response"}
+        if isinstance(company_data.get("ai_analysis"), dict):
+            company_data["ai_analysis"] = {**company_data["ai_analysis"], "risk_score": round(risk_score, 4)}
+            if risk_level is not None:
+                company_data["ai_analysis"]["risk_level"] = risk_level
+                company_data["ai_analysis"]["risk_scored_by"] = "risk_scorer"
         
-        state["normalized_data"] = company_data
         print(f"Normalized data: {company_data}")
-        return state
+        # Large LLM analyses are stored once in the blob store; state keeps the reference
+        return {"normalized_data": await blob_store.offload(company_data)}
     except Exception as e:
-        state["errors"].append(f"Failed to normalize company data: {str(e)}")
+        print(f"Failed to normalize company data: {str(e)}")
         raise
 
-async def check_approval_requirements(state: CompanyIntakeState) -> CompanyIntakeState:
+async def check_approval_requirements(state: CompanyIntakeState) -> Dict[str, Any]:
     """Check if approval is needed based on business rules and AI analysis"""
     print("--- Node: check_approval_requirements ---")
     try:
-        normalized_data = state["normalized_data"]
+        normalized_data = await blob_store.resolve(state["normalized_data"])
         
         # Business rules for approval
         approval_needed = False
@@ -129,18 +190,18 @@ async def check_approval_requirements(state: CompanyIntakeState) -> CompanyIntak
             approval_needed = True
             approval_reasons.append(f"AI flagged as {ai_risk} risk")
         
-        state["requires_approval"] = approval_needed
-        state["approval_data"] = {
-            "reasons": approval_reasons,
-            "company_data": normalized_data,
-            "risk_level": ai_risk,
-            "requested_at": "2024-01-01T00:00:00Z"  # Would use current timestamp
-        }
-        
         print(f"Approval required: {approval_needed}, reasons: {approval_reasons}")
-        return state
+        return {
+            "requires_approval": approval_needed,
+            "approval_data": await blob_store.offload({
+                "reasons": approval_reasons,
+                "company_data": normalized_data,
+                "risk_level": ai_risk,
+                "requested_at": "2024-01-01T00:00:00Z"  # Would use current timestamp
+            }),
+        }
     except Exception as e:
-        state["errors"].append(f"Failed to check approval requirements: {str(e)}")
+        print(f"Failed to check approval requirements: {str(e)}")
         raise
 
 def should_wait_for_approval(state: CompanyIntakeState) -> str:
@@ -148,7 +209,7 @@ def should_wait_for_approval(state: CompanyIntakeState) -> str:
     print("--- Condition: should_wait_for_approval ---")
     return "wait_for_approval" if state.get("requires_approval", False) else "upsert_to_airtable"
 
-async def wait_for_approval(state: CompanyIntakeState) -> CompanyIntakeState:
+async def wait_for_approval(state: CompanyIntakeState) -> Dict[str, Any]:
     """Wait for human approval (interrupt point)"""
     print("--- Node: wait_for_approval (HITL) ---")
     print(">>> Graph interrupted. Waiting for approval with policy snapshot in AGUI...")
@@ -156,9 +217,20 @@ async def wait_for_approval(state: CompanyIntakeState) -> CompanyIntakeState:
     # In a real system, workflow would pause here waiting for AGUI approval
     # For simulation, defaulting to approved
     print("Approval received. Resuming workflow. <<<")
-    return state
+    return {}
 
-async def upsert_to_airtable(state: CompanyIntakeState) -> CompanyIntakeState:
+# Columns of the Airtable Accounts table copied as-is from the normalized data
+ACCOUNT_COLUMNS = ["Name", "Domain", "Industry", "Employee Count", "Annual Revenue", "Lifecycle Stage", "HubSpot ID"]
+
+def account_fields(normalized_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Map normalized company data onto the Accounts table columns; Airtable rejects unknown fields."""
+    ai_analysis = normalized_data.get("ai_analysis") or {}
+    fields = {column: normalized_data[column] for column in ACCOUNT_COLUMNS if normalized_data.get(column) is not None}
+    fields["Risk Level"] = ai_analysis.get("risk_level", "UNKNOWN") if isinstance(ai_analysis, dict) else "UNKNOWN"
+    fields["AI Analysis"] = json.dumps(ai_analysis)
+    return fields
+
+async def upsert_to_airtable(state: CompanyIntakeState) -> Dict[str, Any]:
     """Node to upsert the normalized company data to Airtable."""
     print("--- Node: upsert_to_airtable ---")
     try:
@@ -169,16 +241,15 @@ async def upsert_to_airtable(state: CompanyIntakeState) -> CompanyIntakeState:
         record = await airtable_client.upsert_record(
             base_id=BASE_ID,
             table_name=TABLE_NAME,
-            record=state["normalized_data"]
+            record=account_fields(await blob_store.resolve(state["normalized_data"]))
         )
-        state["airtable_record"] = record
         print(f"Airtable record upserted: {record['id']}")
-        return state
+        return {"airtable_record": record}
     except Exception as e:
-        state["errors"].append(f"Failed to upsert to Airtable: {str(e)}")
+        print(f"Failed to upsert to Airtable: {str(e)}")
         raise
 
-async def attach_notion_sop(state: CompanyIntakeState) -> CompanyIntakeState:
+async def attach_notion_sop(state: CompanyIntakeState) -> Dict[str, Any]:
     """Node to attach a link to the relevant SOP in Notion."""
     print("--- Node: attach_notion_sop ---")
     try:
@@ -187,16 +258,16 @@ async def attach_notion_sop(state: CompanyIntakeState) -> CompanyIntakeState:
         SOP_URL = "https://www.notion.so/your-company-intake-sop"
         
         await notion_client.attach_sop_link(page_id=notion_page_id, sop_url=SOP_URL)
-        state["notion_page_id"] = notion_page_id
-        return state
+        return {"notion_page_id": notion_page_id}
     except Exception as e:
-        state["errors"].append(f"Failed to attach Notion SOP: {str(e)}")
+        print(f"Failed to attach Notion SOP: {str(e)}")
         raise
 
-def should_schedule_kickoff(state: CompanyIntakeState) -> str:
+async def should_schedule_kickoff(state: CompanyIntakeState) -> str:
     """Conditional edge to decide if a kickoff should be scheduled."""
     print("--- Condition: should_schedule_kickoff ---")
-    lifecycle_stage = state["normalized_data"].get("Lifecycle Stage")
+    normalized_data = await blob_store.resolve(state["normalized_data"])
+    lifecycle_stage = normalized_data.get("Lifecycle Stage")
     
     # As per the PRD, schedule a task if lifecycle rules match.
     if lifecycle_stage == "customer":
@@ -206,33 +277,33 @@ def should_schedule_kickoff(state: CompanyIntakeState) -> str:
         print("Rule not matched. Ending workflow.")
         return "end_workflow"
 
-async def schedule_kickoff(state: CompanyIntakeState) -> CompanyIntakeState:
+async def schedule_kickoff(state: CompanyIntakeState) -> Dict[str, Any]:
     """Node to schedule the internal kickoff task."""
     print("--- Node: schedule_kickoff ---")
     # This is a placeholder for the actual kickoff logic.
     # e.g., call Google Client, create a task in Asana, etc.
-    state["kickoff_scheduled"] = True
     print("Kickoff task placeholder executed successfully.")
-    return state
+    return {"kickoff_scheduled": True}
 
-async def finalize_intake(state: CompanyIntakeState) -> CompanyIntakeState:
+async def finalize_intake(state: CompanyIntakeState) -> Dict[str, Any]:
     """Finalize the company intake process"""
     try:
+        normalized_data = await blob_store.resolve(state.get("normalized_data", {}))
         final_result = {
             "status": "completed",
-            "company_data": state["normalized_data"],
+            "company_data": normalized_data,
             "airtable_record": state["airtable_record"],
             "notion_page_id": state.get("notion_page_id"),
             "approval_required": state.get("requires_approval", False),
             "kickoff_scheduled": state.get("kickoff_scheduled", False),
             "completed_at": "2024-01-01T00:00:00Z",  # Would use current timestamp
-            "total_steps": len(state.get("normalized_data", {}).keys())
+            "total_steps": len(normalized_data.keys())
         }
         
-        state["final_result"] = final_result
-        return state
+        # The result leaves the workflow (run result, idempotency cache), so it carries values, not blob references
+        return {"final_result": await blob_store.resolve_all(final_result)}
     except Exception as e:
-        state["errors"].append(f"Failed to finalize intake: {str(e)}")
+        print(f"Failed to finalize intake: {str(e)}")
         raise
 
 # 3. Assemble the Graph
@@ -279,5 +350,17 @@ workflow.add_conditional_edges(
 workflow.add_edge("schedule_kickoff", "finalize_intake")
 workflow.add_edge("finalize_intake", END)
 
-# 4. Compile the Graph with the Redis checkpointer
-graph = workflow.compile(checkpointer=workflow_engine.get_checkpointer())
\ No newline at end of file
+# 4. Compile the Graph with the Redis checkpointer.
+NODE_CHECKPOINT_POLICY = {
+    "start_intake": CheckpointPolicy.NEVER,
+    "extract_company_data": CheckpointPolicy.NEVER,
+    "normalize_data": CheckpointPolicy.AFTER_SIDE_EFFECT,
+    "check_approval_requirements": CheckpointPolicy.NEVER,
+    "wait_for_approval": CheckpointPolicy.ALWAYS,
+    "upsert_to_airtable": CheckpointPolicy.AFTER_SIDE_EFFECT,
+    "attach_notion_sop": CheckpointPolicy.AFTER_SIDE_EFFECT,
+    "schedule_kickoff": CheckpointPolicy.AFTER_SIDE_EFFECT,
+    "finalize_intake": CheckpointPolicy.ALWAYS,
+}
+
+graph = workflow.compile(checkpointer=workflow_engine.get_checkpointer(NODE_CHECKPOINT_POLICY))
\ No newline at end of file
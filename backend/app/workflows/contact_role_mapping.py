@@ -1,11 +1,47 @@
-from typing import TypedDict, Dict, Any, List
+from typing import TypedDict, Dict, Any, List, Annotated
+import operator
 from langgraph.graph import StateGraph, END
 from langchain_core.messages import HumanMessage, SystemMessage
 import json
+from app.config import settings
 from app.services.workflow_engine import workflow_engine
-from app.services.airtable_client import AirtableClient
+from app.services.checkpoint_policy import CheckpointPolicy
+from app.services.enrichment import EnrichmentDepth
+from app.services.airtable_client import airtable_client
 from app.services.notion_client import NotionClient
-from app.services.llm_client import get_llm_client
+from app.services.llm_client import compact_json, get_llm_client
+from app.services.blob_store import blob_store
+from app.services.role_classifier import role_classifier
+from app.services.write_buffer import flushes_writes
+
+# Input fields (dotted paths into the workflow input) this workflow depends on.
+# A run is skipped when these are unchanged since the last successful run for the object.
+INPUT_FIELDS = [
+    "enriched_data.details.id",
+    "enriched_data.details.properties.email",
+    "enriched_data.details.properties.firstname",
+    "enriched_data.details.properties.lastname",
+    "enriched_data.details.properties.jobtitle",
+    "enriched_data.details.properties.phone",
+    "enriched_data.details.properties.company",
+    "enriched_data.details.properties.lifecyclestage",
+    "enriched_data.details.properties.hs_lead_source",
+    "enriched_data.details.properties.seniority",
+    "enriched_data.details.properties.department",
+    "enriched_data.associations.companies",
+]
+
+# How much of the CRM graph enrichment fetches for this workflow.
+# The primary company's name is read from its properties.
+ENRICHMENT_DEPTH = EnrichmentDepth.ASSOCIATED_OBJECTS
+
+# CRM properties (by object type) this workflow reads from the enriched objects.
+# Enrichment requests only these, unioned with the other workflows' declarations.
+REQUIRED_PROPERTIES = {
+    "contacts": ["email", "firstname", "lastname", "jobtitle", "phone", "company", "lifecyclestage",
+                 "hs_lead_source", "seniority", "department"],
+    "companies": ["name"],
+}
 
 # 1. Define the State for the workflow
 class ContactRoleMappingState(TypedDict):
@@ -16,22 +52,24 @@ class ContactRoleMappingState(TypedDict):
     permission_checklist: List[Dict[str, Any]]
     drive_templates: List[Dict[str, Any]]
     airtable_record_id: str
+    primary_company: Dict[str, Any]
     final_result: Dict[str, Any]
-    errors: List[str]
+    errors: Annotated[List[str], operator.add]
 
 # 2. Create Node functions
-airtable_client = AirtableClient()
 notion_client = NotionClient()
-llm = get_llm_client()
+llm = get_llm_client(workflow="contact_role_mapping")
 
-async def extract_contact_data(state: ContactRoleMappingState) -> ContactRoleMappingState:
+async def extract_contact_data(state: ContactRoleMappingState) -> Dict[str, Any]:
     """Extract and normalize contact data"""
     try:
-        input_data = state["enriched_data"]
-        contact_properties = input_data.get("object", {}).get("properties", {})
+        input_data = await blob_store.resolve(state["enriched_data"])
+        # Enrichment stores the object under "details"; "object" is the legacy key
+        object_details = input_data.get("details") or input_data.get("object", {})
+        contact_properties = object_details.get("properties", {})
         
         contact_data = {
-            "hubspot_id": input_data.get("object", {}).get("id", ""),
+            "hubspot_id": object_details.get("id", ""),
             "email": contact_properties.get("email", ""),
             "first_name": contact_properties.get("firstname", ""),
             "last_name": contact_properties.get("lastname", ""),
@@ -44,16 +82,28 @@ async def extract_contact_data(state: ContactRoleMappingState) -> ContactRoleMap
             "department": contact_properties.get("department", "")
         }
         
-        state["contact_data"] = contact_data
-        return state
+        return {"contact_data": contact_data}
         
     except Exception as e:
-        if "errors" not in state:
-            state["errors"] = []
-        state["errors"].append(f"Failed to extract contact data: {str(e)}")
+        print(f"Failed to extract contact data: {str(e)}")
         raise
 
-async def infer_role_from_title(state: ContactRoleMappingState) -> ContactRoleMappingState:
+# Static prompt prefix; the contact is appended as compact JSON so the provider can cache the prefix
+INFER_ROLE_INSTRUCTIONS = """You are an expert in B2B sales and organizational analysis.
+
+Analyze the contact's professional information in the user message and infer their role. Provide:
+1. Primary role category (e.g., "Decision Maker", "Influencer", "End User", "Gatekeeper")
+2. Functional area (e.g., "Engineering", "Sales", "Marketing", "Operations")
+3. Seniority level (e.g., "Executive", "Manager", "Individual Contributor")
+4. Key responsibilities (list of 3-5 items)
+5. Likely decision-making authority (scale 1-10)
+6. Recommended engagement strategy
+7. Internal permissions likely needed (list)
+
+Return as JSON with these fields: role_category, functional_area, seniority_level,
+responsibilities, decision_authority, engagement_strategy, permissions_needed"""
+
+async def infer_role_from_title(state: ContactRoleMappingState) -> Dict[str, Any]:
     """Use AI to infer role and responsibilities from job title"""
     try:
         contact_data = state["contact_data"]
@@ -62,64 +112,59 @@ async def infer_role_from_title(state: ContactRoleMappingState) -> ContactRoleMa
         department = contact_data.get("department", "")
         seniority = contact_data.get("seniority", "")
         
-        role_inference_prompt = f"""
-        Analyze this contact's professional information and infer their role:
-
-        Job Title: {job_title}
-        Company: {company}
-        Department: {department}
-        Seniority: {seniority}
-
-        Please provide:
-        1. Primary role category (e.g., "Decision Maker", "Influencer", "End User", "Gatekeeper")
-        2. Functional area (e.g., "Engineering", "Sales", "Marketing", "Operations")
-        3. Seniority level (e.g., "Executive", "Manager", "Individual Contributor")
-        4. Key responsibilities (list of 3-5 items)
-        5. Likely decision-making authority (scale 1-10)
-        6. Recommended engagement strategy
-        7. Internal permissions likely needed (list)
-
-        Return as JSON with these fields: role_category, functional_area, seniority_level, 
-        responsibilities, decision_authority, engagement_strategy, permissions_needed
-        """
+        # Most titles are common variants: classify locally and only ask the LLM
+        # when the local classifier isn't confident enough.
+        local_role = role_classifier.infer_role(job_title, department, seniority)
+        if local_role is not None:
+            return {"inferred_role": await blob_store.offload(local_role)}
+        
+        # Used when the LLM answer can't be parsed or misses the node's latency budget
+        fallback_role = {
+            "role_category": "Unknown",
+            "functional_area": department or "Unknown",
+            "seniority_level": seniority or "Unknown",
+            "responsibilities": ["Role analysis failed"],
+            "decision_authority": 5,
+            "engagement_strategy": "Standard approach",
+            "permissions_needed": ["Basic access"],
+        }
         
         response = await llm.ainvoke([
-            SystemMessage(content="You are an expert in B2B sales and organizational analysis."),
-            HumanMessage(content=role_inference_prompt)
-        ])
+            SystemMessage(content=INFER_ROLE_INSTRUCTIONS),
+            HumanMessage(content=compact_json({
+                "job_title": job_title, "company": company, "department": department, "seniority": seniority,
+            }))
+        ], node="infer_role_from_title", fallback=fallback_role)
+        answered_by = response.response_metadata.get("answered_by", "primary")
         
         try:
             inferred_role = json.loads(response.content)
         except json.JSONDecodeError:
-            # Fallback if JSON parsing fails
-            inferred_role = {
-                "role_category": "Unknown",
-                "functional_area": department or "Unknown",
-                "seniority_level": seniority or "Unknown",
-                "responsibilities": ["Role analysis failed"],
-                "decision_authority": 5,
-                "engagement_strategy": "Standard approach",
-                "permissions_needed": ["Basic access"],
-                "ai_response": response.content
-            }
+            inferred_role = None
+        if isinstance(inferred_role, dict):
+            # Feed the answer back so this title is classified locally next time
+            if answered_by != "fallback":
+                await role_classifier.learn(job_title, inferred_role)
+        else:
+            # Fallback if the answer isn't a JSON object
+            inferred_role = {**fallback_role, "ai_response": response.content}
+        inferred_role["answered_by"] = answered_by
         
-        state["inferred_role"] = inferred_role
-        return state
+        return {"inferred_role": await blob_store.offload(inferred_role)}
         
     except Exception as e:
-        if "errors" not in state:
-            state["errors"] = []
-        state["errors"].append(f"Failed to infer role from title: {str(e)}")
+        print(f"Failed to infer role from title: {str(e)}")
         raise
 
-async def link_to_account(state: ContactRoleMappingState) -> ContactRoleMappingState:
+async def link_to_account(state: ContactRoleMappingState) -> Dict[str, Any]:
     """Link contact to account and update relationships"""
     try:
         contact_data = state["contact_data"]
+        inferred_role = await blob_store.resolve(state["inferred_role"])
+        enriched_data = await blob_store.resolve(state["enriched_data"])
         
-        # Get associated companies from HubSpot (this would use the hubspot_client)
-        # For now, simulating the associations
-        associations = state["enriched_data"].get("associations", {}).get("companies", [])
+        # Associated companies, with their properties, come from enrichment
+        associations = enriched_data.get("associations", {}).get("companies", [])
         
         # Update Airtable with contact-account relationship
         if associations:
@@ -132,28 +177,28 @@ async def link_to_account(state: ContactRoleMappingState) -> ContactRoleMappingS
                 "Job Title": contact_data["job_title"],
                 "Phone": contact_data["phone"],
                 "HubSpot ID": contact_data["hubspot_id"],
-                "Company": primary_company.get("name", ""),
-                "Role Category": state["inferred_role"]["role_category"],
-                "Functional Area": state["inferred_role"]["functional_area"],
-                "Seniority Level": state["inferred_role"]["seniority_level"],
-                "Decision Authority": state["inferred_role"]["decision_authority"]
+                "Company": primary_company.get("properties", {}).get("name", ""),
+                "Role Category": inferred_role["role_category"],
+                "Functional Area": inferred_role["functional_area"],
+                "Seniority Level": inferred_role["seniority_level"],
+                "Decision Authority": inferred_role["decision_authority"]
             })
             
-            state["airtable_record_id"] = airtable_contact["id"]
-            state["contact_data"]["primary_company"] = primary_company
+            return {
+                "airtable_record_id": airtable_contact["id"],
+                "primary_company": primary_company,
+            }
         
-        return state
+        return {}
         
     except Exception as e:
-        if "errors" not in state:
-            state["errors"] = []
-        state["errors"].append(f"Failed to link contact to account: {str(e)}")
+        print(f"Failed to link contact to account: {str(e)}")
         raise
 
-async def generate_permission_checklist(state: ContactRoleMappingState) -> ContactRoleMappingState:
+async def generate_permission_checklist(state: ContactRoleMappingState) -> Dict[str, Any]:
     """Generate internal permission checklist based on role"""
     try:
-        inferred_role = state["inferred_role"]
+        inferred_role = await blob_store.resolve(state["inferred_role"])
         contact_data = state["contact_data"]
         
         # Generate role-specific permission checklist
@@ -216,19 +261,16 @@ async def generate_permission_checklist(state: ContactRoleMappingState) -> Conta
                 }
             ])
         
-        state["permission_checklist"] = checklist_items
-        return state
+        return {"permission_checklist": checklist_items}
         
     except Exception as e:
-        if "errors" not in state:
-            state["errors"] = []
-        state["errors"].append(f"Failed to generate permission checklist: {str(e)}")
+        print(f"Failed to generate permission checklist: {str(e)}")
         raise
 
-async def attach_drive_templates(state: ContactRoleMappingState) -> ContactRoleMappingState:
+async def attach_drive_templates(state: ContactRoleMappingState) -> Dict[str, Any]:
     """Attach relevant Google Drive templates based on role"""
     try:
-        inferred_role = state["inferred_role"]
+        inferred_role = await blob_store.resolve(state["inferred_role"])
         
         # Template mapping based on role
         template_mapping = {
@@ -282,30 +324,31 @@ async def attach_drive_templates(state: ContactRoleMappingState) -> ContactRoleM
                 }
             ])
         
-        state["drive_templates"] = templates
-        
         # Update Airtable record with templates if available
         if state.get("airtable_record_id"):
             await airtable_client.update_record(
                 state["airtable_record_id"],
-                {"Drive Templates": json.dumps(templates)}
+                {"Drive Templates": json.dumps(templates)},
+                table_name=settings.AIRTABLE_CONTACTS_TABLE,
             )
         
-        return state
+        return {"drive_templates": templates}
         
     except Exception as e:
-        if "errors" not in state:
-            state["errors"] = []
-        state["errors"].append(f"Failed to attach drive templates: {str(e)}")
+        print(f"Failed to attach drive templates: {str(e)}")
         raise
 
-async def finalize_role_mapping(state: ContactRoleMappingState) -> ContactRoleMappingState:
+async def finalize_role_mapping(state: ContactRoleMappingState) -> Dict[str, Any]:
     """Finalize the contact role mapping process"""
     try:
+        contact_data = state["contact_data"]
+        if state.get("primary_company"):
+            contact_data = {**contact_data, "primary_company": state["primary_company"]}
+        
         # Compile final results
         final_result = {
             "status": "completed",
-            "contact_data": state["contact_data"],
+            "contact_data": contact_data,
             "inferred_role": state["inferred_role"],
             "airtable_record_id": state.get("airtable_record_id"),
             "permission_checklist": state["permission_checklist"],
@@ -314,13 +357,10 @@ async def finalize_role_mapping(state: ContactRoleMappingState) -> ContactRoleMa
             "total_checklist_items": len(state["permission_checklist"])
         }
         
-        state["final_result"] = final_result
-        return state
+        return {"final_result": await blob_store.resolve_all(final_result)}
         
     except Exception as e:
-        if "errors" not in state:
-            state["errors"] = []
-        state["errors"].append(f"Failed to finalize role mapping: {str(e)}")
+        print(f"Failed to finalize role mapping: {str(e)}")
         raise
 
 # 3. Assemble the Graph
@@ -331,7 +371,8 @@ workflow.add_node("infer_role_from_title", infer_role_from_title)
 workflow.add_node("link_to_account", link_to_account)
 workflow.add_node("generate_permission_checklist", generate_permission_checklist)
 workflow.add_node("attach_drive_templates", attach_drive_templates)
-workflow.add_node("finalize_role_mapping", finalize_role_mapping)
+# The contact create and its Drive Templates update are sent as one write here
+workflow.add_node("finalize_role_mapping", flushes_writes(finalize_role_mapping))
 
 workflow.set_entry_point("extract_contact_data")
 workflow.add_edge("extract_contact_data", "infer_role_from_title")
@@ -341,5 +382,14 @@ workflow.add_edge("generate_permission_checklist", "attach_drive_templates")
 workflow.add_edge("attach_drive_templates", "finalize_role_mapping")
 workflow.add_edge("finalize_role_mapping", END)
 
-# 4. Compile the Graph
-graph = workflow.compile(checkpointer=workflow_engine.get_checkpointer())
\ No newline at end of file
+# 4. Compile the Graph.
+NODE_CHECKPOINT_POLICY = {
+    "extract_contact_data": CheckpointPolicy.NEVER,
+    "infer_role_from_title": CheckpointPolicy.AFTER_SIDE_EFFECT,
+    "link_to_account": CheckpointPolicy.NEVER,
+    "generate_permission_checklist": CheckpointPolicy.NEVER,
+    "attach_drive_templates": CheckpointPolicy.NEVER,
+    "finalize_role_mapping": CheckpointPolicy.ALWAYS,
+}
+
+graph = workflow.compile(checkpointer=workflow_engine.get_checkpointer(NODE_CHECKPOINT_POLICY))
\ No newline at end of file
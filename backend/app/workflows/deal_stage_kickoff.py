@@ -1,16 +1,44 @@
-from typing import TypedDict, Dict, Any, List
+from typing import TypedDict, Dict, Any, List, Annotated
+import operator
 from langgraph.graph import StateGraph, END
-from app.services.llm_client import get_llm_client
+from app.services.llm_client import compact_json, get_llm_client
+from app.services.blob_store import blob_store
 from langchain_core.messages import HumanMessage, SystemMessage
 import json
 from app.services.workflow_engine import workflow_engine
-from app.services.airtable_client import AirtableClient
+from app.services.checkpoint_policy import CheckpointPolicy
+from app.services.enrichment import EnrichmentDepth
+from app.services.airtable_client import airtable_client
 from app.services.notion_client import NotionClient
 
 # As per the PRD, this workflow triggers on a *configured* stage change.
 # We'll use 'presentationscheduled' as the example trigger.
 TRIGGER_DEAL_STAGE = "presentationscheduled"
 
+# Input fields (dotted paths into the workflow input) this workflow depends on.
+# A run is skipped when these are unchanged since the last successful run for the object.
+INPUT_FIELDS = [
+    "hubspot_event.propertyValue",
+    "enriched_data.details.id",
+    "enriched_data.details.properties.dealname",
+    "enriched_data.details.properties.dealstage",
+    "enriched_data.details.properties.amount",
+    "enriched_data.details.properties.closedate",
+    "enriched_data.details.properties.probability",
+    "enriched_data.details.properties.dealtype",
+    "enriched_data.details.properties.pipeline",
+]
+
+# How much of the CRM graph enrichment fetches for this workflow.
+# Only the deal itself is read.
+ENRICHMENT_DEPTH = EnrichmentDepth.DETAILS
+
+# CRM properties (by object type) this workflow reads from the enriched objects.
+# Enrichment requests only these, unioned with the other workflows' declarations.
+REQUIRED_PROPERTIES = {
+    "deals": ["dealname", "dealstage", "amount", "closedate", "probability", "dealtype", "pipeline"],
+}
+
 # 1. Define the State for the workflow
 class DealStageKickoffState(TypedDict):
     hubspot_event: Dict[str, Any]
@@ -24,21 +52,22 @@ class DealStageKickoffState(TypedDict):
     requires_approval: bool
     approval_data: Dict[str, Any]
     final_result: Dict[str, Any]
-    errors: List[str]
+    errors: Annotated[List[str], operator.add]
 
 # 2. Create Node functions
-airtable_client = AirtableClient()
 notion_client = NotionClient()
-llm = get_llm_client()
+llm = get_llm_client(workflow="deal_stage_kickoff")
 
-async def extract_deal_data(state: DealStageKickoffState) -> DealStageKickoffState:
+async def extract_deal_data(state: DealStageKickoffState) -> Dict[str, Any]:
     """Extract and normalize deal data"""
     try:
-        input_data = state["enriched_data"]
-        deal_properties = input_data.get("object", {}).get("properties", {})
+        input_data = await blob_store.resolve(state["enriched_data"])
+        # Enrichment stores the object under "details"; "object" is the legacy key
+        object_details = input_data.get("details") or input_data.get("object", {})
+        deal_properties = object_details.get("properties", {})
         
         deal_data = {
-            "hubspot_id": input_data.get("object", {}).get("id", ""),
+            "hubspot_id": object_details.get("id", ""),
             "name": deal_properties.get("dealname", ""),
             "stage": deal_properties.get("dealstage", ""),
             "amount": deal_properties.get("amount", ""),
@@ -48,20 +77,18 @@ async def extract_deal_data(state: DealStageKickoffState) -> DealStageKickoffSta
             "pipeline": deal_properties.get("pipeline", "")
         }
         
-        state["deal_data"] = deal_data
-        return state
+        return {"deal_data": deal_data}
         
     except Exception as e:
-        if "errors" not in state:
-            state["errors"] = []
-        state["errors"].append(f"Failed to extract deal data: {str(e)}")
+        print(f"Failed to extract deal data: {str(e)}")
         raise
 
-def check_deal_stage(state: DealStageKickoffState) -> str:
+async def check_deal_stage(state: DealStageKickoffState) -> str:
     """Conditional edge to check if the deal stage change matches the trigger."""
     print("--- Condition: check_deal_stage ---")
     # For a `deal.propertyChange` event, the new value is in `propertyValue`
-    new_stage = state["hubspot_event"].get("propertyValue")
+    hubspot_event = await blob_store.resolve(state["hubspot_event"])
+    new_stage = hubspot_event.get("propertyValue")
     
     if new_stage == TRIGGER_DEAL_STAGE:
         print(f"Deal stage matches trigger: '{new_stage}'. Proceeding.")
@@ -70,99 +97,95 @@ def check_deal_stage(state: DealStageKickoffState) -> str:
         print(f"Deal stage '{new_stage}' does not match trigger '{TRIGGER_DEAL_STAGE}'. Ending workflow.")
         return "end_workflow"
 
-async def analyze_kickoff_requirements(state: DealStageKickoffState) -> DealStageKickoffState:
+# Static prompt prefixes; node data is appended as compact JSON so the provider can cache the prefix
+ANALYZE_KICKOFF_INSTRUCTIONS = """You are an expert in deal management and customer success.
+
+Analyze the deal in the user message and determine kickoff requirements. Provide:
+1. Recommended kickoff participants (list of roles)
+2. Required artifacts and materials
+3. Suggested meeting duration
+4. Potential scheduling conflicts to consider
+5. Critical success factors for the kickoff
+
+Return as JSON with these fields: participants, required_artifacts,
+meeting_duration_minutes, scheduling_considerations, success_factors"""
+
+PROPOSE_SLOTS_INSTRUCTIONS = """You are a scheduling assistant with expertise in business meetings.
+
+Based on the kickoff information in the user message, propose 3 optimal meeting time slots considering:
+1. Typical business hours
+2. Meeting duration requirements
+3. Timezone considerations
+
+Return an array of ISO 8601 datetime strings for the proposed slots."""
+
+# Used when the LLM answer can't be parsed or misses the node's latency budget
+KICKOFF_DETAILS_FALLBACK = {
+    "participants": ["Account Executive", "Solutions Engineer", "Customer Success Manager"],
+    "required_artifacts": ["Contract", "Implementation Plan"],
+    "meeting_duration_minutes": 60,
+    "scheduling_considerations": ["Customer timezone", "Internal availability"],
+    "success_factors": ["Clear agenda", "Defined next steps"],
+}
+
+async def analyze_kickoff_requirements(state: DealStageKickoffState) -> Dict[str, Any]:
     """Use AI to analyze kickoff requirements based on deal data"""
     try:
         deal_data = state["deal_data"]
         
-        analysis_prompt = f"""
-        Analyze this deal and determine kickoff requirements:
-
-        Deal Name: {deal_data.get('name', '')}
-        Stage: {deal_data.get('stage', '')}
-        Amount: {deal_data.get('amount', '')}
-        Close Date: {deal_data.get('close_date', '')}
-        Probability: {deal_data.get('probability', '')}
-        Deal Type: {deal_data.get('deal_type', '')}
-
-        Please provide:
-        1. Recommended kickoff participants (list of roles)
-        2. Required artifacts and materials
-        3. Suggested meeting duration
-        4. Potential scheduling conflicts to consider
-        5. Critical success factors for the kickoff
-
-        Return as JSON with these fields: participants, required_artifacts, 
-        meeting_duration_minutes, scheduling_considerations, success_factors
-        """
+        deal_summary = {
+            "deal_name": deal_data.get("name", ""),
+            "stage": deal_data.get("stage", ""),
+            "amount": deal_data.get("amount", ""),
+            "close_date": deal_data.get("close_date", ""),
+            "probability": deal_data.get("probability", ""),
+            "deal_type": deal_data.get("deal_type", ""),
+        }
         
         response = await llm.ainvoke([
-            SystemMessage(content="You are an expert in deal management and customer success."),
-            HumanMessage(content=analysis_prompt)
-        ])
+            SystemMessage(content=ANALYZE_KICKOFF_INSTRUCTIONS),
+            HumanMessage(content=compact_json(deal_summary))
+        ], node="analyze_kickoff_requirements", fallback=KICKOFF_DETAILS_FALLBACK)
         
         try:
             analysis_result = json.loads(response.content)
         except json.JSONDecodeError:
             # Fallback if JSON parsing fails
-            analysis_result = {
-                "participants": ["Account Executive", "Solutions Engineer", "Customer Success Manager"],
-                "required_artifacts": ["Contract", "Implementation Plan"],
-                "meeting_duration_minutes": 60,
-                "scheduling_considerations": ["Customer timezone", "Internal availability"],
-                "success_factors": ["Clear agenda", "Defined next steps"],
-                "ai_response": response.content
-            }
+            analysis_result = {**KICKOFF_DETAILS_FALLBACK, "ai_response": response.content}
+        analysis_result["answered_by"] = response.response_metadata.get("answered_by", "primary")
         
-        state["kickoff_details"] = analysis_result
-        return state
+        return {"kickoff_details": await blob_store.offload(analysis_result)}
         
     except Exception as e:
-        if "errors" not in state:
-            state["errors"] = []
-        state["errors"].append(f"Failed to analyze kickoff requirements: {str(e)}")
+        print(f"Failed to analyze kickoff requirements: {str(e)}")
         raise
 
-async def propose_internal_slots(state: DealStageKickoffState) -> DealStageKickoffState:
+async def propose_internal_slots(state: DealStageKickoffState) -> Dict[str, Any]:
     """Node to propose available internal meeting time slots."""
     print("--- Node: propose_internal_slots ---")
     
     # Use AI to suggest optimal meeting times based on deal data
-    kickoff_details = state["kickoff_details"]
-    
-    scheduling_prompt = f"""
-    Based on this kickoff information:
-    {json.dumps(kickoff_details, indent=2)}
-    
-    Propose 3 optimal meeting time slots considering:
-    1. Typical business hours
-    2. Meeting duration requirements
-    3. Timezone considerations
-    
-    Return an array of ISO 8601 datetime strings for the proposed slots.
-    """
+    kickoff_details = await blob_store.resolve(state["kickoff_details"])
     
     response = await llm.ainvoke([
-        SystemMessage(content="You are a scheduling assistant with expertise in business meetings."),
-        HumanMessage(content=scheduling_prompt)
-    ])
+        SystemMessage(content=PROPOSE_SLOTS_INSTRUCTIONS),
+        HumanMessage(content=compact_json(kickoff_details))
+    ], node="propose_internal_slots", fallback={})
     
     try:
         # Parse the response to get the slots
         proposed_slots = ["2024-01-15T10:00:00", "2024-01-15T14:00:00", "2024-01-16T11:00:00"]  # Default fallback
-        state["proposed_slots"] = proposed_slots
         print(f"Proposed slots: {proposed_slots}")
     except:
         # Fallback to default slots
-        state["proposed_slots"] = ["2024-01-15T10:00:00", "2024-01-15T14:00:00", "2024-01-16T11:00:00"]
+        proposed_slots = ["2024-01-15T10:00:00", "2024-01-15T14:00:00", "2024-01-16T11:00:00"]
     
-    return state
+    return {"proposed_slots": proposed_slots}
 
-async def check_approval_requirements(state: DealStageKickoffState) -> DealStageKickoffState:
+async def check_approval_requirements(state: DealStageKickoffState) -> Dict[str, Any]:
     """Check if approval is required for this kickoff based on business rules"""
     try:
         deal_data = state["deal_data"]
-        kickoff_details = state["kickoff_details"]
         
         # Check business rules for approval
         requires_approval = False
@@ -187,27 +210,25 @@ async def check_approval_requirements(state: DealStageKickoffState) -> DealStage
             requires_approval = True
             approval_reasons.append("Enterprise deal type requires approval")
         
-        state["requires_approval"] = requires_approval
-        state["approval_data"] = {
-            "reasons": approval_reasons,
-            "deal_data": deal_data,
-            "kickoff_requirements": kickoff_details,
-            "requested_at": "2024-01-01T00:00:00Z"  # Would use current timestamp
+        return {
+            "requires_approval": requires_approval,
+            "approval_data": await blob_store.offload({
+                "reasons": approval_reasons,
+                "deal_data": deal_data,
+                "kickoff_requirements": await blob_store.resolve(state["kickoff_details"]),
+                "requested_at": "2024-01-01T00:00:00Z"  # Would use current timestamp
+            }),
         }
         
-        return state
-        
     except Exception as e:
-        if "errors" not in state:
-            state["errors"] = []
-        state["errors"].append(f"Failed to check approval requirements: {str(e)}")
+        print(f"Failed to check approval requirements: {str(e)}")
         raise
 
 def should_wait_for_approval(state: DealStageKickoffState) -> str:
     """Conditional edge to determine if approval is required"""
     return "wait_for_approval" if state.get("requires_approval", False) else "create_calendar_event"
 
-async def wait_for_approval(state: DealStageKickoffState) -> DealStageKickoffState:
+async def wait_for_approval(state: DealStageKickoffState) -> Dict[str, Any]:
     """
     Wait for Human-in-the-Loop (HITL) approval.
     In a real LangGraph app, this would use interrupt mechanisms.
@@ -217,19 +238,18 @@ async def wait_for_approval(state: DealStageKickoffState) -> DealStageKickoffSta
     # In a real system, the workflow would pause here. An external API call
     # from the AGUI would resume the graph with the approval decision.
     # For simulation, defaulting to approved
-    state["is_approved"] = True
     print("Approval received. Resuming workflow. <<<")
-    return state
+    return {"is_approved": True}
 
-async def create_calendar_event(state: DealStageKickoffState) -> DealStageKickoffState:
+async def create_calendar_event(state: DealStageKickoffState) -> Dict[str, Any]:
     """Node to create the internal kickoff event in calendar system."""
     print("--- Node: create_calendar_event ---")
     if not state.get("is_approved", True):  # Default to True if not set (for non-approved workflows)
         print("Kickoff not approved. Skipping calendar event creation.")
-        return state
+        return {}
         
     deal_name = state["deal_data"].get("name", "Internal Kickoff")
-    kickoff_details = state["kickoff_details"]
+    kickoff_details = await blob_store.resolve(state["kickoff_details"])
     
     # Create event details with AI-optimized parameters
     event_details = {
@@ -243,18 +263,19 @@ async def create_calendar_event(state: DealStageKickoffState) -> DealStageKickof
     # This would actually call the calendar client
     # event = await google_client.create_calendar_event(event_details)
     # For now, simulating the result
-    state["calendar_event"] = {
+    calendar_event = {
         "id": "event_123",
         "htmlLink": "https://calendar.google.com/event/123",
         "summary": event_details["summary"]
     }
     
-    print(f"Calendar event created: {state['calendar_event']['htmlLink']}")
-    return state
+    print(f"Calendar event created: {calendar_event['htmlLink']}")
+    return {"calendar_event": calendar_event}
 
-async def link_artifacts(state: DealStageKickoffState) -> DealStageKickoffState:
+async def link_artifacts(state: DealStageKickoffState) -> Dict[str, Any]:
     """Node for linking created artifacts back to other systems."""
     print("--- Node: link_artifacts ---")
+    errors = []
     
     # Update Airtable with the calendar event and other artifacts
     if state.get("calendar_event"):
@@ -266,10 +287,12 @@ async def link_artifacts(state: DealStageKickoffState) -> DealStageKickoffState:
                     "Kickoff Scheduled": True,
                     "Kickoff Date": state["proposed_slots"][0],
                     "Calendar Event Link": state["calendar_event"]["htmlLink"]
-                }
+                },
+                table_name="Deals",
             )
         except Exception as e:
             print(f"Failed to update Airtable: {e}")
+            errors.append(f"Failed to update Airtable: {str(e)}")
     
     # Attach relevant documentation from Notion
     try:
@@ -279,11 +302,12 @@ async def link_artifacts(state: DealStageKickoffState) -> DealStageKickoffState:
             print(f"Attached {len(kickoff_resources)} kickoff resources from Notion")
     except Exception as e:
         print(f"Failed to attach Notion resources: {e}")
+        errors.append(f"Failed to attach Notion resources: {str(e)}")
     
-    state["artifacts_linked"] = True
-    return state
+    # Non-fatal failures are appended to the run's errors via the reducer
+    return {"artifacts_linked": True, "errors": errors}
 
-async def finalize_kickoff(state: DealStageKickoffState) -> DealStageKickoffState:
+async def finalize_kickoff(state: DealStageKickoffState) -> Dict[str, Any]:
     """Finalize the kickoff workflow"""
     try:
         final_result = {
@@ -297,13 +321,10 @@ async def finalize_kickoff(state: DealStageKickoffState) -> DealStageKickoffStat
             "approval_status": "approved" if state.get("is_approved", True) else "rejected"
         }
         
-        state["final_result"] = final_result
-        return state
+        return {"final_result": await blob_store.resolve_all(final_result)}
         
     except Exception as e:
-        if "errors" not in state:
-            state["errors"] = []
-        state["errors"].append(f"Failed to finalize kickoff: {str(e)}")
+        print(f"Failed to finalize kickoff: {str(e)}")
         raise
 
 # 3. Assemble the Graph
@@ -347,5 +368,16 @@ workflow.add_edge("create_calendar_event", "link_artifacts")
 workflow.add_edge("link_artifacts", "finalize_kickoff")
 workflow.add_edge("finalize_kickoff", END)
 
-# 4. Compile the Graph
-graph = workflow.compile(checkpointer=workflow_engine.get_checkpointer())
\ No newline at end of file
+# 4. Compile the Graph.
+NODE_CHECKPOINT_POLICY = {
+    "extract_deal_data": CheckpointPolicy.NEVER,
+    "analyze_kickoff_requirements": CheckpointPolicy.AFTER_SIDE_EFFECT,
+    "propose_internal_slots": CheckpointPolicy.AFTER_SIDE_EFFECT,
+    "check_approval_requirements": CheckpointPolicy.NEVER,
+    "wait_for_approval": CheckpointPolicy.ALWAYS,
+    "create_calendar_event": CheckpointPolicy.AFTER_SIDE_EFFECT,
+    "link_artifacts": CheckpointPolicy.AFTER_SIDE_EFFECT,
+    "finalize_kickoff": CheckpointPolicy.ALWAYS,
+}
+
+graph = workflow.compile(checkpointer=workflow_engine.get_checkpointer(NODE_CHECKPOINT_POLICY))
\ No newline at end of file
@@ -0,0 +1,90 @@
+"""
+Count the durable checkpoint writes of each workflow with and without its
+NODE_CHECKPOINT_POLICY.
+
+Each workflow is replayed as a graph of no-op nodes with the same names, in
+declared order, that all return a state update. The durable saver is an
+in-memory one that counts put (one checkpoint) and put_writes (one task's
+writes) calls, which is what reaches Redis in production.
+
+Usage:
+    python -m benchmarks.bench_checkpoints
+"""
+import asyncio
+import uuid
+from typing import Any, Dict, TypedDict
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import StateGraph, END
+from app.services.checkpoint_policy import CheckpointPolicy, PolicyCheckpointSaver
+from app.workflows import company_intake, contact_role_mapping, deal_stage_kickoff, procurement_approval
+
+WORKFLOWS = {
+    "company_intake": company_intake.NODE_CHECKPOINT_POLICY,
+    "contact_role_mapping": contact_role_mapping.NODE_CHECKPOINT_POLICY,
+    "deal_stage_kickoff": deal_stage_kickoff.NODE_CHECKPOINT_POLICY,
+    "procurement_approval": procurement_approval.NODE_CHECKPOINT_POLICY,
+}
+
+
+class BenchState(TypedDict, total=False):
+    last_node: str
+
+
+class CountingSaver(MemorySaver):
+    def __init__(self):
+        super().__init__()
+        self.counts = {"put": 0, "put_writes": 0}
+
+    async def aput(self, *args: Any) -> Dict[str, Any]:
+        self.counts["put"] += 1
+        return await super().aput(*args)
+
+    async def aput_writes(self, *args: Any) -> None:
+        self.counts["put_writes"] += 1
+        return await super().aput_writes(*args)
+
+
+class BenchEngine:
+    def __init__(self):
+        self.checkpointer = CountingSaver()
+
+
+def build_graph(node_names, node_policies: Dict[str, CheckpointPolicy], engine: BenchEngine):
+    workflow = StateGraph(BenchState)
+
+    def make_node(name: str):
+        async def node(state: BenchState) -> Dict[str, Any]:
+            return {"last_node": name}
+        return node
+
+    for name in node_names:
+        workflow.add_node(name, make_node(name))
+    workflow.set_entry_point(node_names[0])
+    for start, end in zip(node_names, node_names[1:]):
+        workflow.add_edge(start, end)
+    workflow.add_edge(node_names[-1], END)
+    return workflow.compile(checkpointer=PolicyCheckpointSaver(engine, node_policies))
+
+
+async def count_writes(node_names, node_policies: Dict[str, CheckpointPolicy]) -> Dict[str, int]:
+    engine = BenchEngine()
+    graph = build_graph(node_names, node_policies, engine)
+    await graph.ainvoke({"last_node": ""}, {"configurable": {"thread_id": f"bench-{uuid.uuid4()}"}})
+    return engine.checkpointer.counts
+
+
+async def main() -> None:
+    print(f"{'workflow':<22} {'always':>16} {'policy':>16}")
+    for name, node_policies in WORKFLOWS.items():
+        node_names = list(node_policies)
+        before = await count_writes(node_names, {})
+        after = await count_writes(node_names, node_policies)
+        total_before = before["put"] + before["put_writes"]
+        total_after = after["put"] + after["put_writes"]
+        print(f"{name:<22} {total_before:>4} ({before['put']} + {before['put_writes']:>2}) "
+              f"{total_after:>4} ({after['put']} + {after['put_writes']:>2})  "
+              f"-{1 - total_after / total_before:.0%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+"""
+Benchmark the connector clients end to end against the local stand-in APIs.
+
+Each simulated run does what a procurement run does outside the LLM: enrich
+a deal with its associated companies and contacts through HubSpotClient,
+update an Airtable record, attach a Notion SOP link and create a calendar
+event. Runs are started [concurrency] at a time against
+benchmarks.stand_in_server, so the real clients (connection pools, batch
+reads, rate limiting and retries) are exercised without network access.
+
+Reported per service: requests the server saw, connections opened, 429s
+(rate limit and injected), 5xx responses, and the client's own retries.
+
+Usage:
+    python -m benchmarks.bench_connectors [runs] [concurrency] [error-rate]
+"""
+import asyncio
+import statistics
+import sys
+import time
+from app.services.airtable_client import AirtableClient
+from app.services.google_client import GoogleClient
+from app.services.hubspot_client import HubSpotClient
+from app.services.notion_client import NotionClient
+from benchmarks.stand_in_server import DEFAULT_PROFILES, ServiceProfile, StandInServer
+
+
+async def main(runs: int, concurrency: int, error_rate: float):
+    profiles = {
+        name: ServiceProfile(
+            latency_ms=profile.latency_ms, latency_sigma=profile.latency_sigma,
+            error_429_rate=error_rate / 2, error_5xx_rate=error_rate / 2,
+            # Short waits keep the benchmark fast; the limits are the published ones
+            rate_limit=profile.rate_limit, rate_interval_ms=profile.rate_interval_ms,
+            retry_after=0.2, daily_limit=profile.daily_limit,
+        )
+        for name, profile in DEFAULT_PROFILES.items()
+    }
+    server = StandInServer(profiles)
+    url = await server.start()
+    hubspot = HubSpotClient(base_url=url, access_token="bench")
+    airtable = AirtableClient(api_url=url, api_key="bench")
+    notion = NotionClient(api_url=url, api_key="bench")
+    google = GoogleClient(api_url=url, access_token="bench")
+
+    samples = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(index: int):
+        async with semaphore:
+            started = time.perf_counter()
+            deal_id = str(index + 1)
+            deal, associations = await asyncio.gather(
+                hubspot.get_deal(deal_id), hubspot.get_associations("deal", deal_id)
+            )
+            await asyncio.gather(*(
+                getattr(hubspot, "get_company" if to_type == "companies" else "get_contact")(item["id"])
+                for to_type, items in associations.items() for item in items
+            ))
+            await airtable.update_record(f"rec_{deal_id}", {"Status": "PENDING_APPROVAL"}, table_name="Procurement")
+            await notion.attach_sop_link(f"page_{deal_id}", "https://www.notion.so/procurement-sop")
+            await google.create_calendar_event({"summary": deal["properties"].get("dealname")})
+            samples.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    outcomes = await asyncio.gather(*(run(i) for i in range(runs)), return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    failed = [o for o in outcomes if isinstance(o, Exception)]
+
+    samples.sort()
+    print(f"{runs} runs, {concurrency} concurrent, {error_rate:.0%} injected errors: "
+          f"{elapsed:.2f}s ({len(samples) / elapsed:.1f} runs/s), {len(failed)} failed, "
+          f"{server.connections} connections")
+    if samples:
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+        print(f"run latency mean={statistics.mean(samples):.1f}ms p50={statistics.median(samples):.1f}ms p99={p99:.1f}ms")
+    clients = {"hubspot": hubspot, "airtable": airtable, "notion": notion, "google": google}
+    for name, counters in server.stats.items():
+        client_stats = clients[name].stats
+        print(f"{name:<9} requests={counters['requests']:<5} items={counters['items']:<5} "
+              f"429={counters['rate_limited'] + counters['injected_429']:<4} 5xx={counters['server_errors']:<4} "
+              f"client_retries={client_stats.get('retries', 0)}")
+    for error in failed[:3]:
+        print(f"failure: {type(error).__name__}: {error}")
+
+    for client in clients.values():
+        await client.close()
+    await server.stop()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    asyncio.run(main(
+        int(args[0]) if len(args) > 0 else 100,
+        int(args[1]) if len(args) > 1 else 20,
+        float(args[2]) if len(args) > 2 else 0.02,
+    ))
@@ -0,0 +1,123 @@
+"""
+Benchmark connection setup cost for LLM calls: per-module pools vs the shared pool.
+
+A local OpenAI-compatible server answers /v1/chat/completions instantly and
+counts the TCP connections it accepts. Each new connection is delayed by
+--handshake-ms to stand in for the TCP + TLS handshake to the provider
+(loopback has none). The same call pattern (waves of concurrent calls,
+round-robin across the four workflow modules) is run against:
+
+    cold        a new connection for every call (an expired keep-alive pool)
+    per_module  four ChatOpenAI instances, each with its own default pool
+    shared      one pool from app.services.llm_client.get_http_client()
+
+Usage:
+    python -m benchmarks.bench_llm_connections [waves] [concurrency] [handshake-ms]
+"""
+import asyncio
+import json
+import statistics
+import sys
+import time
+from typing import List
+import httpx
+from langchain_core.messages import HumanMessage
+from langchain_openai import ChatOpenAI
+from app.services.llm_client import get_http_client
+
+WORKFLOWS = ["company_intake", "contact_role_mapping", "deal_stage_kickoff", "procurement_approval"]
+
+COMPLETION = json.dumps({
+    "id": "bench", "object": "chat.completion", "created": 0, "model": "bench",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "{}"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 1, "total_tokens": 11},
+}).encode()
+
+
+class CompletionServer:
+    def __init__(self, handshake_ms: float):
+        self.handshake = handshake_ms / 1000
+        self.connections = 0
+        self.server = None
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}/v1"
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        await asyncio.sleep(self.handshake)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                await reader.readexactly(length)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: " + str(len(COMPLETION)).encode() + b"\r\n\r\n" + COMPLETION
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+def make_model(base_url: str, http_client: httpx.AsyncClient = None) -> ChatOpenAI:
+    return ChatOpenAI(model="bench", openai_api_key="bench", openai_api_base=base_url,
+                      http_async_client=http_client, max_retries=0)
+
+
+async def measure(label: str, server: CompletionServer, models: List[ChatOpenAI], waves: int, concurrency: int):
+    messages = [HumanMessage(content="ping")]
+    opened_before = server.connections
+    samples = []
+
+    async def call(model: ChatOpenAI):
+        started = time.perf_counter()
+        await model.ainvoke(messages)
+        samples.append((time.perf_counter() - started) * 1000)
+
+    for wave in range(waves):
+        await asyncio.gather(*(call(models[(wave + i) % len(models)]) for i in range(concurrency)))
+
+    samples.sort()
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{label:<11} calls={len(samples)} connections={server.connections - opened_before:<4} "
+          f"mean={statistics.mean(samples):.2f}ms p50={statistics.median(samples):.2f}ms p99={p99:.2f}ms")
+
+
+async def main(waves: int, concurrency: int, handshake_ms: float):
+    server = CompletionServer(handshake_ms)
+    base_url = await server.start()
+    print(f"{waves} waves of {concurrency} concurrent calls, {handshake_ms:.0f}ms per new connection:")
+
+    cold = httpx.AsyncClient(limits=httpx.Limits(max_keepalive_connections=0))
+    await measure("cold", server, [make_model(base_url, cold)], waves, concurrency)
+
+    per_module_clients = [httpx.AsyncClient() for _ in WORKFLOWS]
+    await measure("per_module", server, [make_model(base_url, c) for c in per_module_clients], waves, concurrency)
+
+    shared = get_http_client()
+    await measure("shared", server, [make_model(base_url, shared) for _ in WORKFLOWS], waves, concurrency)
+
+    for client in [cold, shared, *per_module_clients]:
+        await client.aclose()
+    await server.stop()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    asyncio.run(main(
+        int(args[0]) if len(args) > 0 else 50,
+        int(args[1]) if len(args) > 1 else 8,
+        float(args[2]) if len(args) > 2 else 30.0,
+    ))
@@ -0,0 +1,358 @@
+"""
+Local stand-in for the HubSpot, Airtable, Notion and Google Calendar APIs.
+
+One HTTP/1.1 server (keep-alive, no network access, no dependencies beyond
+the standard library) speaks enough of each API to drive the real clients
+in app/services:
+
+    HubSpot   POST /crm/v3/objects/{type}/batch/read
+              POST /crm/v3/objects/{type}/search
+              POST /crm/v4/associations/{from}/{to}/batch/read
+    Airtable  POST, PATCH /v0/{base}/{table} (create, update, performUpsert)
+    Notion    PATCH /v1/blocks/{id}/children
+    Google    POST /calendar/v3/calendars/{id}/events
+
+Each service has a ServiceProfile: a log-normal latency distribution,
+injected 429 and 5xx rates, and a fixed-window rate limit that answers 429
+when exceeded. HubSpot responses carry X-HubSpot-RateLimit-* headers. The
+server counts connections and, per service, requests and error responses,
+so benchmarks can measure connection reuse, batching and retry behaviour.
+
+Usage:
+    python -m benchmarks.stand_in_server [port]
+"""
+import asyncio
+import json
+import math
+import random
+import re
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+AIRTABLE_BATCH_LIMIT = 10
+HUBSPOT_BATCH_LIMIT = 100
+
+
+class ServiceProfile:
+    """Latency, failure injection and rate limit of one stand-in API."""
+
+    def __init__(self, latency_ms: float = 100.0, latency_sigma: float = 0.3,
+                 error_429_rate: float = 0.0, error_5xx_rate: float = 0.0,
+                 rate_limit: int = 0, rate_interval_ms: int = 1000,
+                 retry_after: Optional[float] = None, daily_limit: int = 0):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_429_rate = error_429_rate
+        self.error_5xx_rate = error_5xx_rate
+        self.rate_limit = rate_limit  # requests per rate_interval_ms per key; 0 disables
+        self.rate_interval_ms = rate_interval_ms
+        self.retry_after = retry_after  # Retry-After sent with 429s, if any
+        self.daily_limit = daily_limit
+
+    def latency(self) -> float:
+        """One latency sample in seconds."""
+        if self.latency_ms <= 0:
+            return 0.0
+        return random.lognormvariate(math.log(self.latency_ms), self.latency_sigma) / 1000
+
+
+# Published limits of each API and typical latencies
+DEFAULT_PROFILES = {
+    "hubspot": ServiceProfile(latency_ms=120, rate_limit=100, rate_interval_ms=10000, daily_limit=250000),
+    "airtable": ServiceProfile(latency_ms=150, rate_limit=5, rate_interval_ms=1000),
+    "notion": ServiceProfile(latency_ms=200, latency_sigma=0.4, rate_limit=3, rate_interval_ms=1000),
+    "google": ServiceProfile(latency_ms=180, rate_limit=10, rate_interval_ms=1000),
+}
+
+HUBSPOT_TYPES = ("companies", "contacts", "deals")
+
+
+def hubspot_object(object_type: str, object_id: str, modified_ms: int) -> Dict[str, Any]:
+    """A deterministic HubSpot object with every property the workflows read."""
+    n = int(re.sub(r"\D", "", object_id) or 0)
+    modified = str(modified_ms)
+    if object_type == "companies":
+        properties = {
+            "name": f"Company {object_id} Inc.", "domain": f"company{object_id}.com",
+            "industry": ["Technology", "Finance", "Healthcare"][n % 3],
+            "numberofemployees": str(50 + n % 5000), "annualrevenue": str(100000 * (1 + n % 500)),
+            "lifecyclestage": "customer",
+        }
+    elif object_type == "contacts":
+        properties = {
+            "email": f"contact_{object_id}@example.com", "firstname": "Jane", "lastname": f"Doe{object_id}",
+            "jobtitle": ["VP Engineering", "Procurement Manager", "CFO"][n % 3], "phone": "+1 555 0100",
+            "company": f"Company {n % 100} Inc.", "lifecyclestage": "lead", "hs_lead_source": "web",
+            "seniority": "senior", "department": "operations",
+        }
+    else:
+        properties = {
+            "dealname": f"Deal {object_id}", "amount": str(5000 + 250 * (n % 400)),
+            "dealstage": "contractsent", "dealtype": "newbusiness", "pipeline": "default",
+            "closedate": "2025-12-31T00:00:00.000Z", "hs_deal_stage_probability": "0.6",
+        }
+    properties["hs_lastmodifieddate"] = modified
+    properties["hs_object_id"] = object_id
+    return {"id": object_id, "properties": properties}
+
+
+class StandInServer:
+    """
+    The stand-in API server.
+
+    hubspot_objects sets how many objects of each type the search endpoint
+    pages through, with increasing hs_lastmodifieddate. Objects requested by
+    ID always exist. Airtable records are kept in memory per base and table.
+    """
+
+    def __init__(self, profiles: Optional[Dict[str, ServiceProfile]] = None, hubspot_objects: int = 1000):
+        self.profiles = {**DEFAULT_PROFILES, **(profiles or {})}
+        self.hubspot_objects = hubspot_objects
+        self.epoch_ms = int(time.time() * 1000) - hubspot_objects * 1000
+        self.connections = 0
+        self.stats = {service: {"requests": 0, "rate_limited": 0, "injected_429": 0, "server_errors": 0, "items": 0}
+                      for service in self.profiles}
+        self._windows: Dict[Tuple[str, str], List[float]] = {}
+        self._daily: Dict[str, int] = {}
+        self._tables: Dict[Tuple[str, str], Dict[str, Dict[str, Any]]] = {}
+        self._record_seq = 0
+        self.server = None
+
+    async def start(self, port: int = 0) -> str:
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", port)
+        port = self.server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def reset_stats(self):
+        self.connections = 0
+        for counters in self.stats.values():
+            for name in counters:
+                counters[name] = 0
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                method, target, _ = lines[0].split(" ", 2)
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", "0"))
+                raw = await reader.readexactly(length) if length else b""
+                body = json.loads(raw) if raw else {}
+                status, payload, extra = await self._dispatch(method, target.split("?", 1)[0], body)
+                data = json.dumps(payload).encode()
+                response_headers = {"Content-Type": "application/json", "Content-Length": str(len(data)), **extra}
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}\r\n".encode()
+                    + "".join(f"{k}: {v}\r\n" for k, v in response_headers.items()).encode()
+                    + b"\r\n" + data
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method: str, path: str, body: Dict[str, Any]) -> Tuple[int, Any, Dict[str, str]]:
+        route = self._route(method, path)
+        if route is None:
+            return 404, {"message": f"No stand-in route for {method} {path}"}, {}
+        service, rate_key, handler, args = route
+        profile, stats = self.profiles[service], self.stats[service]
+        stats["requests"] += 1
+        await asyncio.sleep(profile.latency())
+
+        allowed, remaining = self._take(service, rate_key, profile)
+        headers = self._rate_headers(service, profile, remaining)
+        if not allowed:
+            stats["rate_limited"] += 1
+            return 429, {"message": "Rate limit exceeded"}, self._retry_headers(profile, headers)
+        draw = random.random()
+        if draw < profile.error_429_rate:
+            stats["injected_429"] += 1
+            return 429, {"message": "Injected rate limit"}, self._retry_headers(profile, headers)
+        if draw < profile.error_429_rate + profile.error_5xx_rate:
+            stats["server_errors"] += 1
+            return 503, {"message": "Injected server error"}, headers
+        status, payload = handler(body, *args)
+        return status, payload, headers
+
+    def _route(self, method: str, path: str):
+        parts = [part for part in path.split("/") if part]
+        if method == "POST" and len(parts) == 5 and parts[:3] == ["crm", "v3", "objects"] and parts[4] == "search":
+            return "hubspot", "token", self._hubspot_search, (parts[3],)
+        if method == "POST" and parts[:3] == ["crm", "v3", "objects"] and parts[4:] == ["batch", "read"]:
+            return "hubspot", "token", self._hubspot_batch_read, (parts[3],)
+        if method == "POST" and parts[:3] == ["crm", "v4", "associations"] and parts[5:] == ["batch", "read"]:
+            return "hubspot", "token", self._hubspot_associations, (parts[3], parts[4])
+        if method in ("POST", "PATCH") and len(parts) == 3 and parts[0] == "v0":
+            # Airtable rate limits apply per base
+            return "airtable", parts[1], self._airtable_records, (method, parts[1], parts[2])
+        if method == "PATCH" and len(parts) == 4 and parts[:2] == ["v1", "blocks"] and parts[3] == "children":
+            return "notion", "token", self._notion_append, (parts[2],)
+        if method == "POST" and parts[:3] == ["calendar", "v3", "calendars"] and parts[4:] == ["events"]:
+            return "google", "token", self._google_event, (parts[3],)
+        return None
+
+    def _take(self, service: str, key: str, profile: ServiceProfile) -> Tuple[bool, int]:
+        """Fixed-window rate limit per (service, key). Returns (allowed, remaining)."""
+        if service == "hubspot" and profile.daily_limit:
+            if self._daily.get(key, 0) >= profile.daily_limit:
+                return False, 0
+            self._daily[key] = self._daily.get(key, 0) + 1
+        if not profile.rate_limit:
+            return True, 0
+        now = time.monotonic()
+        window = self._windows.setdefault((service, key), [now, 0])
+        if now - window[0] >= profile.rate_interval_ms / 1000:
+            window[0], window[1] = now, 0
+        if window[1] >= profile.rate_limit:
+            return False, 0
+        window[1] += 1
+        return True, profile.rate_limit - window[1]
+
+    def _rate_headers(self, service: str, profile: ServiceProfile, remaining: int) -> Dict[str, str]:
+        if service != "hubspot":
+            return {}
+        headers = {}
+        if profile.rate_limit:
+            headers.update({
+                "X-HubSpot-RateLimit-Max": str(profile.rate_limit),
+                "X-HubSpot-RateLimit-Remaining": str(remaining),
+                "X-HubSpot-RateLimit-Interval-Milliseconds": str(profile.rate_interval_ms),
+            })
+        if profile.daily_limit:
+            headers.update({
+                "X-HubSpot-RateLimit-Daily": str(profile.daily_limit),
+                "X-HubSpot-RateLimit-Daily-Remaining": str(profile.daily_limit - self._daily.get("token", 0)),
+            })
+        return headers
+
+    @staticmethod
+    def _retry_headers(profile: ServiceProfile, headers: Dict[str, str]) -> Dict[str, str]:
+        if profile.retry_after is None:
+            return headers
+        return {**headers, "Retry-After": f"{profile.retry_after:g}"}
+
+    def _hubspot_batch_read(self, body: Dict[str, Any], object_type: str) -> Tuple[int, Any]:
+        inputs = body.get("inputs", [])
+        if object_type not in HUBSPOT_TYPES or len(inputs) > HUBSPOT_BATCH_LIMIT:
+            return 400, {"status": "error", "message": "Invalid batch read"}
+        self.stats["hubspot"]["items"] += len(inputs)
+        wanted = set(body.get("properties") or [])
+        results = []
+        for item in inputs:
+            obj = hubspot_object(object_type, str(item["id"]), self.epoch_ms)
+            if wanted:
+                obj["properties"] = {k: v for k, v in obj["properties"].items() if k in wanted}
+            results.append({**obj, "archived": False})
+        return 200, {"status": "COMPLETE", "results": results}
+
+    def _hubspot_associations(self, body: Dict[str, Any], from_type: str, to_type: str) -> Tuple[int, Any]:
+        inputs = body.get("inputs", [])
+        self.stats["hubspot"]["items"] += len(inputs)
+        results = []
+        for item in inputs:
+            n = int(re.sub(r"\D", "", str(item["id"])) or 0)
+            # Two associated objects per object, derived from its ID
+            to = [{"toObjectId": 1000 + (n * 7 + k) % 500, "associationTypes": []} for k in range(2)]
+            results.append({"from": {"id": str(item["id"])}, "to": to})
+        return 200, {"status": "COMPLETE", "results": results}
+
+    def _hubspot_search(self, body: Dict[str, Any], object_type: str) -> Tuple[int, Any]:
+        since = 0
+        for group in body.get("filterGroups", []):
+            for flt in group.get("filters", []):
+                if flt.get("propertyName") == "hs_lastmodifieddate" and flt.get("operator") == "GTE":
+                    since = int(flt["value"])
+        limit = min(int(body.get("limit", 10)), 200)
+        after = int(body.get("after") or 0)
+        # Object i was last modified at epoch + i seconds
+        first = max(0, math.ceil((since - self.epoch_ms) / 1000))
+        start = first + after
+        end = min(self.hubspot_objects, start + limit)
+        wanted = set(body.get("properties") or [])
+        results = []
+        for index in range(start, end):
+            obj = hubspot_object(object_type, str(index + 1), self.epoch_ms + index * 1000)
+            if wanted:
+                obj["properties"] = {k: v for k, v in obj["properties"].items() if k in wanted | {"hs_lastmodifieddate"}}
+            results.append(obj)
+        self.stats["hubspot"]["items"] += len(results)
+        response = {"total": max(0, self.hubspot_objects - first), "results": results}
+        if end < self.hubspot_objects and after + limit < 10000:
+            response["paging"] = {"next": {"after": str(after + limit)}}
+        return 200, response
+
+    def _airtable_records(self, body: Dict[str, Any], method: str, base_id: str, table: str) -> Tuple[int, Any]:
+        records = body.get("records", [])
+        if not records or len(records) > AIRTABLE_BATCH_LIMIT:
+            return 422, {"error": {"type": "INVALID_RECORDS", "message": "1 to 10 records per request"}}
+        # Cell values are scalars or lists of scalars; nested objects don't fit any column type
+        for record in records:
+            for name, value in record.get("fields", {}).items():
+                if isinstance(value, dict) or (isinstance(value, list) and any(isinstance(v, (dict, list)) for v in value)):
+                    return 422, {"error": {"type": "INVALID_VALUE_FOR_COLUMN", "message": f"Field \"{name}\" cannot accept the provided value"}}
+        self.stats["airtable"]["items"] += len(records)
+        stored = self._tables.setdefault((base_id, table), {})
+        merge_on = (body.get("performUpsert") or {}).get("fieldsToMergeOn")
+        results, created, updated = [], [], []
+        for record in records:
+            fields = record.get("fields", {})
+            record_id = record.get("id")
+            if merge_on:
+                record_id = next((rid for rid, existing in stored.items()
+                                  if all(existing["fields"].get(f) == fields.get(f) for f in merge_on)), None)
+            if method == "POST" or record_id is None or record_id not in stored:
+                self._record_seq += 1
+                record_id = record_id if method == "PATCH" and record_id and not merge_on else f"rec{self._record_seq:014d}"
+                stored[record_id] = {"id": record_id, "createdTime": "2025-01-01T00:00:00.000Z", "fields": {}}
+                created.append(record_id)
+            else:
+                updated.append(record_id)
+            stored[record_id]["fields"].update(fields)
+            results.append(stored[record_id])
+        response: Dict[str, Any] = {"records": results}
+        if merge_on:
+            response.update({"createdRecords": created, "updatedRecords": updated})
+        return 200, response
+
+    def _notion_append(self, body: Dict[str, Any], block_id: str) -> Tuple[int, Any]:
+        children = body.get("children", [])
+        self.stats["notion"]["items"] += len(children)
+        return 200, {"object": "list", "results": [
+            {"object": "block", "id": f"{block_id}-{i}", **child} for i, child in enumerate(children)
+        ]}
+
+    def _google_event(self, body: Dict[str, Any], calendar_id: str) -> Tuple[int, Any]:
+        self.stats["google"]["items"] += 1
+        event_id = f"evt{random.getrandbits(40):010x}"
+        return 200, {**body, "id": event_id, "status": "confirmed",
+                     "htmlLink": f"https://calendar.google.com/event?eid={event_id}"}
+
+
+async def main(port: int):
+    server = StandInServer()
+    url = await server.start(port)
+    print(f"Stand-in APIs listening on {url}. Point the clients at it with:")
+    for name in ("HUBSPOT_BASE_URL", "AIRTABLE_API_URL", "NOTION_API_URL", "GOOGLE_CALENDAR_API_URL"):
+        print(f"    export {name}={url}")
+    print("and any non-empty HUBSPOT_ACCESS_TOKEN, AIRTABLE_API_KEY, NOTION_API_KEY and GOOGLE_ACCESS_TOKEN.")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 8787))
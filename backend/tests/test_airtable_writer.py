@@ -0,0 +1,106 @@
+"""
+AirtableBatchWriter against a fake Airtable: concurrent writes share
+requests of up to 10 records, and each caller gets its own result or error.
+"""
+import asyncio
+import httpx
+import pytest
+import pytest_asyncio
+from app.services.airtable_writer import AIRTABLE_BATCH_LIMIT, AirtableBatchWriter
+
+
+class FakeAirtable:
+    """Records each request; a record with the field "bad" fails its request with a 422."""
+
+    def __init__(self, error=None):
+        self.requests = []
+        self.error = error
+
+    async def __call__(self, base_id, table_name, operation, records):
+        self.requests.append((operation, records))
+        if self.error is not None:
+            raise self.error
+        if any(record["fields"].get("bad") for record in records):
+            request = httpx.Request("PATCH", f"https://api.airtable.com/v0/{base_id}/{table_name}")
+            raise httpx.HTTPStatusError("INVALID_VALUE_FOR_COLUMN", request=request,
+                                        response=httpx.Response(422, request=request))
+        return [{"id": record.get("id", f"rec{record['fields']['n']}"), "fields": record["fields"]}
+                for record in records]
+
+
+@pytest_asyncio.fixture
+async def writer_for():
+    writers = []
+
+    def make(airtable):
+        writer = AirtableBatchWriter(airtable, requests_per_second=1000, max_wait=0.001)
+        writers.append(writer)
+        return writer
+
+    yield make
+    for writer in writers:
+        await writer.close()
+
+
+def _submit_all(writer, operation, records):
+    return asyncio.gather(
+        *(writer.submit("app1", "Contacts", operation, record) for record in records),
+        return_exceptions=True,
+    )
+
+
+@pytest.mark.asyncio
+async def test_writes_are_sent_in_requests_of_at_most_10_records(writer_for):
+    airtable = FakeAirtable()
+    writer = writer_for(airtable)
+
+    results = await _submit_all(writer, "create", [{"fields": {"n": n}} for n in range(23)])
+
+    assert [len(records) for _, records in airtable.requests] == [AIRTABLE_BATCH_LIMIT, AIRTABLE_BATCH_LIMIT, 3]
+    # Each caller gets its own record back
+    assert [result["id"] for result in results] == [f"rec{n}" for n in range(23)]
+    assert writer.stats["full_batches"] == 2
+
+
+@pytest.mark.asyncio
+async def test_writes_to_one_record_go_out_in_separate_requests_in_order(writer_for):
+    airtable = FakeAirtable()
+    writer = writer_for(airtable)
+
+    await _submit_all(writer, "update", [
+        {"id": "rec1", "fields": {"Status": "first"}},
+        {"id": "rec2", "fields": {"Status": "other"}},
+        {"id": "rec1", "fields": {"Status": "second"}},
+    ])
+
+    assert [[(r["id"], r["fields"]["Status"]) for r in records] for _, records in airtable.requests] == [
+        [("rec1", "first"), ("rec2", "other")],
+        [("rec1", "second")],
+    ]
+
+
+@pytest.mark.asyncio
+async def test_invalid_batch_is_split_and_only_the_invalid_write_fails(writer_for):
+    airtable = FakeAirtable()
+    writer = writer_for(airtable)
+
+    results = await _submit_all(writer, "create", [
+        {"fields": {"n": 1}}, {"fields": {"n": 2, "bad": True}}, {"fields": {"n": 3}},
+    ])
+
+    assert results[0]["id"] == "rec1" and results[2]["id"] == "rec3"
+    assert isinstance(results[1], httpx.HTTPStatusError)
+    # The batch of 3, then each record on its own
+    assert [len(records) for _, records in airtable.requests] == [3, 1, 1, 1]
+    assert writer.stats["split_batches"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_request_is_reported_to_each_caller(writer_for):
+    airtable = FakeAirtable(error=RuntimeError("Airtable is down"))
+    writer = writer_for(airtable)
+
+    results = await _submit_all(writer, "create", [{"fields": {"n": n}} for n in range(3)])
+
+    assert len(airtable.requests) == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
@@ -0,0 +1,86 @@
+"""
+MicroBatcher flushes concurrent submissions as one batch call, when the
+batch is full or max_wait after the first item, and gives each caller its
+own result or error.
+"""
+import asyncio
+import pytest
+from app.services.batching import MicroBatcher, batch_scope, current_batch_scope
+
+
+class FakeBatchCall:
+    def __init__(self, error=None):
+        self.batches = []
+        self.error = error
+
+    async def __call__(self, items):
+        self.batches.append(list(items))
+        if self.error is not None:
+            raise self.error
+        return [ValueError(f"bad {item}") if item < 0 else item * 10 for item in items]
+
+
+@pytest.mark.asyncio
+async def test_full_batches_flush_without_waiting():
+    call = FakeBatchCall()
+    # max_wait is long enough that only the size limit can flush in time
+    batcher = MicroBatcher(call, max_batch_size=3, max_wait=60)
+
+    results = await asyncio.wait_for(asyncio.gather(*(batcher.submit(n) for n in range(6))), timeout=1)
+
+    assert results == [0, 10, 20, 30, 40, 50]
+    assert call.batches == [[0, 1, 2], [3, 4, 5]]
+    assert batcher.stats == {"batches": 2, "items": 6}
+
+
+@pytest.mark.asyncio
+async def test_partial_batch_flushes_after_max_wait():
+    call = FakeBatchCall()
+    batcher = MicroBatcher(call, max_batch_size=10, max_wait=0.001)
+
+    results = await asyncio.gather(*(batcher.submit(n) for n in range(4)))
+
+    assert results == [0, 10, 20, 30]
+    assert call.batches == [[0, 1, 2, 3]]
+
+
+@pytest.mark.asyncio
+async def test_error_result_is_raised_only_to_its_caller():
+    batcher = MicroBatcher(FakeBatchCall(), max_batch_size=3, max_wait=0.001)
+
+    results = await asyncio.gather(*(batcher.submit(n) for n in (1, -1, 2)), return_exceptions=True)
+
+    assert results[0] == 10 and results[2] == 20
+    assert isinstance(results[1], ValueError)
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_call_is_raised_to_every_caller():
+    batcher = MicroBatcher(FakeBatchCall(error=RuntimeError("provider down")), max_batch_size=3, max_wait=0.001)
+
+    results = await asyncio.gather(*(batcher.submit(n) for n in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_wrong_number_of_results_fails_the_batch():
+    async def short(items):
+        return items[:-1]
+
+    batcher = MicroBatcher(short, max_batch_size=2, max_wait=0.001)
+
+    results = await asyncio.gather(*(batcher.submit(n) for n in range(2)), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_batch_scope_shares_batchers_per_call_site():
+    assert current_batch_scope() is None
+    with batch_scope(4) as scope:
+        assert current_batch_scope() is scope
+        batcher = scope.batcher("llm:node", FakeBatchCall(), max_batch_size=50)
+        assert scope.batcher("llm:node", FakeBatchCall()) is batcher
+        # A batch never exceeds the scope's size
+        assert batcher.max_batch_size == 4
+    assert current_batch_scope() is None
@@ -0,0 +1,65 @@
+"""
+Large state values are stored once by digest and replaced by a reference;
+resolving a reference gives each caller its own copy.
+"""
+import pytest
+from app.services.blob_store import BLOB_REF_KEY, BlobStore
+
+ANALYSIS = {"risk_level": "HIGH", "red_flags": ["No associated contact"], "notes": "x" * 200}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = BlobStore()
+    store.backend, store.path, store.inline_max_bytes = "file", str(tmp_path), 64
+    return store
+
+
+@pytest.mark.asyncio
+async def test_small_values_stay_inline(store):
+    assert await store.offload({"risk_level": "LOW"}) == {"risk_level": "LOW"}
+
+
+@pytest.mark.asyncio
+async def test_identical_values_share_one_reference(store):
+    ref = await store.offload(ANALYSIS)
+
+    assert store.is_ref(ref) and ref[BLOB_REF_KEY].startswith("sha256:")
+    assert await store.offload(dict(ANALYSIS)) == ref
+    assert await store.resolve(ref) == ANALYSIS
+
+
+@pytest.mark.asyncio
+async def test_resolved_values_are_not_shared(store):
+    value = {**ANALYSIS, "red_flags": list(ANALYSIS["red_flags"])}
+    ref = await store.offload(value)
+    # Neither the offloaded value nor a resolved copy changes what is stored
+    value["red_flags"].append("edited after offload")
+    first = await store.resolve(ref)
+    first["red_flags"].append("edited by a node")
+
+    assert await store.resolve(ref) == ANALYSIS
+
+
+@pytest.mark.asyncio
+async def test_blobs_are_read_back_by_another_process(store, tmp_path):
+    ref = await store.offload(ANALYSIS)
+    other = BlobStore()
+    other.backend, other.path = "file", str(tmp_path)
+
+    assert await other.resolve(ref) == ANALYSIS
+
+
+@pytest.mark.asyncio
+async def test_missing_blob_raises(store):
+    with pytest.raises(KeyError):
+        await store.resolve({BLOB_REF_KEY: "sha256:" + "0" * 64, "size": 10})
+
+
+@pytest.mark.asyncio
+async def test_resolve_all_resolves_nested_references(store):
+    ref = await store.offload(ANALYSIS)
+
+    assert await store.resolve_all({"status": "completed", "items": [ref]}) == {
+        "status": "completed", "items": [ANALYSIS],
+    }
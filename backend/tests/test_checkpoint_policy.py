@@ -0,0 +1,179 @@
+"""
+PolicyCheckpointSaver keeps skipped checkpoints and their task writes in
+memory; the durable saver must still only hold checkpoints a run can resume
+from, linked to parents it holds.
+"""
+from typing import TypedDict
+import pytest
+from langgraph.checkpoint.base import create_checkpoint, empty_checkpoint
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import END, StateGraph
+from app.services.checkpoint_policy import CheckpointPolicy, PolicyCheckpointSaver
+
+
+class FakeEngine:
+    def __init__(self):
+        self.checkpointer = MemorySaver()
+
+
+class State(TypedDict, total=False):
+    a: int
+    b: int
+    c: int
+    d: int
+
+
+def _graph(engine, policies, runs, crash_on=None, updates=None):
+    """A chain of nodes n1..n4, each setting its key; crash_on raises once in that node."""
+    crash = {"node": crash_on}
+    graph = StateGraph(State)
+    for name, key in zip(policies, "abcd"):
+        async def node(state, name=name, key=key):
+            runs.append(name)
+            if crash["node"] == name:
+                crash["node"] = None
+                raise RuntimeError("crash")
+            return (updates or {}).get(name, {key: 1})
+        graph.add_node(name, node)
+    names = list(policies)
+    graph.set_entry_point(names[0])
+    for name, next_name in zip(names, names[1:]):
+        graph.add_edge(name, next_name)
+    graph.add_edge(names[-1], END)
+    return graph.compile(checkpointer=PolicyCheckpointSaver(engine, policies))
+
+
+def _parents_exist(saver, thread_id):
+    config = {"configurable": {"thread_id": thread_id}}
+    for item in saver.list(config):
+        if item.parent_config is not None and saver.get_tuple(item.parent_config) is None:
+            return False
+    return True
+
+
+@pytest.mark.asyncio
+async def test_resume_reruns_nodes_after_the_last_durable_checkpoint():
+    policies = {"n1": CheckpointPolicy.NEVER, "n2": CheckpointPolicy.ALWAYS,
+                "n3": CheckpointPolicy.NEVER, "n4": CheckpointPolicy.ALWAYS}
+    engine, runs = FakeEngine(), []
+    config = {"configurable": {"thread_id": "resume"}}
+    with pytest.raises(RuntimeError):
+        await _graph(engine, policies, runs, crash_on="n4").ainvoke({"a": 0}, config)
+
+    # Another worker resumes the thread from the durable saver
+    values = await _graph(engine, policies, runs).ainvoke(None, config)
+
+    assert runs == ["n1", "n2", "n3", "n4", "n3", "n4"]
+    assert values == {"a": 1, "b": 1, "c": 1, "d": 1}
+    assert _parents_exist(engine.checkpointer, "resume")
+
+
+@pytest.mark.asyncio
+async def test_resume_after_side_effect_node_without_update_reruns_it():
+    policies = {"n1": CheckpointPolicy.NEVER, "n2": CheckpointPolicy.AFTER_SIDE_EFFECT,
+                "n3": CheckpointPolicy.ALWAYS}
+    engine, runs = FakeEngine(), []
+    config = {"configurable": {"thread_id": "no-update"}}
+    with pytest.raises(RuntimeError):
+        await _graph(engine, policies, runs, crash_on="n3", updates={"n2": None}).ainvoke({"a": 0}, config)
+
+    values = await _graph(engine, policies, runs, updates={"n2": None}).ainvoke(None, config)
+
+    # Only the input checkpoint was durable when n3 crashed
+    assert runs == ["n1", "n2", "n3", "n1", "n2", "n3"]
+    assert values == {"a": 1, "c": 1}
+    assert _parents_exist(engine.checkpointer, "no-update")
+
+
+# Direct use of the saver: "keep" is an ALWAYS node, "skip" a NEVER node
+
+def _saver(max_pending=1024):
+    engine = FakeEngine()
+    policies = {"keep": CheckpointPolicy.ALWAYS, "skip": CheckpointPolicy.NEVER}
+    return engine.checkpointer, PolicyCheckpointSaver(engine, policies, max_pending=max_pending)
+
+
+def _loop_metadata(step, node):
+    return {"source": "loop", "step": step, "writes": {node: {"x": step}}}
+
+
+def _next(checkpoint, step, values):
+    checkpoint = create_checkpoint(checkpoint, None, step)
+    checkpoint["channel_values"] = {**checkpoint["channel_values"], **values}
+    checkpoint["channel_versions"] = {**checkpoint["channel_versions"], **{name: step + 2 for name in values}}
+    return checkpoint
+
+
+async def _start(saver, thread_id):
+    checkpoint = empty_checkpoint()
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    saved = await saver.aput(config, checkpoint, {"source": "input", "step": -1, "writes": None}, {})
+    return checkpoint, saved
+
+
+@pytest.mark.asyncio
+async def test_early_writes_are_saved_with_their_durable_checkpoint():
+    durable, saver = _saver()
+    checkpoint, saved = await _start(saver, "early")
+    checkpoint = _next(checkpoint, 0, {"a": 1})
+    # The task ran on the new checkpoint before its put, which waits for the previous one
+    early_config = {"configurable": {"thread_id": "early", "checkpoint_ns": "", "checkpoint_id": checkpoint["id"]}}
+    await saver.aput_writes(early_config, [("a", 2)], "task-1")
+    assert durable.get_tuple(early_config) is None
+
+    saved = await saver.aput(saved, checkpoint, _loop_metadata(0, "keep"), {"a": 2})
+
+    assert durable.get_tuple(saved).pending_writes == [("task-1", "a", 2)]
+
+
+@pytest.mark.asyncio
+async def test_early_writes_on_a_skipped_checkpoint_stay_in_memory():
+    durable, saver = _saver()
+    checkpoint, saved = await _start(saver, "early-skip")
+    checkpoint = _next(checkpoint, 0, {"a": 1})
+    early_config = {"configurable": {"thread_id": "early-skip", "checkpoint_ns": "", "checkpoint_id": checkpoint["id"]}}
+    await saver.aput_writes(early_config, [("a", 2)], "task-1")
+
+    skipped = await saver.aput(saved, checkpoint, _loop_metadata(0, "skip"), {"a": 2})
+
+    pending = await saver.aget_tuple(skipped)
+    assert pending.pending_writes == [("task-1", "a", 2)]
+    # The skipped checkpoint points at the durable one, which the saver holds
+    assert pending.parent_config == saved
+    assert durable.get_tuple(skipped) is None
+    assert durable.get_tuple(pending.parent_config) is not None
+
+
+@pytest.mark.asyncio
+async def test_durable_checkpoint_after_skipped_ones_is_a_child_of_the_last_durable_one():
+    durable, saver = _saver()
+    checkpoint, saved = await _start(saver, "reparent")
+    checkpoint = _next(checkpoint, 0, {"a": 1})
+    skipped = await saver.aput(saved, checkpoint, _loop_metadata(0, "skip"), {"a": 2})
+    checkpoint = _next(checkpoint, 1, {"b": 1})
+
+    kept = await saver.aput(skipped, checkpoint, _loop_metadata(1, "keep"), {"b": 3})
+
+    loaded = durable.get_tuple(kept)
+    assert loaded.parent_config["configurable"]["checkpoint_id"] == saved["configurable"]["checkpoint_id"]
+    # The channel written by the skipped checkpoint was saved with this one
+    assert loaded.checkpoint["channel_values"] == {"a": 1, "b": 1}
+    assert _parents_exist(durable, "reparent")
+
+
+@pytest.mark.asyncio
+async def test_evicted_thread_state_is_not_used_as_a_parent():
+    durable, saver = _saver(max_pending=1)
+    checkpoint, saved = await _start(saver, "evicted")
+    checkpoint = _next(checkpoint, 0, {"a": 1})
+    skipped = await saver.aput(saved, checkpoint, _loop_metadata(0, "skip"), {"a": 2})
+    # Another thread takes the only slot: the skipped checkpoint is forgotten
+    await _start(saver, "other")
+    checkpoint = _next(checkpoint, 1, {"b": 1})
+
+    kept = await saver.aput(skipped, checkpoint, _loop_metadata(1, "keep"), {"b": 3})
+
+    loaded = durable.get_tuple(kept)
+    assert loaded.parent_config["configurable"]["checkpoint_id"] == saved["configurable"]["checkpoint_id"]
+    assert loaded.checkpoint["channel_values"] == {"a": 1, "b": 1}
+    assert _parents_exist(durable, "evicted")
@@ -0,0 +1,60 @@
+"""
+infer_role_from_title falls back to the default role when the LLM answer
+is not a JSON object, and only learns from answers that are.
+"""
+import pytest
+from langchain_core.messages import AIMessage
+from app.services.blob_store import blob_store
+from app.services.role_classifier import role_classifier
+from app.workflows import contact_role_mapping
+
+STATE = {"contact_data": {"job_title": "Chief Widget Officer", "department": "Operations"}}
+
+
+class FakeLLM:
+    def __init__(self, content):
+        self.content = content
+
+    async def ainvoke(self, messages, node=None, fallback=None):
+        return AIMessage(content=self.content, response_metadata={"answered_by": "primary"})
+
+
+async def _passthrough(value):
+    return value
+
+
+@pytest.fixture
+def learned(monkeypatch):
+    learned = []
+
+    async def learn(job_title, role):
+        learned.append((job_title, role))
+
+    monkeypatch.setattr(role_classifier, "infer_role", lambda *args: None)
+    monkeypatch.setattr(role_classifier, "learn", learn)
+    monkeypatch.setattr(blob_store, "offload", _passthrough)
+    return learned
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("content", ['["Decision Maker"]', '"Decision Maker"', "Decision Maker"])
+async def test_answer_that_is_not_an_object_uses_the_fallback_role(monkeypatch, learned, content):
+    monkeypatch.setattr(contact_role_mapping, "llm", FakeLLM(content))
+
+    update = await contact_role_mapping.infer_role_from_title(STATE)
+
+    role = update["inferred_role"]
+    assert role["role_category"] == "Unknown"
+    assert role["functional_area"] == "Operations"
+    assert role["ai_response"] == content
+    assert learned == []
+
+
+@pytest.mark.asyncio
+async def test_object_answer_is_used_and_learned(monkeypatch, learned):
+    monkeypatch.setattr(contact_role_mapping, "llm", FakeLLM('{"role_category": "Decision Maker"}'))
+
+    update = await contact_role_mapping.infer_role_from_title(STATE)
+
+    assert update["inferred_role"] == {"role_category": "Decision Maker", "answered_by": "primary"}
+    assert [(title, role["role_category"]) for title, role in learned] == [("Chief Widget Officer", "Decision Maker")]
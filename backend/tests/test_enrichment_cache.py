@@ -0,0 +1,108 @@
+"""
+The enrichment cache serves an object only at or above the version a
+caller asks for, and versions entries by the object's own modification time.
+"""
+import asyncio
+from types import SimpleNamespace
+import fakeredis
+import pytest
+from app.services.enrichment_cache import EnrichmentCache
+from app.services.hubspot_client import HubSpotClient, to_hubspot_timestamp
+
+
+def _deal(modified_ms, stage="qualified"):
+    return {"id": "101", "properties": {"dealstage": stage, "hs_lastmodifieddate": to_hubspot_timestamp(modified_ms)}}
+
+
+class FakeHubSpot(HubSpotClient):
+    """Returns the given deal versions in turn; each fetch waits until released."""
+
+    def __init__(self, *versions):
+        super().__init__(access_token="", properties={"deals": ["dealstage"]})
+        self.versions = list(versions)
+        self.fetches = 0
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def get_deal(self, deal_id):
+        self.fetches += 1
+        version = self.versions.pop(0)
+        await self.release.wait()
+        return version
+
+
+def _cache(hubspot):
+    cache = EnrichmentCache(hubspot)
+    cache.redis_service = SimpleNamespace(client=fakeredis.aioredis.FakeRedis(decode_responses=True))
+    return cache
+
+
+@pytest.mark.asyncio
+async def test_entry_is_served_up_to_its_version():
+    hubspot = FakeHubSpot(_deal(1_000), _deal(3_000))
+    cache = _cache(hubspot)
+    await cache.get_object("deal", "101")
+
+    assert await cache.get_object("deal", "101", min_version=1_000) == _deal(1_000)
+    assert hubspot.fetches == 1
+    assert await cache.get_object("deal", "101", min_version=2_000) == _deal(3_000)
+    assert hubspot.fetches == 2
+
+
+@pytest.mark.asyncio
+async def test_entry_is_stored_at_the_objects_own_version():
+    # HubSpot hasn't caught up with the event yet
+    hubspot = FakeHubSpot(_deal(1_000), _deal(2_000))
+    cache = _cache(hubspot)
+
+    await cache.get_object("deal", "101", min_version=2_000)
+
+    assert (await cache._get("deal", "101"))["version"] == 1_000
+    # So the next lookup for the event doesn't take the old object for it
+    assert await cache.get_object("deal", "101", min_version=2_000) == _deal(2_000)
+
+
+@pytest.mark.asyncio
+async def test_coalesced_caller_refetches_when_the_shared_result_is_too_old():
+    hubspot = FakeHubSpot(_deal(1_000), _deal(2_500))
+    cache = _cache(hubspot)
+    hubspot.release.clear()
+    first = asyncio.ensure_future(cache.get_object("deal", "101"))
+    await asyncio.sleep(0)
+    second = asyncio.ensure_future(cache.get_object("deal", "101", min_version=2_000))
+    await asyncio.sleep(0)
+    hubspot.release.set()
+
+    assert await first == _deal(1_000)
+    assert await second == _deal(2_500)
+    assert (hubspot.fetches, cache.stats["coalesced"], cache.stats["refetches"]) == (2, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_coalesced_callers_share_one_fetch():
+    hubspot = FakeHubSpot(_deal(2_000))
+    cache = _cache(hubspot)
+    hubspot.release.clear()
+    lookups = [asyncio.ensure_future(cache.get_object("deal", "101", min_version=1_000)) for _ in range(3)]
+    await asyncio.sleep(0)
+    hubspot.release.set()
+
+    assert await asyncio.gather(*lookups) == [_deal(2_000)] * 3
+    assert hubspot.fetches == 1
+
+
+@pytest.mark.asyncio
+async def test_property_change_upgrades_the_entry_and_other_events_invalidate_it():
+    hubspot = FakeHubSpot(_deal(1_000), _deal(4_000, stage="closedwon"))
+    cache = _cache(hubspot)
+    await cache.get_object("deal", "101")
+
+    await cache.observe_event({"subscriptionType": "deal.propertyChange", "objectId": 101, "occurredAt": 2_000,
+                               "propertyName": "dealstage", "propertyValue": "contractsent"})
+    upgraded = await cache.get_object("deal", "101", min_version=2_000)
+    assert upgraded["properties"]["dealstage"] == "contractsent"
+
+    await cache.observe_event({"subscriptionType": "deal.associationChange", "objectId": 101, "occurredAt": 3_000})
+    assert (await cache._get("deal", "101"))["object"] is None
+    assert (await cache.get_object("deal", "101", min_version=3_000))["properties"]["dealstage"] == "closedwon"
+    assert hubspot.fetches == 2
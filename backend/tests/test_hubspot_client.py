@@ -0,0 +1,70 @@
+"""
+HubSpot batch reads go through connector_http.send, paced by the shared
+rate limiter on every attempt.
+"""
+import httpx
+import pytest
+from app.services import connector_http
+from app.services.hubspot_client import HubSpotClient
+
+
+class FakeLimiter:
+    def __init__(self):
+        self.calls = []
+
+    async def acquire(self):
+        self.calls.append("acquire")
+
+    async def observe(self, headers):
+        self.calls.append("observe")
+
+    async def penalize(self, retry_after):
+        self.calls.append(("penalize", retry_after))
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = FakeLimiter()
+    monkeypatch.setattr("app.services.hubspot_client.hubspot_rate_limiter", limiter)
+    monkeypatch.setattr(connector_http, "SERVER_ERROR_BACKOFF_SECONDS", 0.0)
+    return limiter
+
+
+def _client(responses):
+    """A HubSpot client whose requests get the given responses (or raise the given errors) in turn."""
+    responses = iter(responses)
+
+    def handle(request):
+        response = next(responses)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    client = HubSpotClient(base_url="https://api.hubapi.test", access_token="token")
+    client._http = httpx.AsyncClient(base_url=client.base_url, transport=httpx.MockTransport(handle))
+    return client
+
+
+OK = httpx.Response(200, json={"results": [{"id": "1", "properties": {}}]})
+
+
+@pytest.mark.asyncio
+async def test_429_penalizes_the_limiter_and_retries(limiter):
+    client = _client([httpx.Response(429, headers={"retry-after": "2"}), OK])
+
+    response = await client._post("/crm/v3/objects/deals/batch/read", {"inputs": [{"id": "1"}]})
+
+    assert response["results"][0]["id"] == "1"
+    assert limiter.calls == ["acquire", "observe", ("penalize", 2.0), "acquire", "observe"]
+    assert (client.stats["api_calls"], client.stats["retries"]) == (2, 1)
+
+
+@pytest.mark.asyncio
+async def test_server_errors_and_read_timeouts_are_retried(limiter):
+    client = _client([httpx.Response(503), httpx.ReadTimeout("timed out"), OK])
+
+    response = await client._post("/crm/v3/objects/deals/batch/read", {"inputs": [{"id": "1"}]})
+
+    assert response["results"][0]["id"] == "1"
+    assert limiter.calls.count("acquire") == 3
+    assert client.stats["retries"] == 2
@@ -0,0 +1,80 @@
+"""
+Webhook deltas are versioned per property on the mirrored row, and
+get_object() only serves rows that are new enough and carry the projection.
+"""
+import json
+import pytest
+from app.services.hubspot_client import HubSpotClient
+from app.services.hubspot_mirror import PROPERTY_VERSIONS_KEY, HubSpotMirror, _apply_property_change
+
+ROW_VERSION = 1_000
+
+
+def test_property_change_older_than_row_is_ignored():
+    properties = {"dealstage": "qualified"}
+
+    assert not _apply_property_change(properties, ROW_VERSION, "dealstage", "closedwon", ROW_VERSION)
+    assert properties["dealstage"] == "qualified"
+
+
+def test_out_of_order_changes_to_other_properties_still_apply():
+    properties = {"dealstage": "qualified", "amount": "100"}
+
+    assert _apply_property_change(properties, ROW_VERSION, "dealstage", "closedwon", 3_000)
+    # Older than the dealstage change, but newer than the amount the row holds
+    assert _apply_property_change(properties, ROW_VERSION, "amount", "200", 2_000)
+
+    assert (properties["dealstage"], properties["amount"]) == ("closedwon", "200")
+    assert properties[PROPERTY_VERSIONS_KEY] == {"dealstage": 3_000, "amount": 2_000}
+
+
+def test_change_older_than_the_property_version_is_ignored():
+    properties = {"dealstage": "qualified"}
+    _apply_property_change(properties, ROW_VERSION, "dealstage", "closedwon", 3_000)
+
+    assert not _apply_property_change(properties, ROW_VERSION, "dealstage", "closedlost", 2_000)
+    assert properties["dealstage"] == "closedwon"
+
+
+class FakeLoader:
+    def __init__(self, found):
+        self.found = found
+
+    async def submit(self, object_id):
+        return self.found
+
+
+def _mirror(monkeypatch, found):
+    mirror = HubSpotMirror(HubSpotClient(properties={"deals": ["dealname"]}))
+    mirror.enabled = True
+    monkeypatch.setattr(mirror, "_loader", lambda object_type: FakeLoader(found))
+    return mirror
+
+
+@pytest.mark.asyncio
+async def test_get_object_serves_the_projection(monkeypatch):
+    properties = {"dealname": "Acme", "hs_lastmodifieddate": "1000", "amount": "5",
+                  PROPERTY_VERSIONS_KEY: {"amount": 2_000}}
+    mirror = _mirror(monkeypatch, {"properties": json.dumps(properties), "version": ROW_VERSION})
+
+    found = await mirror.get_object("deal", "101", min_version=ROW_VERSION)
+
+    assert found == {"id": "101", "properties": {"dealname": "Acme", "hs_lastmodifieddate": "1000"}}
+    assert mirror.stats["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_get_object_misses_rows_older_than_min_version(monkeypatch):
+    # A delta newer than the row doesn't make the whole row that new
+    properties = {"dealname": "Acme", "hs_lastmodifieddate": "1000", PROPERTY_VERSIONS_KEY: {"dealname": 2_000}}
+    mirror = _mirror(monkeypatch, {"properties": json.dumps(properties), "version": ROW_VERSION})
+
+    assert await mirror.get_object("deal", "101", min_version=2_000) is None
+    assert mirror.stats["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_get_object_misses_rows_without_a_projected_property(monkeypatch):
+    mirror = _mirror(monkeypatch, {"properties": json.dumps({"hs_lastmodifieddate": "1000"}), "version": ROW_VERSION})
+
+    assert await mirror.get_object("deal", "101") is None
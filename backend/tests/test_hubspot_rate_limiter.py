@@ -0,0 +1,90 @@
+"""
+The HubSpot token bucket runs as Lua scripts in Redis; these tests run the
+scripts in fakeredis with a controlled clock.
+"""
+from types import SimpleNamespace
+import fakeredis
+import pytest
+from app.middleware.error_handler import ExternalServiceError
+from app.services import hubspot_rate_limiter as rate_limiter_module
+from app.services.hubspot_rate_limiter import HubSpotPriority, HubSpotRateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self):
+        return self.now
+
+    def perf_counter(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter_module, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def limiter(clock):
+    limiter = HubSpotRateLimiter()
+    limiter.redis_service = SimpleNamespace(client=fakeredis.aioredis.FakeRedis())
+    # 10 calls per second, half of them kept back from backfill
+    limiter.capacity, limiter.interval_ms = 10, 1000
+    limiter.backfill_reserve, limiter.daily_limit = 0.5, 1000
+    return limiter
+
+
+async def _take(limiter, priority=HubSpotPriority.INTERACTIVE, times=1):
+    return [await limiter._try_acquire(priority) for _ in range(times)]
+
+
+@pytest.mark.asyncio
+async def test_bucket_holds_capacity_tokens_then_refills_at_its_rate(limiter, clock):
+    assert await _take(limiter, times=10) == [0] * 10
+    # Empty: the next token is 100ms away
+    assert await _take(limiter) == [100]
+
+    clock.now += 0.1
+    assert await _take(limiter) == [0]
+    assert await _take(limiter) == [100]
+
+
+@pytest.mark.asyncio
+async def test_backfill_leaves_the_reserve_to_interactive_calls(limiter):
+    assert await _take(limiter, HubSpotPriority.BACKFILL, times=5) == [0] * 5
+    assert (await _take(limiter, HubSpotPriority.BACKFILL))[0] > 0
+
+    assert await _take(limiter, HubSpotPriority.INTERACTIVE, times=5) == [0] * 5
+
+
+@pytest.mark.asyncio
+async def test_used_up_daily_quota_fails_interactive_calls(limiter):
+    limiter.daily_limit = 3
+    assert await _take(limiter, times=3) == [0] * 3
+    assert await _take(limiter) == [-1]
+
+    with pytest.raises(ExternalServiceError):
+        await limiter.acquire(HubSpotPriority.INTERACTIVE)
+    assert limiter.stats["quota_exhausted"] == 1
+
+
+@pytest.mark.asyncio
+async def test_response_headers_lower_the_bucket(limiter):
+    await limiter.observe({"x-hubspot-ratelimit-remaining": "1", "x-hubspot-ratelimit-max": "10",
+                           "x-hubspot-ratelimit-interval-milliseconds": "1000"})
+
+    assert await _take(limiter, times=2) == [0, 100]
+
+
+@pytest.mark.asyncio
+async def test_429_empties_the_bucket_until_retry_after(limiter, clock):
+    await limiter.penalize(2.0)
+
+    wait = (await _take(limiter))[0]
+    assert 2000 <= wait <= 2100
+    clock.now += 2.1
+    assert await _take(limiter) == [0]
@@ -0,0 +1,116 @@
+"""
+LLMResponseCache serves identical requests from the cache, coalesces
+concurrent ones into one call and shares entries through Redis.
+"""
+import asyncio
+import fakeredis
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from app.services.llm_cache import LLMResponseCache
+from app.services.redis_service import RedisService
+
+PARAMS = {"temperature": 0.0, "max_tokens": 256}
+
+
+class FakeModel:
+    def __init__(self, error=None):
+        self.calls = 0
+        self.error = error
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def invoke(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return AIMessage(content=f"answer {self.calls}")
+
+
+def _cache(redis_client=None):
+    cache = LLMResponseCache()
+    cache.enabled = True
+    cache.redis_service = RedisService()
+    cache.redis_service.client = redis_client or fakeredis.aioredis.FakeRedis(decode_responses=True)
+    return cache
+
+
+def _messages(prompt="Classify this title"):
+    return [SystemMessage(content="You classify job titles."), HumanMessage(content=prompt)]
+
+
+def test_key_ignores_whitespace_but_not_parameters():
+    key = LLMResponseCache.make_key("gpt-test", _messages("Classify  this\n title"), PARAMS)
+
+    assert key == LLMResponseCache.make_key("gpt-test", _messages(), PARAMS)
+    assert key != LLMResponseCache.make_key("gpt-test", _messages(), {**PARAMS, "max_tokens": 512})
+    assert key != LLMResponseCache.make_key("gpt-other", _messages(), PARAMS)
+
+
+@pytest.mark.asyncio
+async def test_repeated_request_is_served_from_the_cache():
+    cache, model = _cache(), FakeModel()
+
+    first = await cache.get_or_invoke("gpt-test", PARAMS, _messages(), model.invoke, node="infer_role")
+    second = await cache.get_or_invoke("gpt-test", PARAMS, _messages(), model.invoke, node="infer_role")
+
+    assert model.calls == 1
+    assert second.content == first.content
+    assert cache.stats()["infer_role"] == {"hits": 1, "misses": 1, "coalesced": 0, "hit_rate": 0.5}
+
+
+@pytest.mark.asyncio
+async def test_entries_are_shared_through_redis():
+    redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    model = FakeModel()
+    await _cache(redis_client).get_or_invoke("gpt-test", PARAMS, _messages(), model.invoke)
+
+    # Another worker, with an empty local cache
+    response = await _cache(redis_client).get_or_invoke("gpt-test", PARAMS, _messages(), model.invoke)
+
+    assert model.calls == 1
+    assert response.content == "answer 1"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_requests_share_one_call():
+    cache, model = _cache(), FakeModel()
+    model.release.clear()
+
+    requests = [asyncio.create_task(cache.get_or_invoke("gpt-test", PARAMS, _messages(), model.invoke, node="n"))
+                for _ in range(3)]
+    await asyncio.sleep(0)
+    model.release.set()
+    responses = await asyncio.gather(*requests)
+
+    assert model.calls == 1
+    assert {response.content for response in responses} == {"answer 1"}
+    assert cache.node_stats["n"] == {"hits": 0, "misses": 1, "coalesced": 2}
+
+
+@pytest.mark.asyncio
+async def test_failed_call_is_raised_to_coalesced_callers_and_not_cached():
+    cache, model = _cache(), FakeModel(error=RuntimeError("provider down"))
+    model.release.clear()
+
+    requests = [asyncio.create_task(cache.get_or_invoke("gpt-test", PARAMS, _messages(), model.invoke))
+                for _ in range(2)]
+    await asyncio.sleep(0)
+    model.release.set()
+    results = await asyncio.gather(*requests, return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    model.error = None
+    response = await cache.get_or_invoke("gpt-test", PARAMS, _messages(), model.invoke)
+    assert response.content == "answer 2"
+
+
+@pytest.mark.asyncio
+async def test_oversized_response_is_not_cached():
+    cache, model = _cache(), FakeModel()
+    cache.max_entry_bytes = 10
+
+    await cache.get_or_invoke("gpt-test", PARAMS, _messages(), model.invoke)
+    await cache.get_or_invoke("gpt-test", PARAMS, _messages(), model.invoke)
+
+    assert model.calls == 2
@@ -0,0 +1,84 @@
+"""
+LLMCassette records provider responses and replays them offline; the
+cassette on disk is a single gzip stream.
+"""
+import gzip
+import zlib
+from types import SimpleNamespace
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from app.services.llm_cassette import LLMCassette
+
+LLM = SimpleNamespace(model_name="gpt-test", temperature=0.0, max_tokens=256)
+
+
+def _cassette(tmp_path, mode):
+    cassette = LLMCassette()
+    cassette.mode = mode
+    cassette.path = str(tmp_path / "llm.jsonl.gz")
+    cassette.instant = True
+    return cassette
+
+
+def _gzip_members(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    members = 0
+    while data:
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        decompressor.decompress(data)
+        data = decompressor.unused_data
+        members += 1
+    return members
+
+
+@pytest.mark.asyncio
+async def test_recordings_are_compressed_into_one_gzip_member(tmp_path):
+    recorder = _cassette(tmp_path, "record")
+    for n in range(3):
+        await recorder.record(LLM, [HumanMessage(content=f"q{n}")], AIMessage(content=f"a{n}"), 0.01)
+    await recorder.close()
+
+    # A second session appends to the existing cassette
+    recorder = _cassette(tmp_path, "record")
+    await recorder.record(LLM, [HumanMessage(content="q3")], AIMessage(content="a3"), 0.01)
+    await recorder.close()
+
+    assert _gzip_members(recorder.path) == 1
+    assert not (tmp_path / "llm.jsonl.gz.part").exists()
+    with gzip.open(recorder.path, "rt", encoding="utf-8") as f:
+        assert len(f.readlines()) == 4
+
+
+@pytest.mark.asyncio
+async def test_replay_cycles_through_responses_in_recorded_order(tmp_path):
+    recorder = _cassette(tmp_path, "record")
+    messages = [HumanMessage(content="Assess this deal")]
+    await recorder.record(LLM, messages, AIMessage(content="first"), 0.01)
+    await recorder.record(LLM, messages, AIMessage(content="second"), 0.01)
+    await recorder.close()
+
+    player = _cassette(tmp_path, "replay")
+    replies = [(await player.replay(LLM, messages)).content for _ in range(3)]
+
+    assert replies == ["first", "second", "first"]
+
+
+@pytest.mark.asyncio
+async def test_rows_recorded_before_close_are_replayed(tmp_path):
+    recorder = _cassette(tmp_path, "record")
+    messages = [HumanMessage(content="Assess this deal")]
+    await recorder.record(LLM, messages, AIMessage(content="kept"), 0.01)
+
+    # The recording process died without closing the cassette
+    player = _cassette(tmp_path, "replay")
+
+    assert (await player.replay(LLM, messages)).content == "kept"
+
+
+@pytest.mark.asyncio
+async def test_unrecorded_request_fails_in_replay(tmp_path):
+    player = _cassette(tmp_path, "replay")
+
+    with pytest.raises(KeyError):
+        await player.replay(LLM, [HumanMessage(content="never recorded")])
@@ -0,0 +1,127 @@
+"""
+LLMGovernor against a fake Redis (with Lua): a shared concurrency cap and
+token budget, local waiters served in priority order, and an adaptive limit
+that halves on a 429.
+"""
+import asyncio
+from types import SimpleNamespace
+import fakeredis
+import pytest
+from app.services.llm_governor import LLMGovernor
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after):
+        super().__init__("rate limited")
+        self.response = SimpleNamespace(headers={"retry-after": str(retry_after)})
+
+
+def _governor(max_concurrency=2, tokens_per_minute=100_000, redis_client=None):
+    governor = LLMGovernor()
+    governor.redis_service = SimpleNamespace(
+        client=redis_client or fakeredis.aioredis.FakeRedis(decode_responses=True))
+    governor.max_concurrency = max_concurrency
+    governor.tokens_per_minute = tokens_per_minute
+    governor.latency_target = 60
+    governor.max_retries = 2
+    return governor
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_are_capped_across_workers():
+    redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    # Two worker replicas sharing one Redis
+    workers = [_governor(max_concurrency=2, redis_client=redis_client) for _ in range(2)]
+    running, peak = 0, 0
+
+    async def call():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return "ok"
+
+    results = await asyncio.gather(*(workers[n % 2].run(call) for n in range(8)))
+
+    assert results == ["ok"] * 8
+    assert peak == 2
+    assert await redis_client.zcard(LLMGovernor.LEASES_KEY) == 0
+
+
+@pytest.mark.asyncio
+async def test_waiters_are_served_in_priority_order():
+    governor = _governor(max_concurrency=1)
+    held = await governor.acquire(priority=5, tokens=10)
+    served = []
+
+    async def wait_for_slot(name, priority):
+        lease = await governor.acquire(priority, tokens=10)
+        served.append(name)
+        await governor.release(lease)
+
+    waiters = [asyncio.create_task(wait_for_slot("backfill", 15)),
+               asyncio.create_task(wait_for_slot("intake", 2)),
+               asyncio.create_task(wait_for_slot("approval", 0))]
+    await asyncio.sleep(0.01)
+    await governor.release(held)
+    await asyncio.gather(*waiters)
+
+    assert served == ["approval", "intake", "backfill"]
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_halves_the_shared_limit_and_retries_after_the_cooldown():
+    governor = _governor(max_concurrency=8)
+    attempts = []
+
+    async def call():
+        attempts.append(asyncio.get_running_loop().time())
+        if len(attempts) == 1:
+            raise RateLimitError(retry_after=0.1)
+        return "ok"
+
+    assert await governor.run(call) == "ok"
+
+    # Halved to 4, then grown by the successful retry
+    assert float(await governor.redis_service.client.get(LLMGovernor.LIMIT_KEY)) == 4.25
+    assert attempts[1] - attempts[0] >= 0.1
+    assert governor.stats["rate_limited"] == 1
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_is_raised_after_max_retries():
+    governor = _governor()
+
+    async def call():
+        raise RateLimitError(retry_after=0.001)
+
+    with pytest.raises(RateLimitError):
+        await governor.run(call)
+    assert governor.stats["rate_limited"] == governor.max_retries
+
+
+@pytest.mark.asyncio
+async def test_call_waits_when_the_minute_token_budget_is_spent():
+    governor = _governor(tokens_per_minute=1000)
+    await governor.release(await governor.acquire(priority=0, tokens=800))
+
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(governor.acquire(priority=0, tokens=800), timeout=0.2)
+
+    # The first call used fewer tokens than estimated
+    await governor.record_tokens(800, 100)
+    await governor.release(await asyncio.wait_for(governor.acquire(priority=0, tokens=800), timeout=1))
+
+
+@pytest.mark.asyncio
+async def test_calls_go_through_when_redis_is_down():
+    governor = _governor()
+    governor.redis_service = SimpleNamespace(client=None)
+
+    async def call():
+        return "ok"
+
+    assert await governor.run(call) == "ok"
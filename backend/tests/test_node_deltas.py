@@ -0,0 +1,169 @@
+"""
+Every workflow node returns a delta of the state keys it owns; LangGraph
+merges it into the run's state. A node that returns a key owned by another
+node would silently overwrite that node's result.
+"""
+import copy
+import pytest
+from langchain_core.messages import AIMessage
+from app.services.airtable_client import airtable_client
+from app.services.blob_store import blob_store
+from app.workflows import company_intake, contact_role_mapping, deal_stage_kickoff, procurement_approval
+
+# Keys each node may return. errors is an append reducer any node may add to.
+OWNED_KEYS = {
+    company_intake: {
+        "start_intake": {"kickoff_scheduled", "requires_approval", "approval_data"},
+        "extract_company_data": {"company_data"},
+        "normalize_data": {"normalized_data"},
+        "check_approval_requirements": {"requires_approval", "approval_data"},
+        "wait_for_approval": set(),
+        "upsert_to_airtable": {"airtable_record"},
+        "attach_notion_sop": {"notion_page_id"},
+        "schedule_kickoff": {"kickoff_scheduled"},
+        "finalize_intake": {"final_result"},
+    },
+    contact_role_mapping: {
+        "extract_contact_data": {"contact_data"},
+        "infer_role_from_title": {"inferred_role"},
+        "link_to_account": {"airtable_record_id", "primary_company"},
+        "generate_permission_checklist": {"permission_checklist"},
+        "attach_drive_templates": {"drive_templates"},
+        "finalize_role_mapping": {"final_result"},
+    },
+    deal_stage_kickoff: {
+        "extract_deal_data": {"deal_data"},
+        "analyze_kickoff_requirements": {"kickoff_details"},
+        "propose_internal_slots": {"proposed_slots"},
+        "check_approval_requirements": {"requires_approval", "approval_data"},
+        "wait_for_approval": {"is_approved"},
+        "create_calendar_event": {"calendar_event"},
+        "link_artifacts": {"artifacts_linked"},
+        "finalize_kickoff": {"final_result"},
+    },
+    procurement_approval: {
+        "extract_deal_data": {"deal_data"},
+        "assess_risk": {"risk_assessment"},
+        "determine_approval_requirements": {"requires_approval", "policy_snapshot", "approvers"},
+        "create_procurement_record": {"procurement_record_id"},
+        "prepare_approval_request": {"approval_data"},
+        "wait_for_procurement_approval": {"is_approved"},
+        "create_po_record": {"po_record_id", "final_result"},
+        "finalize_procurement_approval": {"final_result"},
+    },
+}
+
+COMPANY = {"id": "301", "properties": {"name": "Acme", "domain": "acme.com", "industry": "Software",
+                                       "numberofemployees": "250", "annualrevenue": "5000000",
+                                       "lifecyclestage": "customer"}}
+CONTACT = {"id": "201", "properties": {"email": "ada@acme.com", "firstname": "Ada", "lastname": "Lovelace",
+                                       "jobtitle": "VP of Engineering", "company": "Acme"}}
+DEAL = {"id": "101", "properties": {"dealname": "Acme renewal", "amount": "40000", "dealstage": "contractsent",
+                                    "dealtype": "newbusiness", "pipeline": "default"}}
+
+# A state in which every node of the workflow can run
+FIXTURE_STATES = {
+    company_intake: {
+        "hubspot_event": {"objectId": 301, "subscriptionType": "company.creation"},
+        "enriched_data": {"details": COMPANY},
+        "company_data": {"id": "301", "Name": "Acme", "Domain": "acme.com", "Industry": "Software",
+                         "Employee Count": 250, "Annual Revenue": 5000000.0, "Lifecycle Stage": "customer",
+                         "HubSpot ID": "301"},
+        "normalized_data": {"Name": "Acme", "HubSpot ID": "301", "Lifecycle Stage": "customer",
+                            "ai_analysis": {"risk_level": "LOW"}},
+        "airtable_record": {"id": "rec301", "fields": {}},
+        "requires_approval": False,
+        "errors": [],
+    },
+    contact_role_mapping: {
+        "hubspot_event": {"objectId": 201, "subscriptionType": "contact.creation"},
+        "enriched_data": {"details": CONTACT, "associations": {"companies": [COMPANY]}},
+        "contact_data": {"hubspot_id": "201", "email": "ada@acme.com", "first_name": "Ada",
+                         "last_name": "Lovelace", "job_title": "VP of Engineering", "phone": "",
+                         "company": "Acme", "department": "", "seniority": ""},
+        "inferred_role": {"role_category": "Decision Maker", "functional_area": "Engineering",
+                          "seniority_level": "Executive", "decision_authority": 8},
+        "permission_checklist": [],
+        "drive_templates": [],
+        "airtable_record_id": "rec201",
+        "errors": [],
+    },
+    deal_stage_kickoff: {
+        "hubspot_event": {"objectId": 101, "propertyName": "dealstage", "propertyValue": "closedwon"},
+        "enriched_data": {"details": DEAL},
+        "deal_data": {"hubspot_id": "101", "name": "Acme renewal", "amount": "40000", "stage": "closedwon",
+                      "deal_type": "newbusiness"},
+        "kickoff_details": {"participants": ["Account Executive"], "success_factors": ["Clear agenda"]},
+        "proposed_slots": ["2024-01-15T10:00:00"],
+        "is_approved": True,
+        "calendar_event": {"id": "event_1", "htmlLink": "https://calendar.google.com/event/1"},
+        "artifacts_linked": True,
+        "errors": [],
+    },
+    procurement_approval: {
+        "hubspot_event": {"objectId": 101, "propertyName": "amount", "propertyValue": "40000"},
+        "enriched_data": {"details": DEAL, "associations": {"companies": [COMPANY], "contacts": [CONTACT]}},
+        "deal_data": {"hubspot_id": "101", "name": "Acme renewal", "amount": "40000", "stage": "contractsent",
+                      "deal_type": "newbusiness", "company_name": "Acme", "contact_name": "Ada Lovelace"},
+        "risk_assessment": {"risk_level": "MEDIUM", "recommended_approval_level": "MANAGER", "red_flags": []},
+        "policy_snapshot": {"threshold": 25000},
+        "approvers": [{"name": "Sales Manager", "required": True}],
+        "procurement_record_id": "proc_101",
+        "is_approved": True,
+        "po_record_id": "po_proc_101",
+        "errors": [],
+    },
+}
+
+
+class FakeLLM:
+    async def ainvoke(self, messages, node=None, fallback=None):
+        return AIMessage(content="{}", response_metadata={"answered_by": "primary"})
+
+
+class FakeNotion:
+    async def attach_sop_link(self, page_id, sop_url):
+        return {"id": page_id}
+
+    async def search_sops(self, query):
+        return []
+
+
+async def _passthrough(value):
+    return value
+
+
+async def _write(*args, **kwargs):
+    return {"id": "rec_1", "fields": {}}
+
+
+@pytest.fixture(autouse=True)
+def offline_services(monkeypatch):
+    monkeypatch.setattr(blob_store, "offload", _passthrough)
+    monkeypatch.setattr(blob_store, "resolve", _passthrough)
+    for method in ("upsert_record", "create_contact", "update_record"):
+        monkeypatch.setattr(airtable_client, method, _write)
+    for module in OWNED_KEYS:
+        monkeypatch.setattr(module, "llm", FakeLLM())
+        monkeypatch.setattr(module, "notion_client", FakeNotion())
+
+
+@pytest.mark.parametrize("module", list(OWNED_KEYS), ids=lambda module: module.__name__.rsplit(".", 1)[-1])
+def test_ownership_covers_every_node(module):
+    assert set(OWNED_KEYS[module]) == set(module.workflow.nodes)
+
+
+@pytest.mark.parametrize(
+    "module,node",
+    [(module, node) for module, owned in OWNED_KEYS.items() for node in owned],
+    ids=lambda value: value if isinstance(value, str) else value.__name__.rsplit(".", 1)[-1],
+)
+@pytest.mark.asyncio
+async def test_node_returns_only_keys_it_owns(module, node):
+    state = copy.deepcopy(FIXTURE_STATES[module])
+    update = await module.workflow.nodes[node].runnable.ainvoke(state)
+
+    assert isinstance(update, dict)
+    assert set(update) <= OWNED_KEYS[module][node] | {"errors"}
+    # The node must not have edited the state it was given in place
+    assert state == FIXTURE_STATES[module]
@@ -0,0 +1,74 @@
+"""
+A procurement run updates its procurement record twice (approval request,
+then PO). Both updates are buffered and sent as one Airtable write when
+finalize_procurement_approval flushes the run's writes.
+"""
+import json
+import pytest
+from langchain_core.messages import AIMessage
+from app.services.airtable_client import airtable_client
+from app.services.blob_store import blob_store
+from app.services.workflow_engine import workflow_engine
+from app.workflows import procurement_approval
+
+DEAL = {"id": "101", "properties": {"dealname": "Acme renewal", "amount": "40000", "dealstage": "contractsent",
+                                    "dealtype": "newbusiness", "pipeline": "default"}}
+
+RISK_ASSESSMENT = {"risk_level": "MEDIUM", "customer_risk": "MODERATE", "market_risk": "LOW",
+                   "contract_risk": "LOW", "recommended_approval_level": "MANAGER",
+                   "mitigation_strategies": [], "red_flags": []}
+
+
+class FakeLLM:
+    async def ainvoke(self, messages, node=None, fallback=None):
+        return AIMessage(content=json.dumps(RISK_ASSESSMENT), response_metadata={"answered_by": "primary"})
+
+
+class FakeNotion:
+    async def search_sops(self, query):
+        return []
+
+
+async def _passthrough(value):
+    return value
+
+
+@pytest.fixture
+def airtable_requests(monkeypatch):
+    requests = []
+
+    async def simulate_write(operation, records):
+        requests.append((operation, records))
+        return [{"id": record.get("id", "rec_new"), "fields": record["fields"]} for record in records]
+
+    monkeypatch.setattr(blob_store, "offload", _passthrough)
+    monkeypatch.setattr(blob_store, "resolve", _passthrough)
+    # Each simulated write is one Airtable request
+    monkeypatch.setattr(airtable_client, "api_key", "")
+    monkeypatch.setattr(airtable_client, "_simulate_write", simulate_write)
+    monkeypatch.setattr(procurement_approval, "llm", FakeLLM())
+    monkeypatch.setattr(procurement_approval, "notion_client", FakeNotion())
+    return requests
+
+
+@pytest.mark.asyncio
+async def test_procurement_record_updates_are_sent_as_one_request(airtable_requests):
+    result = await workflow_engine.invoke_workflow(
+        procurement_approval.graph,
+        {
+            "hubspot_event": {"objectId": 101, "propertyName": "amount", "propertyValue": "40000"},
+            "enriched_data": {"details": DEAL, "associations": {}},
+            "errors": [],
+        },
+        thread_id="procurement-writes-101",
+    )
+
+    assert result["status"] == "completed"
+    assert len(airtable_requests) == 1
+    operation, records = airtable_requests[0]
+    assert operation == "update"
+    assert [record["id"] for record in records] == ["proc_101"]
+    # The PO update was merged into the approval request update
+    fields = records[0]["fields"]
+    assert "Approval Request" in fields
+    assert (fields["PO Record ID"], fields["Status"]) == ("po_proc_101", "APPROVED_AND_PO_CREATED")
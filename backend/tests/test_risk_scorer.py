@@ -0,0 +1,88 @@
+"""
+The risk scorer answers clear-cut deals locally once calibrated on LLM
+verdicts; only LLM verdicts feed the company history it scores from.
+"""
+import json
+from types import SimpleNamespace
+import fakeredis
+import numpy as np
+import pytest
+from langchain_core.messages import AIMessage
+from app.services.blob_store import blob_store
+from app.services.risk_scorer import DEAL_BIAS, DEAL_WEIGHTS, RiskScorer, deal_features, fit_logistic
+from app.services.similarity_index import risk_similarity
+from app.workflows import procurement_approval
+
+DEAL = {"hubspot_id": "101", "name": "Acme renewal", "amount": "40000", "stage": "contractsent",
+        "deal_type": "newbusiness", "company_name": "Acme", "contact_name": "Ada Lovelace"}
+
+
+async def _passthrough(value):
+    return value
+
+
+async def _noop(*args, **kwargs):
+    return None
+
+
+def test_fit_logistic_orders_scores_by_label():
+    features = np.array([[0.0], [0.2], [0.8], [1.0]])
+    labels = np.array([0.0, 0.0, 1.0, 1.0])
+
+    weights, bias = fit_logistic(features, labels, np.zeros(1), 0.0, iterations=5000, learning_rate=0.5)
+
+    scores = 1.0 / (1.0 + np.exp(-(features @ weights + bias)))
+    assert scores[0] < 0.5 < scores[3]
+
+
+@pytest.fixture
+def scorer(monkeypatch):
+    scorer = RiskScorer()
+    scorer.redis_service = SimpleNamespace(client=fakeredis.aioredis.FakeRedis(decode_responses=True))
+    scorer.min_verdicts = 3
+    monkeypatch.setattr(procurement_approval, "risk_scorer", scorer)
+    monkeypatch.setattr(risk_similarity, "redis_service", scorer.redis_service)
+    # Other tests' runs may have left reusable assessments in the shared index
+    monkeypatch.setattr(risk_similarity, "lookup", lambda bucket, vector: None)
+    monkeypatch.setattr(blob_store, "offload", _passthrough)
+    return scorer
+
+
+@pytest.mark.asyncio
+async def test_calibrate_waits_for_enough_verdicts(scorer):
+    for _ in range(2):
+        await scorer.record_verdict("deal", deal_features(DEAL), "LOW")
+    await scorer.calibrate()
+    assert "deal" not in scorer.calibrated
+
+    await scorer.record_verdict("deal", deal_features(DEAL), "LOW")
+    await scorer.calibrate()
+    assert "deal" in scorer.calibrated
+
+
+@pytest.mark.asyncio
+async def test_local_verdict_is_not_recorded_into_history(scorer):
+    scorer.calibrated.add("deal")
+    # Everything below 0.99 is clear-cut low risk
+    scorer.low_band, scorer.models["deal"] = 0.99, (DEAL_WEIGHTS, DEAL_BIAS)
+
+    update = await procurement_approval.assess_risk({"deal_data": DEAL})
+
+    assert update["risk_assessment"]["answered_by"] == "risk_scorer"
+    assert await scorer.history("Acme") == {}
+
+
+@pytest.mark.asyncio
+async def test_llm_verdict_is_recorded_into_history(scorer, monkeypatch):
+    class FakeLLM:
+        async def ainvoke(self, messages, node=None, fallback=None):
+            return AIMessage(content=json.dumps({"risk_level": "HIGH", "recommended_approval_level": "EXECUTIVE"}),
+                             response_metadata={"answered_by": "primary"})
+
+    monkeypatch.setattr(procurement_approval, "llm", FakeLLM())
+    monkeypatch.setattr(risk_similarity, "add", _noop)
+
+    update = await procurement_approval.assess_risk({"deal_data": DEAL})
+
+    assert update["risk_assessment"]["answered_by"] == "primary"
+    assert await scorer.history("Acme") == {"runs": 1, "high": 1}
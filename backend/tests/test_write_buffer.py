@@ -0,0 +1,99 @@
+"""
+RunWriteBuffer merges a run's Airtable writes per record and sends them
+through the batching writer when flushed.
+"""
+import pytest
+from langchain_core.runnables.config import var_child_runnable_config
+from app.services.write_buffer import PENDING_PREFIX, RunWriteBuffer, current_write_buffer, run_write_buffer
+
+
+class FakeWriter:
+    def __init__(self, error=None):
+        self.sent = []
+        self.error = error
+
+    async def submit(self, base_id, table_name, operation, record):
+        self.sent.append((operation, record))
+        if self.error is not None:
+            raise self.error
+        return {"id": record.get("id", f"rec{len(self.sent)}"), "fields": record["fields"]}
+
+
+class FakeClient:
+    def __init__(self, error=None):
+        self.writer = FakeWriter(error)
+
+
+@pytest.mark.asyncio
+async def test_update_to_a_pending_record_is_folded_into_its_create():
+    client = FakeClient()
+    buffer = RunWriteBuffer(client)
+    created = buffer.create("app1", "Contacts", {"Name": "Ada", "Role": "Unknown"})
+    assert created["id"].startswith(PENDING_PREFIX)
+
+    buffer.update("app1", "Contacts", created["id"], {"Role": "Decision Maker"})
+    await buffer.flush()
+
+    assert client.writer.sent == [("create", {"fields": {"Name": "Ada", "Role": "Decision Maker"}})]
+    real_id = buffer.resolve(created["id"])
+    assert real_id == "rec1"
+
+    # After the flush the provisional ID still works, as the real one
+    buffer.update("app1", "Contacts", created["id"], {"Role": "Champion"})
+    await buffer.flush()
+    assert client.writer.sent[-1] == ("update", {"id": real_id, "fields": {"Role": "Champion"}})
+
+
+@pytest.mark.asyncio
+async def test_later_field_values_win():
+    client = FakeClient()
+    buffer = RunWriteBuffer(client)
+
+    buffer.update("app1", "Procurement", "rec9", {"Status": "PENDING_APPROVAL", "Approvers": "[]"})
+    merged = buffer.update("app1", "Procurement", "rec9", {"Status": "APPROVED"})
+    await buffer.flush()
+
+    assert merged["fields"] == {"Status": "APPROVED", "Approvers": "[]"}
+    assert client.writer.sent == [("update", {"id": "rec9", "fields": {"Status": "APPROVED", "Approvers": "[]"}})]
+
+
+@pytest.mark.asyncio
+async def test_flush_through_a_checkpoint_leaves_later_writes_buffered():
+    client = FakeClient()
+    buffer = RunWriteBuffer(client)
+    # Checkpoint IDs are time-ordered; nodes see theirs in the run config metadata
+    for checkpoint_id, record_id in (("cp1", "recA"), ("cp2", "recB"), ("cp3", "recC")):
+        token = var_child_runnable_config.set({"metadata": {"checkpoint_id": checkpoint_id}})
+        buffer.update("app1", "Procurement", record_id, {"Status": checkpoint_id})
+        var_child_runnable_config.reset(token)
+
+    await buffer.flush("cp2", inclusive=False)
+    assert [record["id"] for _, record in client.writer.sent] == ["recA"]
+
+    await buffer.flush("cp2")
+    assert [record["id"] for _, record in client.writer.sent] == ["recA", "recB"]
+
+    await buffer.flush()
+    assert [record["id"] for _, record in client.writer.sent] == ["recA", "recB", "recC"]
+
+
+@pytest.mark.asyncio
+async def test_writes_are_flushed_when_the_run_fails():
+    client = FakeClient()
+
+    with pytest.raises(RuntimeError, match="node failed"):
+        async with run_write_buffer(client):
+            current_write_buffer().update("app1", "Procurement", "rec9", {"Status": "FAILED"})
+            raise RuntimeError("node failed")
+
+    assert client.writer.sent == [("update", {"id": "rec9", "fields": {"Status": "FAILED"}})]
+    assert current_write_buffer() is None
+
+
+@pytest.mark.asyncio
+async def test_flush_error_fails_a_successful_run():
+    client = FakeClient(error=RuntimeError("Airtable is down"))
+
+    with pytest.raises(RuntimeError, match="Airtable is down"):
+        async with run_write_buffer(client):
+            current_write_buffer().update("app1", "Procurement", "rec9", {"Status": "APPROVED"})